@@ -0,0 +1,127 @@
+"""
+Общие помощники для работы с кешем.
+
+- Версионированные ключи: все ключи пространства имен (например, курса) становятся недействительными
+  после увеличения его версии, без перебора и удаления самих ключей.
+- Пакетное чтение и запись: один get_many и один set_many на группу ключей.
+- Защита от одновременного пересчета (cache stampede): вероятностное раннее обновление
+  и блокировка на время пересчета при промахе.
+
+Значения, записанные через get_or_build и get_or_set_many, хранятся в обертке со временем
+пересчета и истечения, поэтому их нужно читать этими же функциями.
+"""
+import math
+import random
+import time
+
+from django.core.cache import cache as default_cache
+
+VERSION_KEY = 'version:{}'
+LOCK_KEY = 'lock:{}'
+
+
+def get_version(name, cache=default_cache):
+    """
+    Возвращает номер версии пространства имен.
+
+    Если счетчика нет в кеше, он заводится от текущего времени в миллисекундах, чтобы после
+    вытеснения из кеша не совпасть с номером версии устаревших записей.
+    """
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*names, cache=default_cache):
+    """
+    Увеличивает номер версии пространств имен, делая недействительными все их ключи.
+    """
+    for name in set(names):
+        key = VERSION_KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), None)
+
+
+def make_key(name, *parts, version=None, cache=default_cache):
+    """
+    Возвращает ключ вида name:vN:part1:part2 с текущей (или переданной) версией пространства имен.
+    """
+    if version is None:
+        version = get_version(name, cache)
+    return ':'.join([name, f'v{version}', *map(str, parts)])
+
+
+def _make_entry(value, delta, timeout):
+    return {'value': value, 'delta': delta, 'expires': time.time() + timeout if timeout else None}
+
+
+def _is_expiring(entry, beta):
+    """
+    Решает, пора ли пересчитать значение заранее (алгоритм XFetch).
+
+    Вероятность растет по мере приближения к истечению и тем выше, чем дольше пересчет,
+    поэтому значение обычно обновляет один запрос до того, как истечет у всех.
+    """
+    if entry['expires'] is None:
+        return False
+    return time.time() - entry['delta'] * beta * math.log(1 - random.random()) >= entry['expires']
+
+
+def get_or_build(key, build, timeout, cache=default_cache, beta=1.0, lock_timeout=10, wait=0.05):
+    """
+    Возвращает пару (значение, попадание в кеш), пересчитывая значение функцией build.
+
+    - Незадолго до истечения значение с некоторой вероятностью пересчитывается заранее,
+      при этом остальные запросы продолжают получать текущее значение.
+    - При промахе пересчет выполняет запрос, взявший блокировку, а остальные ждут его результата
+      не дольше lock_timeout секунд и только потом пересчитывают сами.
+    """
+    entry = cache.get(key)
+    if entry is not None and not _is_expiring(entry, beta):
+        return entry['value'], True
+
+    lock_key = LOCK_KEY.format(key)
+    if entry is not None:
+        if not cache.add(lock_key, True, lock_timeout):
+            return entry['value'], True
+    else:
+        deadline = time.monotonic() + lock_timeout
+        while not cache.add(lock_key, True, lock_timeout):
+            time.sleep(wait)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry['value'], True
+            if time.monotonic() >= deadline:
+                break
+
+    try:
+        started = time.monotonic()
+        value = build()
+        cache.set(key, _make_entry(value, time.monotonic() - started, timeout), timeout)
+    finally:
+        cache.delete(lock_key)
+    return value, False
+
+
+def get_or_set_many(keys, build_missing, timeout, cache=default_cache):
+    """
+    Возвращает значения для словаря {объект: ключ кеша} одним get_many.
+
+    Отсутствующие значения строятся одним вызовом build_missing(объекты), который возвращает
+    словарь {объект: значение}, и записываются одним set_many.
+    """
+    entries = cache.get_many(list(keys.values()))
+    values = {item: entries[key]['value'] for item, key in keys.items() if key in entries}
+    missing = [item for item in keys if item not in values]
+    if missing:
+        started = time.monotonic()
+        built = build_missing(missing)
+        delta = (time.monotonic() - started) / len(missing)
+        cache.set_many({keys[item]: _make_entry(value, delta, timeout) for item, value in built.items()}, timeout)
+        values.update(built)
+    return values
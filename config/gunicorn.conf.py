@@ -0,0 +1,29 @@
+"""
+Конфигурация gunicorn для production. Все параметры задаются переменными окружения.
+
+WSGI (по умолчанию, потоки gthread):
+    gunicorn config.wsgi -c config/gunicorn.conf.py
+ASGI (асинхронные контроллеры):
+    GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker gunicorn config.asgi -c config/gunicorn.conf.py
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND") or "0.0.0.0:8000"
+
+# Количество процессов и потоков в каждом из них (потоки используются только gthread-воркером)
+workers = int(os.getenv("GUNICORN_WORKERS") or multiprocessing.cpu_count() * 2 + 1)
+threads = int(os.getenv("GUNICORN_THREADS") or 4)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS") or "gthread"
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT") or 30)
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT") or 30)
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE") or 5)
+
+# Перезапуск воркера после заданного числа запросов ограничивает рост памяти
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS") or 1000)
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER") or 100)
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL") or "info"
@@ -0,0 +1,256 @@
+"""
+Метрики запросов: время ответа, количество и время запросов к БД, время сериализации.
+
+Значения собираются middleware по имени маршрута (например, materials:course-detail) в гистограммы
+в памяти процесса и отдаются контроллером metrics_view в текстовом формате Prometheus.
+Каждый воркер gunicorn хранит свои гистограммы, поэтому Prometheus должен опрашивать воркеры
+по отдельности или их значения нужно суммировать по метке instance.
+"""
+import bisect
+import hmac
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+UNRESOLVED_VIEW = 'unresolved'
+
+current_stats = ContextVar('current_stats', default=None)
+
+
+class Histogram:
+    """
+    Гистограмма Prometheus с метками, хранящаяся в памяти процесса.
+
+    Для каждого набора меток хранятся количество значений в каждом интервале, сумма и количество значений.
+    """
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.series = {}  # Метки -> [количество значений в интервалах..., сумма, количество]
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+    def render(self):
+        """
+        Возвращает строки гистограммы в текстовом формате Prometheus.
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+        for labels, values in sorted(series.items()):
+            label_text = ','.join(f'{name}="{escape_label(value)}"' for name, value in labels)
+            cumulative = 0
+            for bound, count in zip([*self.buckets, '+Inf'], values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {values[-2]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {values[-1]}')
+        return lines
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Время обработки запроса', TIME_BUCKETS)
+DB_QUERIES = Histogram('http_request_db_queries', 'Количество запросов к БД на запрос', QUERY_BUCKETS)
+DB_DURATION = Histogram('http_request_db_duration_seconds', 'Время запросов к БД на запрос', TIME_BUCKETS)
+SERIALIZER_DURATION = Histogram('http_request_serializer_duration_seconds', 'Время сериализации ответа',
+                                TIME_BUCKETS)
+HISTOGRAMS = (REQUEST_DURATION, DB_QUERIES, DB_DURATION, SERIALIZER_DURATION)
+
+
+class RequestStats:
+    """
+    Статистика одного запроса. Экземпляр подключается к соединениям с БД через execute_wrapper.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def install(self):
+        """
+        Подключает подсчет запросов ко всем соединениям с БД текущего потока.
+        """
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+
+@contextmanager
+def serializer_timer():
+    """
+    Учитывает время выполнения блока как время сериализации текущего запроса.
+
+    Вложенные блоки (например, вложенные сериализаторы) не учитываются повторно.
+    """
+    stats = current_stats.get()
+    if stats is None or stats.serializing:
+        yield
+        return
+    stats.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializer_time += time.perf_counter() - started
+        stats.serializing = False
+
+
+class TimedSerializerMixin:
+    """
+    Миксин сериализатора, учитывающий время to_representation в метриках запроса.
+    """
+
+    def to_representation(self, instance):
+        with serializer_timer():
+            return super().to_representation(instance)
+
+
+class MetricsMiddleware:
+    """
+    Middleware, записывающее метрики каждого запроса по имени маршрута.
+
+    Запросы к БД считаются через connection.execute_wrapper. Если запрос выполнил больше
+    METRICS_QUERY_BUDGET запросов к БД, в лог пишется предупреждение, чтобы N+1 был заметен сразу.
+    Тело потокового ответа формируется после выхода из middleware, поэтому для него запросы к БД
+    считаются во время итерации, а метрики записываются, когда тело отдано полностью.
+    Работает и под WSGI, и под ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            with stats.install():
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        # Синхронный код запроса (ORM) выполняется в отдельном потоке, поэтому подсчет подключается в нем
+        stack = await sync_to_async(stats.install)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            current_stats.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    def finish(self, request, response, stats, started):
+        """
+        Записывает метрики обычного ответа сразу, а потокового - после итерации его тела.
+        """
+        if not response.streaming:
+            self.record(request, response, stats, time.perf_counter() - started)
+            return
+
+        content = response.streaming_content
+
+        def stream():
+            try:
+                with stats.install():
+                    yield from content
+            finally:
+                self.record(request, response, stats, time.perf_counter() - started)
+
+        async def astream():
+            stack = await sync_to_async(stats.install)()
+            try:
+                async for chunk in content:
+                    yield chunk
+            finally:
+                await sync_to_async(stack.close)()
+                self.record(request, response, stats, time.perf_counter() - started)
+
+        response.streaming_content = astream() if response.is_async else stream()
+
+    def record(self, request, response, stats, duration):
+        match = request.resolver_match
+        view = match.view_name if match is not None else UNRESOLVED_VIEW
+        labels = (('view', view), ('method', request.method))
+        REQUEST_DURATION.observe(labels, duration)
+        DB_QUERIES.observe(labels, stats.queries)
+        DB_DURATION.observe(labels, stats.db_time)
+        SERIALIZER_DURATION.observe(labels, stats.serializer_time)
+
+        budget = settings.METRICS_QUERY_BUDGET
+        if budget and stats.queries > budget:
+            logger.warning('%s %s (%s) выполнил %s запросов к БД при бюджете %s', request.method, request.path,
+                           view, stats.queries, budget)
+
+
+def has_metrics_access(request):
+    """
+    Проверяет доступ к метрикам по токену METRICS_TOKEN или по IP-адресу из METRICS_ALLOWED_IPS.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '').encode()
+    if token and hmac.compare_digest(authorization, f'Bearer {token}'.encode()):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    """
+    Отдает метрики запросов в текстовом формате Prometheus.
+    """
+    if not has_metrics_access(request):
+        return HttpResponseForbidden()
+    lines = [line for histogram in HISTOGRAMS for line in histogram.render()]
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
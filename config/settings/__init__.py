@@ -0,0 +1,22 @@
+"""
+Настройки проекта.
+
+Профиль выбирается переменной окружения DJANGO_ENV: dev (по умолчанию), prod или test.
+Для manage.py test по умолчанию используется профиль test, в том числе при пустом DJANGO_ENV.
+"""
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env")
+
+DJANGO_ENV = os.getenv("DJANGO_ENV") or ("test" if sys.argv[1:2] == ["test"] else "dev")
+
+if DJANGO_ENV == "prod":
+    from config.settings.prod import *  # noqa: F401,F403
+elif DJANGO_ENV == "test":
+    from config.settings.test import *  # noqa: F401,F403
+else:
+    from config.settings.dev import *  # noqa: F401,F403
@@ -0,0 +1,288 @@
+"""
+Общие настройки проекта для всех профилей (dev и prod).
+
+Пустые переменные окружения (как в .env.sample) считаются незаданными, поэтому значения
+читаются как os.getenv(NAME) or <значение по умолчанию>.
+"""
+from datetime import timedelta
+from pathlib import Path
+import os
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+SECRET_KEY = os.getenv("DJANGO_SECRET_KEY")
+
+DEBUG = (os.getenv("DEBUG") or "False") == "True"
+
+ALLOWED_HOSTS = [host for host in os.getenv("ALLOWED_HOSTS", "").split(",") if host]
+
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'django.contrib.postgres',
+
+    'rest_framework',
+    'rest_framework_simplejwt',
+    'django_filters',
+    'drf_yasg',
+    'corsheaders',
+    'django_celery_beat',
+
+    'users',
+    'materials',
+
+]
+
+MIDDLEWARE = [
+    'config.metrics.MetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+]
+
+ROOT_URLCONF = 'config.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'config.wsgi.application'
+
+REST_FRAMEWORK = {
+    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+            'users.authentication.CachedJWTAuthentication',
+        ),
+    'DEFAULT_PERMISSION_CLASSES': (
+            'rest_framework.permissions.IsAuthenticated',
+        ),
+    'DEFAULT_RENDERER_CLASSES': (
+            'materials.renderers.FastJSONRenderer',
+            'rest_framework.renderers.BrowsableAPIRenderer',
+        ),
+    # Ограничения применяются к контроллерам с атрибутом throttle_scope:
+    # лимит области - на пользователя, лимит области с суффиксом _ip - на IP-адрес
+    'DEFAULT_THROTTLE_CLASSES': (
+            'users.throttles.UserRateThrottle',
+            'users.throttles.IPRateThrottle',
+        ),
+    'DEFAULT_THROTTLE_RATES': {
+        'auth_ip': '10/min',
+        'payments': '10/min',
+        'payments_ip': '60/min',
+        'subscriptions': '30/min',
+        'subscriptions_ip': '120/min',
+    },
+    # Количество обратных прокси перед приложением. IP-адрес клиента для ограничений берется из X-Forwarded-For
+    # с учетом стольких прокси, а при 0 - из REMOTE_ADDR, чтобы клиент не мог подменить его заголовком
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES') or 0),
+}
+
+# Общий кеш в Redis для всех воркеров gunicorn и Celery. Отдельные логические БД Redis:
+# 1 - закешированные ответы и данные приложения, 2 - курсы валют, 3 - ограничение частоты запросов
+REDIS_URL = os.getenv("REDIS_URL") or "redis://localhost:6379"
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"{REDIS_URL}/1",
+        "KEY_PREFIX": "hw",
+    },
+    "rates": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"{REDIS_URL}/2",
+        "KEY_PREFIX": "hw",
+    },
+    "throttle": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"{REDIS_URL}/3",
+        "KEY_PREFIX": "hw",
+    },
+}
+
+# Сессии читаются из кеша и сохраняются в БД
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+# Конфигурация полнотекстового поиска PostgreSQL. Она же зашита в триггеры поисковых векторов
+# (materials.0010): при смене значения нужна новая миграция, пересоздающая функции триггеров
+# с новой конфигурацией и пересчитывающая векторы.
+SEARCH_CONFIG = 'russian'
+
+# Время хранения (в секундах) закешированной детальной информации о курсе
+COURSE_DETAIL_CACHE_TIMEOUT = 60 * 60
+
+# Количество строк, читаемых из БД за один раз при потоковой выгрузке
+EXPORT_CHUNK_SIZE = 2000
+
+# Время хранения групп пользователя в кеше (в секундах) для проверки прав доступа
+USER_GROUPS_CACHE_TIMEOUT = 5 * 60
+
+# Количество запросов к БД на один HTTP-запрос, при превышении которого в лог пишется предупреждение, 0 - без проверки
+METRICS_QUERY_BUDGET = int(os.getenv('METRICS_QUERY_BUDGET') or 20)
+
+# Доступ к /metrics: токен для заголовка Authorization: Bearer <токен> и/или список IP-адресов через запятую.
+# Если не задано ни то, ни другое, метрики недоступны (в профиле dev открыты для localhost)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_ALLOWED_IPS = [ip for ip in (os.getenv('METRICS_ALLOWED_IPS') or '').split(',') if ip]
+
+# Время хранения пользователя в кеше (в секундах) для аутентификации по JWT, 0 - без кеша
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT') or 60)
+
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+}
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.getenv("POSTGRES_DB"),
+        "USER": os.getenv("POSTGRES_USER"),
+        "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
+        "HOST": os.getenv("POSTGRES_HOST"),
+        "PORT": os.getenv("POSTGRES_PORT"),
+        # Время жизни (в секундах) постоянного соединения с БД, 0 - новое соединение на каждый запрос
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE") or 0),
+        # Проверять постоянное соединение перед повторным использованием в новом запросе
+        "CONN_HEALTH_CHECKS": True,
+    }
+}
+
+
+# Password validation
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = "Europe/Rome"
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+
+STATIC_URL = "/static/"
+STATICFILES_DIRS = [
+    BASE_DIR / "static",
+]
+
+MEDIA_URL = "/media/"
+MEDIA_ROOT = BASE_DIR / "media"
+
+# Default primary key field type
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+AUTH_USER_MODEL = "users.User"
+
+CORS_ALLOWED_ORIGINS = [
+    "https://read-only.example.com",
+    "https://read-and-write.example.com",
+]
+
+CSRF_TRUSTED_ORIGINS = [
+    "https://read-and-write.example.com",
+]
+
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
+
+CUR_API_URL = os.getenv("CUR_API_URL")
+CUR_API_KEY = os.getenv("CUR_API_KEY")
+CUR_API_TIMEOUT = float(os.getenv("CUR_API_TIMEOUT") or 3)
+CUR_API_POOL_SIZE = int(os.getenv("CUR_API_POOL_SIZE") or 10)
+# Время (в секундах), в течение которого курс считается свежим и сколько хранится устаревший курс
+CUR_RATE_TTL = int(os.getenv("CUR_RATE_TTL") or 60 * 60)
+CUR_RATE_STALE_TTL = int(os.getenv("CUR_RATE_STALE_TTL") or 24 * 60 * 60)
+
+# Celery Configuration Options
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_TRACK_STARTED = True
+CELERY_TASK_TIME_LIMIT = 30 * 60
+
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
+
+CELERY_BEAT_SCHEDULE = {
+    'deactivate_inactive_users': {
+        'task': 'users.tasks.deactivate_inactive_users',
+        'schedule': timedelta(days=1),  # Запускать ежедневно
+    },
+    'update_payment_rollups': {
+        'task': 'users.tasks.update_payment_rollups',
+        'schedule': timedelta(minutes=5),  # Пересчитывать агрегаты последних дней каждые 5 минут
+    },
+    'refresh_exchange_rates': {
+        'task': 'users.tasks.refresh_exchange_rates',
+        'schedule': timedelta(seconds=CUR_RATE_TTL / 2),  # Обновлять курс до того, как он устареет
+    },
+}
+
+# Размер пачки пользователей, деактивируемых одним UPDATE
+USER_DEACTIVATION_BATCH_SIZE = int(os.getenv('USER_DEACTIVATION_BATCH_SIZE') or 1000)
+
+# Запас (в секундах), с которым update_payment_rollups пересчитывает дни до водяного знака: покрывает платежи,
+# закоммиченные позже соседних, и переход платежа из pending в ready
+PAYMENT_ROLLUP_LAG = int(os.getenv('PAYMENT_ROLLUP_LAG') or 60 * 60)
+
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+
+EMAIL_HOST = os.getenv("EMAIL_HOST")
+EMAIL_PORT = os.getenv('EMAIL_PORT')
+EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
+EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
+EMAIL_USE_SSL = os.getenv('EMAIL_USE_SSL', 'False') == 'True'
+
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+SERVER_EMAIL = EMAIL_HOST_USER
+
+# Рассылка уведомлений подписчикам: размер порции чтения из БД и размер пачки писем на одну подзадачу
+SUBSCRIBERS_CHUNK_SIZE = int(os.getenv('SUBSCRIBERS_CHUNK_SIZE') or 2000)
+LESSON_UPDATE_EMAIL_BATCH_SIZE = int(os.getenv('LESSON_UPDATE_EMAIL_BATCH_SIZE') or 500)
+
+# Окно тишины (в секундах), в течение которого изменения уроков курса собираются в одно уведомление
+LESSON_UPDATE_NOTIFICATION_DELAY = int(os.getenv('LESSON_UPDATE_NOTIFICATION_DELAY') or 60)
+# Запас (в секундах) сверх окна тишины, в течение которого запланированная рассылка считается живой:
+# если задача потеряется, следующее изменение урока запланирует новую не позже чем через это время
+LESSON_UPDATE_DIGEST_LOCK_TIMEOUT = int(os.getenv('LESSON_UPDATE_DIGEST_LOCK_TIMEOUT') or 10 * 60)
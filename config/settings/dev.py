@@ -0,0 +1,12 @@
+"""
+Настройки для локальной разработки.
+"""
+import os
+
+from config.settings.base import *  # noqa: F401,F403
+
+DEBUG = (os.getenv("DEBUG") or "True") == "True"
+
+ALLOWED_HOSTS = ALLOWED_HOSTS or ["*"]
+
+METRICS_ALLOWED_IPS = METRICS_ALLOWED_IPS or ["127.0.0.1", "::1"]
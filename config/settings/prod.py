@@ -0,0 +1,19 @@
+"""
+Настройки для production: gunicorn (config/gunicorn.conf.py), постоянные соединения с БД, DEBUG выключен.
+"""
+import os
+
+from config.settings.base import *  # noqa: F401,F403
+
+DEBUG = (os.getenv("DEBUG") or "False") == "True"
+
+# Постоянные соединения с БД: соединение открывается один раз на поток воркера и проверяется
+# перед повторным использованием (CONN_HEALTH_CHECKS). Под ASGI соединения не переиспользуются
+# между запросами, поэтому для uvicorn-воркеров используйте DB_CONN_MAX_AGE=0 и пулер (pgbouncer).
+DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("DB_CONN_MAX_AGE") or 600)
+
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
+SESSION_COOKIE_SECURE = (os.getenv("SECURE_COOKIES") or "True") == "True"
+CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
@@ -0,0 +1,18 @@
+"""
+Настройки для тестов: кеши работают на fakeredis в памяти процесса, запущенный Redis не нужен.
+"""
+import fakeredis
+
+from config.settings.dev import *  # noqa: F401,F403
+
+FAKE_REDIS_SERVER = fakeredis.FakeServer()
+
+for alias in CACHES:
+    CACHES[alias]["OPTIONS"] = {"connection_class": fakeredis.FakeConnection, "server": FAKE_REDIS_SERVER}
+
+# Ограничение частоты запросов включается в тестах явно через override_settings
+REST_FRAMEWORK = {**REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {}}
+
+# В режиме eager задачи Celery выполняются сразу и countdown не соблюдается: рассылка изменений уроков,
+# переносящая себя до конца окна тишины, перезапускалась бы без паузы. Поэтому в тестах окно тишины отключено.
+LESSON_UPDATE_NOTIFICATION_DELAY = 0
@@ -0,0 +1,34 @@
+from unittest import mock
+
+from django.db import connection, transaction
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+
+class FastPathContractMixin:
+    """
+    Проверка того, что быстрый путь чтения отдает те же байты, что сериализатор и JSONRenderer DRF.
+    """
+
+    def assertFastPathMatches(self, view_class, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with mock.patch.object(view_class, 'fast_read_path', False):
+            expected = self.client.get(url, params)
+        self.assertEqual(response.content, JSONRenderer().render(expected.data))
+
+
+class QueryPlanMixin:
+    """
+    Проверка плана запроса через EXPLAIN.
+
+    Последовательное сканирование отключается на время запроса, поэтому в плане
+    остается Seq Scan только если для запроса нет подходящего индекса.
+    """
+
+    def assertUsesIndex(self, queryset):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, plan)
+        self.assertIn('Index', plan, plan)
@@ -0,0 +1,175 @@
+import copy
+
+from django.db.models import F
+from rest_framework.fields import (BooleanField, CharField, EmailField, FileField, IntegerField,
+                                   SerializerMethodField, URLField)
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer, ModelSerializer
+
+from config.metrics import serializer_timer
+
+# Поля, значения которых из values() выводятся без преобразования
+RAW_FIELD_CLASSES = (BooleanField, CharField, EmailField, IntegerField, URLField)
+PARENT_KEY = 'fast_path_parent'
+
+_mappers = {}
+
+
+class FastPathUnsupported(Exception):
+    """
+    Сериализатор содержит поле, которое быстрый путь чтения не умеет строить из values().
+    """
+
+
+class RowMapper:
+    """
+    Преобразование строк values() в то же представление, что строит ModelSerializer.
+
+    План преобразования (колонки и функции для каждого поля) строится один раз на сериализатор
+    и набор полей, после чего строки обрабатываются без создания экземпляров моделей и полей DRF.
+
+    Поддерживаются поля модели, первичные ключи связей, изображения и файлы (с абсолютной ссылкой),
+    поля-методы из annotated_fields сериализатора (значение берется из аннотации queryset)
+    и вложенные списки ModelSerializer по обратной связи (загружаются одним запросом на страницу).
+    """
+
+    def __init__(self, serializer):
+        self.model = serializer.Meta.model
+        self.pk_name = self.model._meta.pk.name
+        self.entries = []  # (имя в ответе, вид, колонка, функция преобразования)
+        self.nested = {}  # Имя поля -> (RowMapper, имя внешнего ключа в связанной модели, queryset)
+        columns = [self.pk_name]
+        annotated_fields = getattr(serializer, 'annotated_fields', ())
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, ListSerializer):
+                self.add_nested(name, field)
+                self.entries.append((name, 'nested', self.pk_name, None))
+                continue
+            if isinstance(field, SerializerMethodField):
+                if name not in annotated_fields:
+                    raise FastPathUnsupported(name)
+                self.entries.append((name, 'raw', name, None))
+                columns.append(name)
+                continue
+            if '.' in field.source or field.source == '*':
+                raise FastPathUnsupported(name)
+
+            model_field = self.model._meta.get_field(field.source)
+            if isinstance(field, FileField):
+                self.entries.append((name, 'file', field.source, model_field.storage))
+            elif isinstance(field, PrimaryKeyRelatedField) or type(field) in RAW_FIELD_CLASSES:
+                self.entries.append((name, 'raw', field.source, None))
+            else:
+                self.entries.append((name, 'convert', field.source, copy.deepcopy(field).to_representation))
+            columns.append(field.source)
+
+        self.columns = list(dict.fromkeys(columns))
+
+    def add_nested(self, name, field):
+        """
+        Добавляет вложенный список объектов, связанных с моделью обратным внешним ключом.
+        """
+        if not isinstance(field.child, ModelSerializer):
+            raise FastPathUnsupported(name)
+        relations = [relation for relation in self.model._meta.related_objects
+                     if relation.get_accessor_name() == field.source]
+        if not relations or not relations[0].one_to_many:
+            raise FastPathUnsupported(name)
+        relation = relations[0]
+        queryset = relation.related_model._default_manager.order_by('pk')
+        self.nested[name] = (RowMapper(field.child), relation.field.name, queryset)
+
+    def map_rows(self, rows, request):
+        """
+        Возвращает список представлений для строк values().
+        """
+        rows = list(rows)
+        build_url = request.build_absolute_uri if request is not None else None
+        nested = {name: self.fetch_nested(name, [row[self.pk_name] for row in rows], request)
+                  for name in self.nested}
+        return [self.map_row(row, build_url, nested) for row in rows]
+
+    def map_row(self, row, build_url, nested):
+        item = {}
+        for name, kind, column, convert in self.entries:
+            value = row[column]
+            if kind == 'nested':
+                item[name] = nested[name].get(value, [])
+            elif value is None or kind == 'raw':
+                item[name] = value
+            elif kind == 'file':
+                if not value:
+                    item[name] = None
+                else:
+                    url = convert.url(value)
+                    item[name] = build_url(url) if build_url else url
+            else:
+                item[name] = convert(value)
+        return item
+
+    def fetch_nested(self, name, parent_ids, request):
+        """
+        Загружает вложенные объекты для всех строк страницы одним запросом и группирует их по родителю.
+        """
+        mapper, foreign_key, queryset = self.nested[name]
+        groups = {}
+        if not parent_ids:
+            return groups
+        rows = list(queryset.filter(**{f'{foreign_key}__in': parent_ids})
+                    .values(*mapper.columns, **{PARENT_KEY: F(foreign_key)}))
+        for row, item in zip(rows, mapper.map_rows(rows, request)):
+            groups.setdefault(row[PARENT_KEY], []).append(item)
+        return groups
+
+
+def get_row_mapper(serializer):
+    """
+    Возвращает план преобразования для сериализатора с учетом выбранных в запросе полей.
+    """
+    key = (type(serializer), tuple(serializer.fields))
+    if key not in _mappers:
+        try:
+            _mappers[key] = RowMapper(serializer)
+        except FastPathUnsupported:
+            _mappers[key] = None
+    if _mappers[key] is None:
+        raise FastPathUnsupported(type(serializer).__name__)
+    return _mappers[key]
+
+
+class FastReadListMixin:
+    """
+    Миксин быстрого пути чтения для списков.
+
+    Список строится из values() через RowMapper, минуя создание моделей и to_representation
+    каждого поля, а ответ совпадает с ответом сериализатора байт в байт.
+    Если сериализатор содержит неподдерживаемые поля, используется обычный путь.
+
+    Attributes:
+        fast_read_path (bool): Включает быстрый путь. По умолчанию выключен и включается в представлении
+            явно, когда совпадение ответов проверено контрактным тестом.
+        fast_path_columns (tuple): Дополнительные колонки, например поля курсорной пагинации.
+    """
+    fast_read_path = False
+    fast_path_columns = ()
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_read_path:
+            return super().list(request, *args, **kwargs)
+        try:
+            mapper = get_row_mapper(self.get_serializer())
+        except FastPathUnsupported:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.prefetch_related(None).values(*dict.fromkeys([*mapper.columns, *self.fast_path_columns]))
+        page = self.paginate_queryset(rows)
+        with serializer_timer():
+            data = mapper.map_rows(page if page is not None else rows, request)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
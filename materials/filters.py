@@ -0,0 +1,88 @@
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.functions import Greatest, Upper
+from rest_framework.filters import SearchFilter
+
+
+def is_postgresql(queryset):
+    """
+    Проверяет, выполняется ли queryset в PostgreSQL.
+    """
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def icontains_search(queryset, query, fields):
+    """
+    Поиск подстроки без учета регистра по нескольким полям (работает в любой БД).
+    """
+    return queryset.filter(reduce(or_, [Q(**{f'{field}__icontains': query}) for field in fields]))
+
+
+def full_text_search(queryset, query, fields, vector_field='search_vector'):
+    """
+    Полнотекстовый поиск по полю SearchVectorField с сортировкой по релевантности.
+
+    В PostgreSQL используется индексированный поисковый вектор, в остальных БД - поиск подстроки по fields.
+    """
+    if not is_postgresql(queryset):
+        return icontains_search(queryset, query, fields)
+
+    search_query = SearchQuery(query, config=settings.SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(**{vector_field: search_query}).annotate(
+        search_rank=SearchRank(F(vector_field), search_query)
+    ).order_by('-search_rank', 'pk')
+
+
+def trigram_search(queryset, query, fields):
+    """
+    Нечеткий поиск по триграммам с сортировкой по схожести.
+
+    Сравниваются UPPER(поле) и UPPER(запрос), чтобы использовался GIN-индекс по UPPER(поле) gin_trgm_ops.
+    В остальных БД выполняется поиск подстроки.
+    """
+    if not is_postgresql(queryset):
+        return icontains_search(queryset, query, fields)
+
+    query = query.upper()
+    annotations = {f'_upper_{index}': Upper(field) for index, field in enumerate(fields)}
+    similarity = [TrigramSimilarity(name, query) for name in annotations]
+    return queryset.annotate(**annotations).filter(
+        reduce(or_, [Q(**{f'{name}__trigram_similar': query}) for name in annotations])
+    ).annotate(
+        search_rank=Greatest(*similarity) if len(similarity) > 1 else similarity[0]
+    ).order_by('-search_rank', 'pk')
+
+
+class PostgresSearchFilter(SearchFilter):
+    """
+    Фильтр поиска с выбором режима в представлении через атрибут search_mode.
+
+    - icontains: стандартный поиск DRF (UPPER(поле) LIKE), в PostgreSQL ускоряется GIN-индексом pg_trgm.
+    - trigram: нечеткий поиск по триграммам с сортировкой по схожести.
+    - fulltext: полнотекстовый поиск по полю search_vector_field представления.
+
+    В SQLite и других БД режимы trigram и fulltext сводятся к поиску подстроки.
+
+    Режимы trigram и fulltext сортируют результаты по релевантности, но курсорная пагинация
+    заменяет сортировку своими полями (ordering пагинатора), так как курсор по search_rank построить нельзя.
+    В таких представлениях релевантность работает только как фильтр, а порядок задает курсор.
+    """
+    def filter_queryset(self, request, queryset, view):
+        mode = getattr(view, 'search_mode', 'icontains')
+        search_terms = self.get_search_terms(request)
+        search_fields = self.get_search_fields(view, request)
+        if not search_terms or not search_fields:
+            return queryset
+
+        query = ' '.join(search_terms)
+        if mode == 'trigram':
+            return trigram_search(queryset, query, search_fields)
+        if mode == 'fulltext':
+            return full_text_search(queryset, query, search_fields,
+                                    getattr(view, 'search_vector_field', 'search_vector'))
+        return super().filter_queryset(request, queryset, view)
@@ -0,0 +1,283 @@
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core import mail
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.celery import app as celery_app
+from config.metrics import RequestStats
+from materials.models import Course, Lesson, Subscription
+from materials.tasks import send_lesson_update_email, split_into_batches
+from users.models import Payment, User
+from users.permissions import MODERATORS_GROUP
+from users.tasks import deactivate_inactive_users
+
+SEED_EMAIL = 'benchmark-user-{}@example.com'
+SEED_EMAIL_PREFIX = 'benchmark-user-'
+CLIENT_EMAIL = 'benchmark-client@example.com'
+SEED_COUNTS = {
+    'users': 100_000,
+    'courses': 10_000,
+    'lessons': 500_000,
+    'subscriptions': 2_000_000,
+    'payments': 1_000_000,
+}
+WORDS = ('python', 'django', 'программирование', 'алгоритмы', 'данные', 'веб', 'разработка', 'тестирование')
+
+
+def percentile(values, q):
+    """
+    Возвращает q-й процентиль отсортированного списка (метод ближайшего ранга).
+    """
+    index = max(int(len(values) * q / 100 + 0.5) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный тест горячих путей API и задач Celery на больших объемах данных.
+
+    С --seed сначала заполняет БД через bulk_create (по умолчанию 100 тыс. пользователей, 10 тыс. курсов,
+    500 тыс. уроков, 2 млн подписок и 1 млн платежей, --scale уменьшает объемы). Затем для каждого сценария
+    выполняет запросы через тестовый клиент Django в этом же процессе и считает пропускную способность,
+    p50/p95/p99 задержки и количество запросов к БД. Ограничение частоты запросов на время замера отключается.
+
+    Результаты записываются в JSON (--output). С --baseline результаты сравниваются с сохраненными:
+    команда завершается ошибкой, если p95 вырос больше чем на --tolerance или выросло число запросов к БД.
+    Заполнение предназначено для отдельной БД бенчмарка: повторно оно не выполняется.
+    """
+    help = 'Замеряет задержки и запросы к БД горячих путей API и задач Celery, при необходимости заполняя БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Заполнить БД данными перед замером')
+        parser.add_argument('--scale', type=float, default=1.0, help='Множитель объемов заполнения')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки bulk_create')
+        parser.add_argument('--requests', type=int, default=200, help='Количество запросов на сценарий')
+        parser.add_argument('--warmup', type=int, default=10, help='Количество разогревочных запросов')
+        parser.add_argument('--task-runs', type=int, default=3, help='Количество запусков каждой задачи')
+        parser.add_argument('--output', help='Файл для записи результатов в JSON')
+        parser.add_argument('--baseline', help='JSON с предыдущими результатами для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Допустимый рост p95 (доля)')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(42)
+        counts = None
+        if options['seed']:
+            counts = self.seed(options['scale'], options['batch_size'])
+
+        course_ids = list(Course.objects.order_by('pk').values_list('pk', flat=True)[:1000])
+        lesson_ids = list(Lesson.objects.filter(course__isnull=False).order_by('pk').values_list('pk', flat=True)[:100])
+        if not course_ids or not lesson_ids:
+            raise CommandError('В БД нет курсов с уроками, запустите команду с --seed')
+
+        # Клиент - модератор, чтобы иметь доступ к любому курсу
+        user, _ = User.objects.get_or_create(email=CLIENT_EMAIL)
+        user.groups.add(Group.objects.get_or_create(name=MODERATORS_GROUP)[0])
+        client = Client(headers={'authorization': f'Bearer {AccessToken.for_user(user)}'})
+        rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
+        with override_settings(REST_FRAMEWORK=rest_framework, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                               EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            results = self.run_requests(client, course_ids, options)
+            results.update(self.run_tasks(lesson_ids, options['task_runs']))
+        Subscription.objects.filter(user=user).delete()
+
+        report = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'seed_counts': counts,
+                'requests': options['requests'],
+            },
+            'results': results,
+        }
+        self.print_results(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                self.compare(results, json.load(file)['results'], options['tolerance'])
+
+    def seed(self, scale, batch_size):
+        """
+        Заполняет БД пользователями, курсами, уроками, подписками и платежами через bulk_create.
+        """
+        if User.objects.filter(email__startswith=SEED_EMAIL_PREFIX).exists():
+            raise CommandError('Данные бенчмарка уже созданы, для повторного заполнения используйте чистую БД')
+        counts = {name: max(int(count * scale), 1) for name, count in SEED_COUNTS.items()}
+        counts['subscriptions'] = min(counts['subscriptions'], counts['users'] * counts['courses'])
+        rng = self.rng
+        now = timezone.now()
+        password = make_password(None)
+
+        self.bulk_insert(User, (
+            User(email=SEED_EMAIL.format(i), password=password, last_login=now - timedelta(days=rng.randint(0, 90)))
+            for i in range(counts['users'])
+        ), batch_size)
+        user_ids = list(User.objects.filter(email__startswith=SEED_EMAIL_PREFIX).order_by('pk')
+                        .values_list('pk', flat=True))
+
+        self.bulk_insert(Course, (
+            Course(name=f'Курс {i}', owner_id=rng.choice(user_ids),
+                   description=' '.join(rng.choices(WORDS, k=20)))
+            for i in range(counts['courses'])
+        ), batch_size)
+        course_ids = list(Course.objects.order_by('-pk').values_list('pk', flat=True)[:counts['courses']])
+
+        self.bulk_insert(Lesson, (
+            Lesson(name=f'Урок {i} {rng.choice(WORDS)}', course_id=course_ids[i % len(course_ids)],
+                   owner_id=rng.choice(user_ids), link_to_video=f'https://youtube.com/watch?v={i}')
+            for i in range(counts['lessons'])
+        ), batch_size)
+        lesson_ids = list(Lesson.objects.order_by('-pk').values_list('pk', flat=True)[:counts['lessons']])
+
+        def subscriptions():
+            per_user, remainder = divmod(counts['subscriptions'], len(user_ids))
+            for index, user_id in enumerate(user_ids):
+                # Сдвиг по простому числу дает каждому пользователю свой набор различных курсов
+                for j in range(per_user + (index < remainder)):
+                    yield Subscription(user_id=user_id, course_id=course_ids[(index * 7919 + j) % len(course_ids)])
+
+        self.bulk_insert(Subscription, subscriptions(), batch_size)
+
+        def payments():
+            for _ in range(counts['payments']):
+                paid_item = {'paid_course_id': rng.choice(course_ids)} if rng.random() < 0.5 else \
+                    {'paid_lesson_id': rng.choice(lesson_ids)}
+                yield Payment(user_id=rng.choice(user_ids), amount=rng.randint(100, 100_000),
+                              payment_method=rng.choice(Payment.PAYMENT_METHOD_CHOICES)[0],
+                              status=Payment.STATUS_READY, **paid_item)
+
+        self.bulk_insert(Payment, payments(), batch_size)
+        return counts
+
+    def bulk_insert(self, model, objects, batch_size):
+        """
+        Сохраняет объекты пачками, не держа в памяти больше одной пачки.
+        """
+        started = time.perf_counter()
+        created = 0
+        for batch in split_into_batches(objects, batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=batch_size)
+            created += len(batch)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {created} за {time.perf_counter() - started:.1f} с')
+
+    def run_requests(self, client, course_ids, options):
+        """
+        Замеряет сценарии API.
+        """
+        paid_course = Payment.objects.filter(paid_course__isnull=False).values_list('paid_course_id', flat=True).first()
+        payment_filter = {'payment_method': 'cash', 'paid_course': paid_course or course_ids[0]}
+        # Детальная информация о курсах берется из кеша, заполненного разогревом, чтобы число запросов не плавало
+        detail_ids = course_ids[:max(options['warmup'], 1)]
+        scenarios = {
+            'course_list': lambda i: client.get(reverse('materials:course-list')),
+            'course_list_expand': lambda i: client.get(reverse('materials:course-list'), {'expand': 'lessons'}),
+            'course_detail': lambda i: client.get(reverse('materials:course-detail',
+                                                          args=(detail_ids[i % len(detail_ids)],))),
+            'lesson_list': lambda i: client.get(reverse('materials:lessons-list')),
+            'subscription_toggle': lambda i: client.post(reverse('materials:subscribe'),
+                                                         {'course_id': course_ids[i // 2 % len(course_ids)]}),
+            'payment_list': lambda i: client.get(reverse('users:payment-list')),
+            'payment_filter': lambda i: client.get(reverse('users:payment-list'), payment_filter),
+            'payment_search': lambda i: client.get(reverse('users:payment-list'), {'search': SEED_EMAIL_PREFIX + '1'}),
+        }
+        results = {}
+        for name, request in scenarios.items():
+            for i in range(options['warmup']):
+                request(i)
+            results[name] = self.measure(request, options['requests'], lambda response: response.status_code < 400)
+        return results
+
+    def run_tasks(self, lesson_ids, runs):
+        """
+        Замеряет задачи Celery, выполняя их в текущем процессе.
+
+        Деактивация пользователей откатывается после каждого запуска, чтобы запуски были одинаковыми.
+        """
+        def deactivate(i):
+            with transaction.atomic():
+                result = deactivate_inactive_users.apply()
+                transaction.set_rollback(True)
+            return result
+
+        def notify(i):
+            mail.outbox = []
+            return send_lesson_update_email.apply(args=(lesson_ids[i % len(lesson_ids)],))
+
+        always_eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        try:
+            return {
+                'task_deactivate_inactive_users': self.measure(deactivate, runs, lambda result: result.successful()),
+                'task_send_lesson_update_email': self.measure(notify, runs, lambda result: result.successful()),
+            }
+        finally:
+            celery_app.conf.task_always_eager = always_eager
+
+    def measure(self, call, iterations, is_success):
+        """
+        Выполняет call(i) iterations раз и возвращает задержки, пропускную способность и число запросов к БД.
+        """
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for i in range(iterations):
+            stats = RequestStats()
+            call_started = time.perf_counter()
+            with stats.install():
+                result = call(i)
+            latencies.append(time.perf_counter() - call_started)
+            queries.append(stats.queries)
+            errors += not is_success(result)
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'iterations': iterations,
+            'errors': errors,
+            'rps': round(iterations / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'queries_avg': round(sum(queries) / iterations, 2),
+            'queries_max': max(queries),
+        }
+
+    def print_results(self, results):
+        self.stdout.write(f'{"сценарий":<32} {"зап/с":>9} {"p50 мс":>9} {"p95 мс":>9} {"p99 мс":>9} '
+                          f'{"SQL":>6} {"ошибок":>7}')
+        for name, result in results.items():
+            self.stdout.write(f'{name:<32} {result["rps"]:>9.1f} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} '
+                              f'{result["p99_ms"]:>9.2f} {result["queries_max"]:>6} {result["errors"]:>7}')
+
+    def compare(self, results, baseline, tolerance):
+        """
+        Сравнивает результаты с базовыми и завершает команду ошибкой при регрессии.
+
+        Задержка сравнивается по p95 с допуском tolerance, количество запросов к БД - точно.
+        """
+        regressions = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+                regressions.append(f'{name}: p95 {result["p95_ms"]} мс, было {base["p95_ms"]} мс')
+            if result['queries_max'] > base['queries_max']:
+                regressions.append(f'{name}: запросов к БД {result["queries_max"]}, было {base["queries_max"]}')
+            if result['errors'] > base['errors']:
+                regressions.append(f'{name}: ошибок {result["errors"]}, было {base["errors"]}')
+        if regressions:
+            raise CommandError('Регрессии производительности:\n' + '\n'.join(regressions))
+        self.stdout.write('Регрессий относительно базовых результатов нет')
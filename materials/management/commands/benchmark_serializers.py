@@ -0,0 +1,71 @@
+import time
+
+from django.core.management import BaseCommand
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from materials.models import Course, Lesson
+from materials.serializers import CourseDetailSerializer, CourseListSerializer
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает процессорное время сериализации страницы списка курсов.
+
+    Полный сериализатор с уроками (как было до облегченного списка) сравнивается с CourseListSerializer
+    по умолчанию и с выбором полей. Данные строятся в памяти, поэтому замер не зависит от БД.
+    """
+    help = 'Замеряет время сериализации страницы списка курсов разными сериализаторами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help='Количество курсов на странице')
+        parser.add_argument('--lessons', type=int, default=10, help='Количество уроков в каждом курсе')
+        parser.add_argument('--repeat', type=int, default=20, help='Количество повторов замера')
+
+    def handle(self, *args, **options):
+        courses = self.build_courses(options['page_size'], options['lessons'])
+        variants = [
+            ('detail (до)', CourseDetailSerializer, ''),
+            ('list', CourseListSerializer, ''),
+            ('list ?fields=id,name', CourseListSerializer, 'fields=id,name'),
+            ('list ?expand=lessons', CourseListSerializer, 'expand=lessons'),
+        ]
+
+        baseline = None
+        for title, serializer_class, query in variants:
+            request = Request(RequestFactory().get(f'/materials/?{query}'))
+            elapsed = self.measure(serializer_class, courses, request, options['repeat'])
+            baseline = baseline or elapsed
+            self.stdout.write(f'{title:<24} {elapsed * 1000:8.2f} мс на страницу  x{baseline / elapsed:.1f}')
+
+    def build_courses(self, page_size, lessons_count):
+        """
+        Создает курсы с уроками в памяти, имитируя аннотации и Prefetch списка курсов.
+        """
+        courses = []
+        for i in range(1, page_size + 1):
+            course = Course(pk=i, name=f'Курс {i}', description='Описание курса ' * 10, owner_id=1)
+            lessons = [
+                Lesson(pk=i * lessons_count + j, name=f'Урок {j}', course=course, owner_id=1,
+                       link_to_video='https://youtube.com/video')
+                for j in range(lessons_count)
+            ]
+            course._prefetched_objects_cache = {'lesson_set': Lesson.objects.none()}
+            course._prefetched_objects_cache['lesson_set']._result_cache = lessons
+            course._prefetched_objects_cache['lesson_set']._prefetch_done = True
+            course.lesson_count = lessons_count
+            course.is_subscribed = False
+            courses.append(course)
+        return courses
+
+    def measure(self, serializer_class, courses, request, repeat):
+        """
+        Возвращает лучшее процессорное время сериализации страницы в секундах.
+        """
+        best = None
+        for _ in range(repeat):
+            started = time.process_time()
+            serializer_class(courses, many=True, context={'request': request}).data
+            elapsed = time.process_time() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db.models import Count, Prefetch, Value
+from django.test import RequestFactory
+
+from config.cache import get_or_set_many
+from materials.models import Course, Lesson
+from materials.services import (build_course_detail_payload, get_course_detail_cache_key, get_course_generation,
+                                get_request_origin)
+
+
+class Command(BaseCommand):
+    """
+    Прогревает кеш детальной информации для курсов с наибольшим числом подписчиков.
+
+    Закешированные курсы читаются одним get_many, а недостающие записываются одним set_many.
+    """
+    help = 'Прогревает кеш детальной информации о самых популярных курсах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=100, help='Количество курсов для прогрева')
+        parser.add_argument('--host', default='localhost:8000',
+                            help='Хост, для которого строятся абсолютные ссылки на изображения')
+        parser.add_argument('--secure', action='store_true', help='Строить ссылки на изображения по https')
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/', HTTP_HOST=options['host'], secure=options['secure'])
+        courses = Course.objects.annotate(
+            subscribers=Count('subscription', distinct=True),
+            lesson_count=Count('lesson', distinct=True),
+            is_subscribed=Value(False),
+        ).prefetch_related(
+            Prefetch('lesson_set', queryset=Lesson.objects.order_by('pk'))
+        ).order_by('-subscribers', 'pk')[:options['top']]
+
+        origin = get_request_origin(request)
+        keys = {
+            course: get_course_detail_cache_key(course.pk, get_course_generation(course.pk), origin)
+            for course in courses
+        }
+        get_or_set_many(
+            keys,
+            lambda missing: {course: build_course_detail_payload(course, request) for course in missing},
+            settings.COURSE_DETAIL_CACHE_TIMEOUT,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Прогрет кеш для {len(keys)} курсов'))
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0003_subscription'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingLessonUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Время изменения')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='materials.course', verbose_name='Курс')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='materials.lesson', verbose_name='Урок')),
+            ],
+            options={
+                'verbose_name': 'Отложенное уведомление',
+                'verbose_name_plural': 'Отложенные уведомления',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pendinglessonupdate',
+            constraint=models.UniqueConstraint(fields=('course', 'lesson'), name='unique_pending_lesson_update'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0004_pendinglessonupdate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='stripe_product_id',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='Идентификатор продукта Stripe'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='stripe_product_name',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='Название продукта в Stripe'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='stripe_product_id',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='Идентификатор продукта Stripe'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='stripe_product_name',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='Название продукта в Stripe'),
+        ),
+    ]
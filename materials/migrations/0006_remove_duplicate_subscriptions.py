@@ -0,0 +1,26 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    Subscription = apps.get_model('materials', 'Subscription')
+    duplicates = (
+        Subscription.objects.values('user_id', 'course_id')
+        .annotate(min_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates:
+        Subscription.objects.filter(user_id=row['user_id'], course_id=row['course_id']).exclude(
+            id=row['min_id']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0005_stripe_product'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_subscriptions, migrations.RunPython.noop),
+    ]
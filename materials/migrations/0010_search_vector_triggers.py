@@ -0,0 +1,54 @@
+from django.db import migrations
+
+SEARCH_CONFIG = 'russian'
+
+# Таблица -> выражение для поискового вектора
+SEARCH_VECTORS = {
+    'materials_course': (
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.name, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.description, '')), 'B')"
+    ),
+    'materials_lesson': f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.name, '')), 'A')",
+}
+
+
+def create_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, vector in SEARCH_VECTORS.items():
+        schema_editor.execute(f'''
+            CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {vector};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql;
+        ''')
+        schema_editor.execute(f'''
+            CREATE TRIGGER {table}_search_vector_trigger
+            BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update();
+        ''')
+        # Заполняем вектор для существующих строк: триггер пересчитает его при обновлении
+        schema_editor.execute(f'UPDATE {table} SET search_vector = NULL;')
+        schema_editor.execute(f'CREATE INDEX {table}_search_vector_idx ON {table} USING gin (search_vector);')
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in SEARCH_VECTORS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_search_vector_idx;')
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table};')
+        schema_editor.execute(f'DROP FUNCTION IF EXISTS {table}_search_vector_update();')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0009_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
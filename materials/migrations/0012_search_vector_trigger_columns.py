@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Таблица -> столбцы, от которых зависит поисковый вектор (см. 0010_search_vector_triggers)
+SEARCH_COLUMNS = {
+    'materials_course': ('name', 'description'),
+    'materials_lesson': ('name',),
+}
+
+
+def recreate_search_triggers(schema_editor, events):
+    for table, columns in SEARCH_COLUMNS.items():
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table};')
+        schema_editor.execute(f'''
+            CREATE TRIGGER {table}_search_vector_trigger
+            BEFORE {events(columns)} ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update();
+        ''')
+
+
+def limit_trigger_columns(apps, schema_editor):
+    # Вектор пересчитывается только при изменении поисковых полей, а не при любом UPDATE строки
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    recreate_search_triggers(schema_editor, lambda columns: f'INSERT OR UPDATE OF {", ".join(columns)}')
+
+
+def restore_trigger_columns(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    recreate_search_triggers(schema_editor, lambda columns: 'INSERT OR UPDATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0011_drop_redundant_fk_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(limit_trigger_columns, restore_trigger_columns),
+    ]
@@ -0,0 +1,77 @@
+from rest_framework.permissions import SAFE_METHODS
+
+
+def get_query_list(request, param):
+    """
+    Возвращает список значений параметра запроса, перечисленных через запятую.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return []
+    return [name.strip() for name in request.query_params.get(param, '').split(',') if name.strip()]
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Миксин сериализатора для выбора полей параметрами запроса.
+
+    - fields=a,b оставляет в ответе только перечисленные поля.
+    - expand=c добавляет поля из expandable_fields, которые по умолчанию не выводятся.
+
+    Параметры учитываются только для чтения (GET, HEAD, OPTIONS) и только у сериализатора верхнего уровня.
+    """
+    expandable_fields = {}  # Имя поля -> (класс поля, аргументы конструктора)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = get_query_list(request, 'fields')
+        expand = get_query_list(request, 'expand')
+
+        for name in expand:
+            if name in self.expandable_fields and name not in self.fields:
+                field_class, field_kwargs = self.expandable_fields[name]
+                self.fields[name] = field_class(**field_kwargs)
+
+        if requested:
+            allowed = set(requested) | set(expand)
+            for name in list(self.fields):
+                if name not in allowed:
+                    self.fields.pop(name)
+
+
+class SparseFieldsViewMixin:
+    """
+    Миксин представления, который ограничивает выбираемые из БД колонки полями из параметра fields.
+    """
+
+    def get_requested_fields(self):
+        """
+        Возвращает поля из параметра fields.
+        """
+        return get_query_list(self.request, 'fields')
+
+    def get_expanded_fields(self):
+        """
+        Возвращает поля из параметра expand.
+        """
+        return get_query_list(self.request, 'expand')
+
+    def is_field_requested(self, name):
+        """
+        Проверяет, нужно ли поле в ответе (если параметр fields не задан, нужны все поля).
+        """
+        requested = self.get_requested_fields()
+        return not requested or name in requested
+
+    def only_requested_fields(self, queryset, *required):
+        """
+        Загружает из БД только колонки запрошенных полей модели, первичного ключа и полей required.
+
+        В required передаются поля, которые нужны независимо от ответа, например для курсорной пагинации.
+        """
+        requested = self.get_requested_fields()
+        if not requested:
+            return queryset
+        concrete_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        names = [name for name in requested if name in concrete_fields]
+        return queryset.only(queryset.model._meta.pk.name, *required, *names)
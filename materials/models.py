@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 NULLABLE = {'blank': True, 'null': True}
@@ -11,6 +12,9 @@ class Course(models.Model):
         name (CharField): Название курса.
         course_preview (ImageField): Превью (картинка) курса.
         description (TextField): Описание курса.
+        stripe_product_id (CharField): Идентификатор продукта курса в Stripe.
+        stripe_product_name (CharField): Название, с которым продукт сохранен в Stripe.
+        search_vector (SearchVectorField): Поисковый вектор, заполняется триггером PostgreSQL.
     """
     name = models.CharField(max_length=100, verbose_name='Название курса', help_text='Укажите название курса')
     course_preview = models.ImageField(upload_to='materials/photo', verbose_name='Фото',
@@ -19,6 +23,10 @@ class Course(models.Model):
 
     owner = models.ForeignKey('users.User', on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Владелец',
                               help_text='Укажите владельца курса')
+    stripe_product_id = models.CharField(max_length=255, **NULLABLE, verbose_name='Идентификатор продукта Stripe')
+    stripe_product_name = models.CharField(max_length=100, **NULLABLE,
+                                           verbose_name='Название продукта в Stripe')
+    search_vector = SearchVectorField(**NULLABLE, editable=False, verbose_name='Поисковый вектор')
 
     class Meta:
         verbose_name = 'Курс'
@@ -37,24 +45,45 @@ class Lesson(models.Model):
         course (ForeignKey): Ссылка на курс, к которому относится урок.
         lesson_preview (ImageField): Превью (картинка) урока.
         link_to_video (URLField): Ссылка на видео урока.
+        stripe_product_id (CharField): Идентификатор продукта урока в Stripe.
+        stripe_product_name (CharField): Название, с которым продукт сохранен в Stripe.
+        search_vector (SearchVectorField): Поисковый вектор, заполняется триггером PostgreSQL.
     """
     name = models.CharField(max_length=100, verbose_name='Урок', help_text='Укажите название урока')
+    # Отдельный индекс не нужен: поиск по курсу обслуживает составной индекс lesson_course_id_idx
     course = models.ForeignKey(Course, on_delete=models.SET_NULL, verbose_name='Курс', help_text='Выберите курс',
-                               **NULLABLE)
+                               db_index=False, **NULLABLE)
     lesson_preview = models.ImageField(upload_to='materials/photo', verbose_name='Фото',
                                        help_text='Загрузите фото урока', **NULLABLE)
     link_to_video = models.URLField(verbose_name='Ссылка на видео', help_text='Укажите ссылку на видео урока',
                                     **NULLABLE)
     owner = models.ForeignKey('users.User', on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Владелец',
                               help_text='Укажите владельца урока')
+    stripe_product_id = models.CharField(max_length=255, **NULLABLE, verbose_name='Идентификатор продукта Stripe')
+    stripe_product_name = models.CharField(max_length=100, **NULLABLE,
+                                           verbose_name='Название продукта в Stripe')
+    search_vector = SearchVectorField(**NULLABLE, editable=False, verbose_name='Поисковый вектор')
 
     class Meta:
         verbose_name = 'Урок'
         verbose_name_plural = 'Уроки'
+        indexes = [
+            models.Index(fields=['course', 'id'], name='lesson_course_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Запоминает курс, с которым урок загружен из базы, чтобы при переносе урока сбросить кеш и старого курса.
+        """
+        instance = super().from_db(db, field_names, values)
+        if 'course_id' in instance.__dict__:
+            instance._loaded_course_id = instance.course_id
+        return instance
+
 
 class Subscription(models.Model):
     """
@@ -64,12 +93,47 @@ class Subscription(models.Model):
         user (ForeignKey): Ссылка на пользователя, который подписан.
         course (ForeignKey): Ссылка на курс, на который пользователь подписан.
     """
-    user = models.ForeignKey('users.User', on_delete=models.CASCADE, verbose_name='Пользователь')
-    course = models.ForeignKey(Course, on_delete=models.CASCADE, verbose_name='Курс')
+    # Отдельные индексы не нужны: их обслуживают unique_subscription (user, course)
+    # и subscription_course_user_idx (course, user)
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, verbose_name='Пользователь', db_index=False)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, verbose_name='Курс', db_index=False)
 
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'course'], name='unique_subscription'),
+        ]
+        indexes = [
+            models.Index(fields=['course', 'user'], name='subscription_course_user_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user} -> {self.course}'
+
+
+class PendingLessonUpdate(models.Model):
+    """
+    Модель отложенного уведомления об обновлении урока.
+
+    Изменения уроков одного курса накапливаются здесь, пока не пройдет окно тишины,
+    после чего подписчикам отправляется одно письмо со списком всех измененных уроков.
+
+    Attributes:
+        course (ForeignKey): Курс, в котором изменился урок.
+        lesson (ForeignKey): Измененный урок.
+        updated_at (DateTimeField): Время последнего изменения урока.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, verbose_name='Курс')
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, verbose_name='Урок')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Время изменения')
+
+    class Meta:
+        verbose_name = 'Отложенное уведомление'
+        verbose_name_plural = 'Отложенные уведомления'
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'lesson'], name='unique_pending_lesson_update'),
+        ]
+
+    def __str__(self):
+        return f'{self.course} -> {self.lesson}'
@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPagination(PageNumberPagination):
@@ -8,3 +8,53 @@ class CustomPagination(PageNumberPagination):
     page_size = 3  # Количество элементов на странице
     page_size_query_param = 'page_size'  # Параметр для изменения количества элементов на странице
     max_page_size = 10  # Максимальное количество элементов на странице
+
+
+class CustomCursorPagination(CursorPagination):
+    """
+    Курсорная (keyset) пагинация.
+
+    Страницы выбираются условием по полям сортировки вместо OFFSET, а общее количество
+    элементов не считается, если его не запросили параметром with_count=true.
+    """
+    page_size = 3  # Количество элементов на странице
+    page_size_query_param = 'page_size'  # Параметр для изменения количества элементов на странице
+    max_page_size = 10  # Максимальное количество элементов на странице
+    ordering = ('id',)  # Поля сортировки, по которым строится курсор
+    count_query_param = 'with_count'  # Параметр для запроса общего количества элементов
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true', 'True'):
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data = {'count': self.count, **response.data}
+        return response
+
+
+class SelectablePagination(CustomPagination):
+    """
+    Пагинация с выбором режима в запросе.
+
+    По умолчанию работает постранично, а с параметром pagination=cursor (или при наличии
+    параметра cursor) переключается на курсорную пагинацию.
+    """
+    cursor_pagination_class = CustomCursorPagination
+    pagination_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if (request.query_params.get(self.pagination_query_param) == 'cursor'
+                or self.cursor_pagination_class.cursor_query_param in request.query_params):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,32 +1,68 @@
-from rest_framework.fields import SerializerMethodField
-from rest_framework.serializers import ModelSerializer, URLField
+from collections import Counter
 
+from rest_framework.fields import DictField, IntegerField, ListField, SerializerMethodField
+from rest_framework.serializers import ListSerializer, ModelSerializer, Serializer, URLField, ValidationError
+
+from config.metrics import TimedSerializerMixin
+from materials.mixins import SparseFieldsSerializerMixin
 from materials.models import Course, Lesson, Subscription
 from materials.validators import validate_youtube_link
 
 
-class CourseSerializer(ModelSerializer):
+class CourseSerializer(TimedSerializerMixin, ModelSerializer):
     class Meta:
         model = Course
-        fields = "__all__"
+        exclude = ("stripe_product_id", "stripe_product_name", "search_vector")
+
+
+class LessonListSerializer(ListSerializer):
+    """
+    Сериализатор списка уроков для массового создания и обновления.
+
+    Создание выполняется одним bulk_create, обновление - одним bulk_update.
+    При обновлении instance - список уроков в том же порядке, что и входные данные.
+    """
 
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            if not hasattr(self, '_instances_by_pk'):
+                self._instances_by_pk = {lesson.pk: lesson for lesson in self.instance}
+            self.child.instance = self._instances_by_pk.get(data.get('id')) if isinstance(data, dict) else None
+        return super().run_child_validation(data)
 
-class LessonSerializer(ModelSerializer):
+    def create(self, validated_data):
+        return Lesson.objects.bulk_create([Lesson(**attrs) for attrs in validated_data])
+
+    def update(self, instance, validated_data):
+        fields = set()
+        for lesson, attrs in zip(instance, validated_data):
+            for attr, value in attrs.items():
+                setattr(lesson, attr, value)
+            fields.update(attrs)
+        if fields:
+            Lesson.objects.bulk_update(instance, sorted(fields))
+        return instance
+
+
+class LessonSerializer(TimedSerializerMixin, SparseFieldsSerializerMixin, ModelSerializer):
     link_to_video = URLField(validators=[validate_youtube_link])
 
     class Meta:
         model = Lesson
-        fields = "__all__"
+        exclude = ("stripe_product_id", "stripe_product_name", "search_vector")
+        list_serializer_class = LessonListSerializer
 
 
-class CourseDetailSerializer(ModelSerializer):
+class CourseDetailSerializer(TimedSerializerMixin, ModelSerializer):
     """
        Сериализатор для модели Course, который включает количество уроков и информацию по всем урокам курса.
 
        Attributes:
            lesson_count (SerializerMethodField): Количество уроков в курсе.
            lessons (LessonSerializer): Информация по всем урокам курса.
+           annotated_fields (tuple): Поля-методы, значения которых берутся из аннотаций queryset.
        """
+    annotated_fields = ('lesson_count', 'is_subscribed')
     lesson_count = SerializerMethodField()
     lessons = LessonSerializer(many=True, read_only=True, source='lesson_set')
     is_subscribed = SerializerMethodField()
@@ -34,16 +70,26 @@ class CourseDetailSerializer(ModelSerializer):
     def get_lesson_count(self, course):
         """
         Метод для подсчета количества уроков в курсе.
+
+        Использует аннотацию lesson_count из queryset, если она есть.
         """
+        lesson_count = getattr(course, 'lesson_count', None)
+        if lesson_count is not None:
+            return lesson_count
         return Lesson.objects.filter(course=course).count()
 
     def get_is_subscribed(self, course):
         """
         Метод для определения, подписан ли текущий пользователь на курс.
+
+        Использует аннотацию is_subscribed из queryset, если она есть.
         """
+        is_subscribed = getattr(course, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return Subscription.objects.filter(user=request.user, course=course).exists()
+            return Subscription.objects.filter(user_id=request.user.pk, course=course).exists()
         return False
 
     class Meta:
@@ -51,7 +97,23 @@ class CourseDetailSerializer(ModelSerializer):
         fields = ("id", "name", "course_preview", "description", "owner", "lesson_count", "lessons", "is_subscribed")
 
 
-class SubscriptionSerializer(ModelSerializer):
+class CourseListSerializer(SparseFieldsSerializerMixin, CourseDetailSerializer):
+    """
+    Облегченный сериализатор для списка курсов.
+
+    По умолчанию не включает уроки курса, их можно добавить параметром запроса expand=lessons.
+    """
+    lessons = None
+    expandable_fields = {
+        'lessons': (LessonSerializer, {'many': True, 'read_only': True, 'source': 'lesson_set'}),
+    }
+
+    class Meta:
+        model = Course
+        fields = ("id", "name", "course_preview", "description", "owner", "lesson_count", "is_subscribed")
+
+
+class SubscriptionSerializer(TimedSerializerMixin, ModelSerializer):
     """
     Сериализатор для модели Subscription.
 
@@ -63,3 +125,42 @@ class SubscriptionSerializer(ModelSerializer):
     class Meta:
         model = Subscription
         fields = ['user', 'course']
+
+
+class LessonBulkSerializer(Serializer):
+    """
+    Сериализатор структуры запроса массового изменения уроков.
+
+    Проверяет, что create и update - списки объектов, delete - список целых id, у каждого элемента update
+    есть целый id, а id не повторяются и не встречаются одновременно в update и delete.
+    Поля уроков проверяются отдельно сериализатором LessonSerializer.
+    """
+    create = ListField(child=DictField(), required=False, default=list)
+    update = ListField(child=DictField(), required=False, default=list)
+    delete = ListField(child=IntegerField(), required=False, default=list)
+
+    def validate_update(self, value):
+        id_field = IntegerField()
+        errors = {}
+        for index, item in enumerate(value):
+            try:
+                item['id'] = id_field.run_validation(item.get('id'))
+            except ValidationError as exc:
+                errors[index] = {'id': exc.detail}
+        if errors:
+            raise ValidationError(errors)
+        return value
+
+    def validate(self, attrs):
+        update_ids = [item['id'] for item in attrs['update']]
+        errors = {}
+        for name, ids in (('update', update_ids), ('delete', attrs['delete'])):
+            duplicates = sorted(pk for pk, count in Counter(ids).items() if count > 1)
+            if duplicates:
+                errors[name] = [f'Повторяющиеся id: {duplicates}']
+        both = sorted(set(update_ids) & set(attrs['delete']))
+        if both:
+            errors['non_field_errors'] = [f'Уроки нельзя одновременно обновить и удалить: {both}']
+        if errors:
+            raise ValidationError(errors)
+        return attrs
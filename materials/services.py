@@ -0,0 +1,166 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from config.cache import bump_version, get_or_build, get_version, make_key
+from materials.models import Course, PendingLessonUpdate, Subscription
+from materials.serializers import CourseDetailSerializer
+from materials.tasks import schedule_course_update_digest
+
+
+def notify_lessons_updated(lessons):
+    """
+    Откладывает уведомление подписчиков об изменении уроков.
+
+    Изменения записываются в PendingLessonUpdate, а задача рассылки планируется один раз на курс
+    с задержкой LESSON_UPDATE_NOTIFICATION_DELAY. Повторные изменения в течение этого окна
+    попадают в то же письмо и не создают новых задач. Задача планируется после записи изменения,
+    чтобы рассылка, завершающаяся в это время, либо увидела его, либо уступила планирование.
+    """
+    lessons_by_course = {}
+    for lesson in lessons:
+        if lesson.course_id is not None:
+            lessons_by_course.setdefault(lesson.course_id, set()).add(lesson.pk)
+
+    for course_id, lesson_ids in lessons_by_course.items():
+        PendingLessonUpdate.objects.bulk_create(
+            [PendingLessonUpdate(course_id=course_id, lesson_id=lesson_id) for lesson_id in lesson_ids],
+            update_conflicts=True,
+            unique_fields=['course', 'lesson'],
+            update_fields=['updated_at'],
+        )
+        schedule_course_update_digest(course_id, settings.LESSON_UPDATE_NOTIFICATION_DELAY)
+
+
+def subscribe(user, course_id):
+    """
+    Подписывает пользователя на курс.
+
+    Вставка выполняется с ON CONFLICT DO NOTHING, поэтому повторные и одновременные
+    запросы не создают дублирующих подписок. Возвращает False, если курса не существует.
+    """
+    if not Course.objects.filter(pk=course_id).exists():
+        return False
+    Subscription.objects.bulk_create([Subscription(user=user, course_id=course_id)], ignore_conflicts=True)
+    return True
+
+
+def unsubscribe(user, course_id):
+    """
+    Удаляет подписку пользователя на курс одним запросом. Возвращает True, если подписка была.
+    """
+    deleted, _ = Subscription.objects.filter(user=user, course_id=course_id).delete()
+    return bool(deleted)
+
+
+def toggle_subscription(user, course_id):
+    """
+    Переключает подписку пользователя на курс.
+
+    Сначала подписка удаляется, и только если удалять было нечего - создается.
+    Возвращает True, если подписка добавлена, False - если удалена, и None, если курса не существует.
+    """
+    if unsubscribe(user, course_id):
+        return False
+    return True if subscribe(user, course_id) else None
+
+
+async def asubscribe(user, course_id):
+    """
+    Асинхронная версия subscribe.
+    """
+    if not await Course.objects.filter(pk=course_id).aexists():
+        return False
+    await Subscription.objects.abulk_create([Subscription(user=user, course_id=course_id)], ignore_conflicts=True)
+    return True
+
+
+async def aunsubscribe(user, course_id):
+    """
+    Асинхронная версия unsubscribe.
+    """
+    deleted, _ = await Subscription.objects.filter(user=user, course_id=course_id).adelete()
+    return bool(deleted)
+
+
+async def atoggle_subscription(user, course_id):
+    """
+    Асинхронная версия toggle_subscription.
+    """
+    if await aunsubscribe(user, course_id):
+        return False
+    return True if await asubscribe(user, course_id) else None
+
+
+COURSE_VERSION_NAME = 'course:{}'
+COURSE_DETAIL_HITS_KEY = 'course_detail_cache:hits'
+COURSE_DETAIL_MISSES_KEY = 'course_detail_cache:misses'
+
+
+def get_course_generation(course_id):
+    """
+    Возвращает номер поколения курса, который меняется при каждом изменении курса или его уроков.
+    """
+    return get_version(COURSE_VERSION_NAME.format(course_id))
+
+
+def bump_course_generation(*course_ids):
+    """
+    Увеличивает номер поколения курсов, делая недействительными их закешированные ответы.
+    """
+    bump_version(*[COURSE_VERSION_NAME.format(course_id) for course_id in course_ids if course_id is not None])
+
+
+def _incr_counter(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_course_detail_cache_stats():
+    """
+    Возвращает количество попаданий и промахов кеша детальной информации о курсах.
+    """
+    stats = cache.get_many([COURSE_DETAIL_HITS_KEY, COURSE_DETAIL_MISSES_KEY])
+    return {'hits': stats.get(COURSE_DETAIL_HITS_KEY, 0), 'misses': stats.get(COURSE_DETAIL_MISSES_KEY, 0)}
+
+
+def get_request_origin(request):
+    """
+    Возвращает схему и хост запроса, от которых зависят абсолютные ссылки в ответе.
+    """
+    return f'{request.scheme}://{request.get_host()}'
+
+
+def get_course_detail_cache_key(course_id, generation, origin):
+    """
+    Возвращает ключ кеша сериализованного курса.
+
+    Ключ строится в пространстве имен курса с его поколением, схема и хост входят в ключ,
+    так как ссылки на изображения абсолютные.
+    """
+    return make_key(COURSE_VERSION_NAME.format(course_id), 'detail', origin, version=generation)
+
+
+def build_course_detail_payload(course, request):
+    """
+    Сериализует курс для кеша без признака подписки, который зависит от пользователя.
+    """
+    data = CourseDetailSerializer(course, context={'request': request}).data
+    data.pop('is_subscribed')
+    return dict(data)
+
+
+def get_cached_course_detail(course_id, generation, origin, build):
+    """
+    Возвращает сериализованный курс (без признака подписки) из кеша.
+
+    При промахе данные строятся функцией build и сохраняются на COURSE_DETAIL_CACHE_TIMEOUT секунд.
+    Одновременные промахи по одному курсу строят данные один раз, а незадолго до истечения
+    данные обновляются заранее одним запросом.
+    """
+    key = get_course_detail_cache_key(course_id, generation, origin)
+    payload, hit = get_or_build(key, build, settings.COURSE_DETAIL_CACHE_TIMEOUT)
+    _incr_counter(COURSE_DETAIL_HITS_KEY if hit else COURSE_DETAIL_MISSES_KEY)
+    return payload
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from materials.models import Course, Lesson
+from materials.services import bump_course_generation
+
+
+@receiver([post_save, post_delete], sender=Course)
+def reset_course_cache(sender, instance, **kwargs):
+    """
+    Сбрасывает кеш курса при его изменении или удалении.
+    """
+    bump_course_generation(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def reset_lesson_course_cache(sender, instance, **kwargs):
+    """
+    Сбрасывает кеш курса при изменении или удалении его урока.
+
+    Если урок перенесен в другой курс, сбрасывается и кеш курса, с которым урок был загружен из базы.
+    """
+    bump_course_generation(instance.course_id, getattr(instance, '_loaded_course_id', None))
+    instance._loaded_course_id = instance.course_id
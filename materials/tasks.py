@@ -1,23 +1,152 @@
+import logging
+from datetime import timedelta
+from itertools import islice
+
 from celery import shared_task
-from django.core.mail import send_mail
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
 from config.settings import EMAIL_HOST_USER
-from materials.models import Subscription
+from materials.models import Course, PendingLessonUpdate, Subscription
 from materials.models import Lesson
 
+logger = logging.getLogger(__name__)
+
+# Признак того, что задача рассылки изменений курса уже запланирована
+COURSE_DIGEST_SCHEDULED_KEY = 'course_update_digest_scheduled:{}'
+
+
+def iter_subscriber_emails(course_id, chunk_size=None):
+    """
+    Построчно (порциями по chunk_size) читает email-адреса подписчиков курса, не создавая объекты моделей.
+    """
+    chunk_size = chunk_size or settings.SUBSCRIBERS_CHUNK_SIZE
+    return (
+        Subscription.objects.filter(course_id=course_id)
+        .order_by()
+        .values_list('user__email', flat=True)
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def split_into_batches(items, batch_size):
+    """
+    Разбивает итерируемый объект на списки длиной не более batch_size.
+    """
+    iterator = iter(items)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+@shared_task
+def send_email_batch(subject, message, recipient_list):
+    """
+    Отправляет письмо каждому адресату из пачки через одно SMTP-соединение.
+
+    Возвращает количество успешно отправленных и неотправленных писем.
+    """
+    messages = [EmailMessage(subject, message, EMAIL_HOST_USER, [email]) for email in recipient_list]
+    try:
+        connection = get_connection(fail_silently=True)
+        sent = connection.send_messages(messages) or 0
+    except Exception:
+        logger.exception('Ошибка отправки пачки из %s писем', len(messages))
+        sent = 0
+    result = {'sent': sent, 'failed': len(messages) - sent}
+    logger.info('Отправлена пачка писем "%s": %s', subject, result)
+    return result
+
+
+def send_course_email(course_id, subject, message):
+    """
+    Рассылает письмо всем подписчикам курса и возвращает количество отправленных в очередь пачек.
+
+    Адреса подписчиков читаются из БД потоком и делятся на пачки по LESSON_UPDATE_EMAIL_BATCH_SIZE.
+    Каждая пачка ставится в очередь отдельной подзадачей сразу после чтения, поэтому в памяти
+    одновременно находится не больше одной пачки адресов, а бэкенд результатов Celery не нужен.
+    """
+    batches = 0
+    for batch in split_into_batches(iter_subscriber_emails(course_id), settings.LESSON_UPDATE_EMAIL_BATCH_SIZE):
+        send_email_batch.delay(subject, message, batch)
+        batches += 1
+    logger.info('Рассылка подписчикам курса %s: %s пачек в очереди', course_id, batches)
+    return batches
+
 
 @shared_task
 def send_lesson_update_email(lesson_id):
     """Отправляет email-уведомление всем подписчикам курса о его обновлении."""
-    lesson = Lesson.objects.get(id=lesson_id)  # Получаем обновленный урок по его идентификатору
-    course = lesson.course  # Получаем курс, к которому относится урок
-    subscribers = Subscription.objects.filter(course=course)  # Получаем всех подписчиков курса
-    recipient_list = []
-    for sub in subscribers:
-        recipient_list.append(sub.user.email)  # Заполняем список email-адресов подписчиков
-
-    if recipient_list:
-        subject = f'Урок "{lesson.name}" обновлен в курсе {course.name}'
-        message = f'Урок "{lesson.name}" в курсе {course.name} был обновлен. Проверьте новые материалы!'
-        from_email = EMAIL_HOST_USER
-
-        send_mail(subject, message, from_email, recipient_list)
+    lesson = Lesson.objects.select_related('course').get(id=lesson_id)  # Получаем обновленный урок и его курс
+    course = lesson.course
+    if course is None:
+        return None
+
+    subject = f'Урок "{lesson.name}" обновлен в курсе {course.name}'
+    message = f'Урок "{lesson.name}" в курсе {course.name} был обновлен. Проверьте новые материалы!'
+    return send_course_email(course.id, subject, message)
+
+
+def schedule_course_update_digest(course_id, countdown):
+    """
+    Планирует задачу рассылки изменений курса, если она еще не запланирована.
+
+    Право запланировать задачу захватывается атомарным cache.add, поэтому одновременные изменения
+    создают одну задачу. Признак живет countdown + LESSON_UPDATE_DIGEST_LOCK_TIMEOUT секунд: если задача
+    потерялась или упала, следующее изменение запланирует новую.
+    """
+    timeout = countdown + settings.LESSON_UPDATE_DIGEST_LOCK_TIMEOUT
+    if cache.add(COURSE_DIGEST_SCHEDULED_KEY.format(course_id), True, timeout):
+        send_course_update_digest.apply_async((course_id,), countdown=countdown)
+        return True
+    return False
+
+
+@shared_task
+def send_course_update_digest(course_id):
+    """
+    Отправляет подписчикам одно письмо со всеми уроками курса, измененными за окно тишины.
+
+    Если с последнего изменения прошло меньше LESSON_UPDATE_NOTIFICATION_DELAY секунд,
+    задача переносит себя на оставшееся время. После обработки задача снимает признак планирования
+    и, если за это время появились новые изменения, планирует следующую рассылку.
+    """
+    key = COURSE_DIGEST_SCHEDULED_KEY.format(course_id)
+    delay = timedelta(seconds=settings.LESSON_UPDATE_NOTIFICATION_DELAY)
+    last_update = PendingLessonUpdate.objects.filter(course_id=course_id).aggregate(
+        last_update=Max('updated_at')
+    )['last_update']
+    if last_update is None:
+        cache.delete(key)
+        return None
+
+    remaining = (last_update + delay - timezone.now()).total_seconds()
+    if remaining > 0:
+        cache.touch(key, remaining + settings.LESSON_UPDATE_DIGEST_LOCK_TIMEOUT)
+        send_course_update_digest.apply_async((course_id,), countdown=remaining)
+        return None
+
+    with transaction.atomic():
+        pending = list(
+            PendingLessonUpdate.objects.select_for_update()
+            .filter(course_id=course_id, updated_at__lte=last_update)
+            .select_related('lesson')
+            .order_by('lesson_id')
+        )
+        PendingLessonUpdate.objects.filter(pk__in=[item.pk for item in pending]).delete()
+
+    # Признак снимается после фиксации удаления и до проверки оставшихся изменений: изменение, сохраненное
+    # после проверки, само захватит признак, а сохраненное раньше будет найдено проверкой
+    cache.delete(key)
+    if PendingLessonUpdate.objects.filter(course_id=course_id).exists():
+        schedule_course_update_digest(course_id, settings.LESSON_UPDATE_NOTIFICATION_DELAY)
+    if not pending:
+        return None
+
+    course = Course.objects.get(pk=course_id)
+    lesson_names = ', '.join(f'"{item.lesson.name}"' for item in pending)
+    subject = f'Обновления в курсе {course.name}'
+    message = f'В курсе {course.name} были обновлены уроки: {lesson_names}. Проверьте новые материалы!'
+    return send_course_email(course_id, subject, message)
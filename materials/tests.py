@@ -1,8 +1,36 @@
+import json
+import tempfile
+import time
+from io import StringIO
+from unittest import mock, skipIf, skipUnless
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
-from materials.models import Lesson, Course, Subscription
+from config.cache import bump_version, get_or_build, get_or_set_many, make_key
+from config.celery import app as celery_app
+from config.metrics import DB_QUERIES, HISTOGRAMS, SERIALIZER_DURATION
+from config.testing import FastPathContractMixin, QueryPlanMixin
+from materials.models import Lesson, Course, PendingLessonUpdate, Subscription
+from materials.renderers import FastJSONRenderer
+from materials.views import CourseViewSet, LessonListAPIView
+from materials.filters import full_text_search
+from materials.services import (bump_course_generation, get_course_detail_cache_key, get_course_detail_cache_stats,
+                                get_course_generation, notify_lessons_updated, subscribe, toggle_subscription)
+from materials.tasks import (COURSE_DIGEST_SCHEDULED_KEY, schedule_course_update_digest, send_course_update_digest,
+                             send_email_batch, send_lesson_update_email)
 from users.models import User
 
 
@@ -95,10 +123,10 @@ class CourseTestCase(APITestCase):
 
     def test_course_list(self):
         """
-        Тест списка курсов.
+        Тест списка курсов с уроками.
         """
         url = reverse("materials:course-list")
-        response = self.client.get(url)
+        response = self.client.get(url, {"expand": "lessons"})
         data = response.json()
         expected_data = {
             "count": 1,
@@ -129,6 +157,286 @@ class CourseTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(data, expected_data)
 
+    def test_course_list_query_count(self):
+        """
+        Тест того, что количество запросов к БД не растет с размером страницы.
+        """
+        for i in range(10):
+            course = Course.objects.create(name=f'Курс {i}', owner=self.user)
+            Lesson.objects.create(name=f'Урок {i}', course=course, link_to_video='https://youtube.com/video',
+                                  owner=self.user)
+            Subscription.objects.create(user=self.user, course=course)
+
+        url = reverse("materials:course-list")
+        with CaptureQueriesContext(connection) as small_page:
+            response = self.client.get(url, {"page_size": 2, "expand": "lessons"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as large_page:
+            response = self.client.get(url, {"page_size": 10, "expand": "lessons"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(len(response.json()["results"]), 10)
+        self.assertEqual(len(small_page.captured_queries), len(large_page.captured_queries))
+        self.assertTrue(response.json()["results"][1]["is_subscribed"])
+        self.assertEqual(response.json()["results"][1]["lesson_count"], 1)
+
+    def test_course_list_slim(self):
+        """
+        Тест того, что список курсов по умолчанию не содержит уроков и не загружает их.
+        """
+        url = reverse("materials:course-list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("lessons", response.json()["results"][0])
+        self.assertEqual(response.json()["results"][0]["lesson_count"], 1)
+        self.assertFalse(any('"materials_lesson"."name"' in query["sql"] for query in queries.captured_queries))
+
+    def test_course_list_sparse_fields(self):
+        """
+        Тест выбора полей параметром fields: лишние поля не выводятся и не выбираются из БД.
+        """
+        url = reverse("materials:course-list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"fields": "id,name"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["results"], [{"id": self.course.pk, "name": "Тестовый курс"}])
+        course_query = queries.captured_queries[-1]["sql"]
+        self.assertNotIn('"description"', course_query)
+        self.assertNotIn('COUNT(', course_query.split('FROM')[0])
+
+        response = self.client.get(url, {"fields": "id", "expand": "lessons"})
+        self.assertEqual(list(response.json()["results"][0]), ["id", "lessons"])
+
+    def test_course_list_cursor_pagination(self):
+        """
+        Тест курсорной пагинации списка курсов без подсчета общего количества.
+        """
+        for i in range(4):
+            Course.objects.create(name=f'Курс {i}', owner=self.user)
+
+        url = reverse("materials:course-list")
+        response = self.client.get(url, {"pagination": "cursor"})
+        data = response.json()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", data)
+        self.assertEqual([course["name"] for course in data["results"]], ['Тестовый курс', 'Курс 0', 'Курс 1'])
+
+        response = self.client.get(data["next"])
+        data = response.json()
+        self.assertEqual([course["name"] for course in data["results"]], ['Курс 2', 'Курс 3'])
+        self.assertIsNone(data["next"])
+
+        response = self.client.get(url, {"pagination": "cursor", "with_count": "true"})
+        self.assertEqual(response.json()["count"], 5)
+
+
+class CourseDetailCacheTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="test@testov.com")
+        self.course = Course.objects.create(name='Тестовый курс', owner=self.user)
+        self.lesson = Lesson.objects.create(name='Тестовый урок', course=self.course,
+                                            link_to_video='https://youtube.com/testvideo', owner=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("materials:course-detail", args=(self.course.pk,))
+
+    def test_course_retrieve_cached(self):
+        """
+        Тест того, что повторный запрос курса берется из кеша, а признак подписки вычисляется для пользователя.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.json()["is_subscribed"])
+
+        Subscription.objects.create(user=self.user, course=self.course)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertTrue(response.json()["is_subscribed"])
+        self.assertEqual(response.json()["lessons"][0]["name"], 'Тестовый урок')
+        self.assertEqual(get_course_detail_cache_stats(), {"hits": 1, "misses": 1})
+
+    def test_course_retrieve_etag(self):
+        """
+        Тест ответа 304 при совпадении ETag и его смены после изменения урока.
+        """
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Часть ETag не должна считаться совпадением
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"x{etag[1:]}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.lesson.name = 'Обновленный урок'
+        self.lesson.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["lessons"][0]["name"], 'Обновленный урок')
+
+    def test_course_retrieve_cache_per_scheme(self):
+        """
+        Тест того, что ответы для http и https кешируются отдельно, так как ссылки в них абсолютные.
+        """
+        self.client.get(self.url)
+        self.client.get(self.url, secure=True)
+        self.assertEqual(get_course_detail_cache_stats(), {"hits": 0, "misses": 2})
+
+    def test_lesson_move_resets_both_courses(self):
+        """
+        Тест того, что перенос урока в другой курс сбрасывает кеш обоих курсов без лишнего запроса курса урока.
+        """
+        other_course = Course.objects.create(name='Другой курс', owner=self.user)
+        generations = get_course_generation(self.course.pk), get_course_generation(other_course.pk)
+        lesson = Lesson.objects.get(pk=self.lesson.pk)
+        lesson.course = other_course
+        with self.assertNumQueries(1):
+            lesson.save()
+        self.assertNotEqual(get_course_generation(self.course.pk), generations[0])
+        self.assertNotEqual(get_course_generation(other_course.pk), generations[1])
+
+    def test_warm_course_cache(self):
+        """
+        Тест прогрева кеша популярных курсов командой warm_course_cache.
+
+        Прогрев не учитывается в статистике, поэтому первый запрос после него - единственное попадание.
+        """
+        call_command('warm_course_cache', top=10, host='testserver', stdout=StringIO())
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_course_detail_cache_stats(), {"hits": 1, "misses": 0})
+
+
+class CacheHelpersTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_versioned_keys(self):
+        """
+        Тест того, что увеличение версии меняет все ключи пространства имен.
+        """
+        key = make_key('course:1', 'detail', 'testserver')
+        self.assertEqual(key, make_key('course:1', 'detail', 'testserver'))
+        bump_version('course:1')
+        self.assertNotEqual(key, make_key('course:1', 'detail', 'testserver'))
+
+    def test_course_detail_key_follows_generation(self):
+        """
+        Тест того, что ключ кеша курса строится через make_key и меняется с поколением курса.
+        """
+        key = get_course_detail_cache_key(1, get_course_generation(1), 'http://testserver')
+        self.assertEqual(key, make_key('course:1', 'detail', 'http://testserver'))
+        bump_course_generation(1)
+        self.assertNotEqual(key, get_course_detail_cache_key(1, get_course_generation(1), 'http://testserver'))
+
+    def test_get_or_set_many(self):
+        """
+        Тест пакетного чтения: недостающие значения строятся одним вызовом и записываются одним set_many.
+        """
+        build = mock.Mock(side_effect=lambda items: {item: item * 10 for item in items})
+        keys = {1: 'item:1', 2: 'item:2'}
+        self.assertEqual(get_or_set_many(keys, build, 60), {1: 10, 2: 20})
+        self.assertEqual(get_or_set_many({**keys, 3: 'item:3'}, build, 60), {1: 10, 2: 20, 3: 30})
+        self.assertEqual(build.call_args_list, [mock.call([1, 2]), mock.call([3])])
+
+    def test_get_or_build_single_rebuild(self):
+        """
+        Тест того, что при одновременных промахах значение строится один раз.
+        """
+        build = mock.Mock(side_effect=lambda: time.sleep(0.2) or 'value')
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: get_or_build('stampede', build, 60, wait=0.01), range(4)))
+        self.assertEqual([value for value, hit in results], ['value'] * 4)
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(sorted(hit for value, hit in results), [False, True, True, True])
+
+    def test_get_or_build_early_expiration(self):
+        """
+        Тест вероятностного обновления значения до истечения срока хранения.
+        """
+        self.assertEqual(get_or_build('early', lambda: time.sleep(0.01) or 'old', 60), ('old', False))
+        with mock.patch('config.cache.random.random', return_value=0.5):
+            self.assertEqual(get_or_build('early', lambda: 'new', 60), ('old', True))
+            # При большом beta ожидаемое время пересчета перекрывает оставшийся срок, и значение обновляется
+            self.assertEqual(get_or_build('early', lambda: 'new', 60, beta=10 ** 5), ('new', False))
+
+
+class MetricsMiddlewareTestCase(APITestCase):
+
+    def setUp(self):
+        for histogram in HISTOGRAMS:
+            histogram.clear()
+        self.user = User.objects.create(email='metrics@example.com')
+        self.course = Course.objects.create(name='Тестовый курс', owner=self.user)
+        Lesson.objects.create(name='Урок', course=self.course, owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def test_request_metrics(self):
+        """
+        Тест записи количества запросов к БД и времени сериализации по имени маршрута.
+        """
+        labels = (('view', 'materials:course-list'), ('method', 'GET'))
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('materials:course-list'), {'expand': 'lessons'})
+        self.assertEqual(DB_QUERIES.series[labels][-1], 1)
+        self.assertEqual(DB_QUERIES.series[labels][-2], len(context.captured_queries))
+        self.assertGreater(SERIALIZER_DURATION.series[labels][-2], 0)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_db_queries_count{view="materials:course-list",method="GET"} 1', body)
+        self.assertIn('http_request_db_queries_bucket{view="materials:course-list",method="GET",le="+Inf"} 1', body)
+
+    def test_query_budget_warning(self):
+        """
+        Тест предупреждения в логе при превышении бюджета запросов к БД.
+        """
+        url = reverse('materials:course-list')
+        with override_settings(METRICS_QUERY_BUDGET=100), self.assertNoLogs('config.metrics', 'WARNING'):
+            self.client.get(url)
+        with override_settings(METRICS_QUERY_BUDGET=1), self.assertLogs('config.metrics', 'WARNING') as logs:
+            self.client.get(url)
+        self.assertIn('materials:course-list', logs.output[0])
+
+    def test_streaming_response_metrics(self):
+        """
+        Тест того, что для потокового ответа учитываются запросы к БД, выполненные при итерации тела.
+        """
+        self.user.is_staff = True
+        self.user.save()
+        labels = (('view', 'users:payment-export'), ('method', 'GET'))
+        response = self.client.get(reverse('users:payment-export'), {'export_format': 'csv'})
+        self.assertNotIn(labels, DB_QUERIES.series)
+
+        with CaptureQueriesContext(connection) as context:
+            b''.join(response.streaming_content)
+        self.assertEqual(DB_QUERIES.series[labels][-1], 1)
+        self.assertEqual(DB_QUERIES.series[labels][-2], len(context.captured_queries))
+        self.assertGreater(len(context.captured_queries), 0)
+
+    def test_metrics_access(self):
+        """
+        Тест доступа к /metrics только с разрешенных IP-адресов или по токену.
+        """
+        with override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN=None):
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
 
 class LessonTestCase(APITestCase):
     def setUp(self):
@@ -218,6 +526,169 @@ class LessonTestCase(APITestCase):
         self.assertEqual(data, expected_data)
 
 
+class LessonBulkTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='author@example.com')
+        self.client.force_authenticate(user=self.user)
+        self.course = Course.objects.create(name="Тестовый курс", owner=self.user)
+        self.lessons = [
+            Lesson.objects.create(name=f"Урок {i}", course=self.course, link_to_video="https://youtube.com/video",
+                                  owner=self.user)
+            for i in range(3)
+        ]
+
+    @mock.patch('materials.views.notify_lessons_updated')
+    def test_lesson_bulk(self, notify):
+        """
+        Тест массового создания, обновления и удаления уроков одним запросом.
+        """
+        url = reverse("materials:lessons-bulk")
+        data = {
+            "create": [
+                {"name": f"Новый урок {i}", "course": self.course.pk, "link_to_video": "https://youtube.com/new"}
+                for i in range(3)
+            ],
+            "update": [{"id": self.lessons[0].pk, "name": "Обновленный урок"},
+                       {"id": self.lessons[1].pk, "link_to_video": "https://youtube.com/updated"}],
+            "delete": [self.lessons[2].pk],
+        }
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["created"]), 3)
+        self.assertEqual(response.data["updated"][0]["name"], "Обновленный урок")
+        self.assertEqual(response.data["deleted"], [self.lessons[2].pk])
+
+        self.assertEqual(Lesson.objects.filter(owner=self.user, name__startswith="Новый урок").count(), 3)
+        self.assertEqual(Lesson.objects.get(pk=self.lessons[1].pk).link_to_video, "https://youtube.com/updated")
+        self.assertFalse(Lesson.objects.filter(pk=self.lessons[2].pk).exists())
+        notify.assert_called_once()
+
+    def test_lesson_bulk_invalid_rolls_back(self):
+        """
+        Тест того, что при ошибке валидации одного элемента не применяется ни одно изменение.
+        """
+        url = reverse("materials:lessons-bulk")
+        data = {
+            "create": [{"name": "Новый урок", "link_to_video": "https://youtube.com/new"},
+                       {"name": "Плохой урок", "link_to_video": "https://example.com/video"}],
+            "delete": [self.lessons[0].pk],
+        }
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["create"][0], {})
+        self.assertIn("link_to_video", response.data["create"][1])
+        self.assertEqual(Lesson.objects.count(), 3)
+
+    @mock.patch('materials.views.notify_lessons_updated')
+    def test_lesson_bulk_invalid_ids(self, notify):
+        """
+        Тест ответа 400 на нецелые, повторяющиеся и одновременно обновляемые и удаляемые id.
+        """
+        url = reverse("materials:lessons-bulk")
+        pk = self.lessons[0].pk
+        cases = [
+            ({"delete": [[pk]]}, "delete"),
+            ({"update": [{"id": {"pk": pk}, "name": "Урок"}]}, "update"),
+            ({"update": [{"name": "Без id"}]}, "update"),
+            ({"delete": [pk, pk]}, "delete"),
+            ({"update": [{"id": pk, "name": "Урок"}, {"id": pk, "name": "Урок"}]}, "update"),
+            ({"update": [{"id": pk, "name": "Урок"}], "delete": [pk]}, "non_field_errors"),
+            ({"delete": {"id": pk}}, "delete"),
+        ]
+        for data, field in cases:
+            with self.subTest(data=data):
+                response = self.client.post(url, data, format='json')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn(field, response.data)
+        self.assertEqual(Lesson.objects.count(), 3)
+        notify.assert_not_called()
+
+    def test_lesson_bulk_foreign_lesson_forbidden(self):
+        """
+        Тест запрета массового обновления чужих уроков.
+        """
+        other = User.objects.create(email='other@example.com')
+        self.client.force_authenticate(user=other)
+        url = reverse("materials:lessons-bulk")
+        response = self.client.post(url, {"update": [{"id": self.lessons[0].pk, "name": "Чужой"}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MaterialsSearchTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='user1@example.com')
+        self.client.force_authenticate(user=self.user)
+        self.course = Course.objects.create(name="Основы Python", description="Переменные и функции")
+        Course.objects.create(name="Django REST", description="Сериализаторы")
+        Lesson.objects.create(name="Функции в Python", course=self.course)
+
+    def test_search(self):
+        """
+        Тест поиска курсов и уроков по названию и описанию.
+        """
+        url = reverse("materials:search")
+        response = self.client.get(url, {"q": "Python"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([course["name"] for course in response.data["courses"]], ["Основы Python"])
+        self.assertEqual([lesson["name"] for lesson in response.data["lessons"]], ["Функции в Python"])
+
+    def test_search_without_query(self):
+        """
+        Тест поиска без поискового запроса.
+        """
+        response = self.client.get(reverse("materials:search"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncSubscriptionTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='user1@example.com')
+        self.course = Course.objects.create(name="Тестовый курс", owner=self.user)
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    async def test_async_toggle_subscription(self):
+        """
+        Тест асинхронного переключения подписки.
+        """
+        url = reverse("materials:async-subscribe")
+        data = {"course_id": self.course.pk}
+        response = await self.async_client.post(url, data, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["message"], "Подписка добавлена")
+        self.assertTrue(await Subscription.objects.filter(user=self.user, course=self.course).aexists())
+
+        response = await self.async_client.post(url, data, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.json()["message"], "Подписка удалена")
+
+        response = await self.async_client.post(url, {"course_id": 0}, content_type='application/json',
+                                                headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_async_course_subscription(self):
+        """
+        Тест асинхронной идемпотентной подписки и отписки.
+        """
+        url = reverse("materials:async-course-subscription", args=(self.course.pk,))
+        for _ in range(2):
+            response = await self.async_client.put(url, headers=self.headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(await Subscription.objects.filter(user=self.user).acount(), 1)
+
+        response = await self.async_client.delete(url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(await Subscription.objects.filter(user=self.user).aexists())
+
+    async def test_async_requires_authentication(self):
+        """
+        Тест того, что асинхронные контроллеры требуют JWT.
+        """
+        url = reverse("materials:async-course-subscription", args=(self.course.pk,))
+        response = await self.async_client.put(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await self.async_client.put(url, headers={'Authorization': 'Bearer invalid'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
 class SubscriptionTestCase(APITestCase):
     def setUp(self):
         self.user = User.objects.create(email='user1@example.com')
@@ -254,3 +725,265 @@ class SubscriptionTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["message"], "Подписка удалена")
         self.assertFalse(Subscription.objects.filter(user=self.user, course=self.course).exists())
+
+    def test_subscribe_missing_course(self):
+        """
+        Тест подписки на несуществующий курс.
+        """
+        url = reverse("materials:subscribe")
+        response = self.client.post(url, {"course_id": self.course.pk + 100})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_subscribe_idempotent(self):
+        """
+        Тест идемпотентной подписки и отписки.
+        """
+        url = reverse("materials:course-subscription", args=(self.course.pk,))
+        for _ in range(2):
+            response = self.client.put(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Subscription.objects.filter(user=self.user, course=self.course).count(), 1)
+
+        for _ in range(2):
+            response = self.client.delete(url)
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_subscription_unique(self):
+        """
+        Тест того, что база данных не допускает дублирующих подписок.
+        """
+        Subscription.objects.create(user=self.user, course=self.course)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Subscription.objects.create(user=self.user, course=self.course)
+
+
+@skipIf(connection.vendor == 'sqlite', 'SQLite блокирует таблицу при одновременной записи из нескольких потоков')
+class ConcurrentSubscriptionTestCase(TransactionTestCase):
+    def setUp(self):
+        self.users = [User.objects.create(email=f'user{i}@example.com') for i in range(2)]
+        self.course = Course.objects.create(name="Тестовый курс")
+
+    def test_concurrent_subscribe(self):
+        """
+        Тест того, что одновременные запросы на подписку не создают дублирующих подписок.
+        """
+        def run(user):
+            try:
+                return subscribe(user, self.course.pk)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(run, self.users * 4))
+
+        self.assertTrue(all(results))
+        for user in self.users:
+            self.assertEqual(Subscription.objects.filter(user=user, course=self.course).count(), 1)
+        self.assertFalse(toggle_subscription(self.users[0], self.course.pk))
+        self.assertEqual(Subscription.objects.count(), 1)
+
+
+@override_settings(LESSON_UPDATE_EMAIL_BATCH_SIZE=2, SUBSCRIBERS_CHUNK_SIZE=2)
+class LessonUpdateEmailTestCase(APITestCase):
+    def setUp(self):
+        self.always_eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        cache.clear()
+        self.owner = User.objects.create(email='owner@example.com')
+        self.course = Course.objects.create(name="Тестовый курс", owner=self.owner)
+        self.lesson = Lesson.objects.create(name="Тестовый урок", course=self.course, owner=self.owner)
+        for i in range(5):
+            user = User.objects.create(email=f'subscriber{i}@example.com')
+            Subscription.objects.create(user=user, course=self.course)
+
+    def tearDown(self):
+        celery_app.conf.task_always_eager = self.always_eager
+
+    def test_send_lesson_update_email(self):
+        """
+        Тест рассылки уведомлений пачками: каждому подписчику отправляется отдельное письмо.
+        """
+        with self.assertNumQueries(2):
+            result = send_lesson_update_email.delay(self.lesson.pk)
+        # 5 подписчиков по 2 в пачке
+        self.assertEqual(result.get(), 3)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [f'subscriber{i}@example.com' for i in range(5)]
+        )
+
+    def test_send_email_batch_counts(self):
+        """
+        Тест подсчета отправленных писем в пачке.
+        """
+        result = send_email_batch('Тема', 'Текст', ['a@example.com', 'b@example.com'])
+        self.assertEqual(result, {'sent': 2, 'failed': 0})
+
+    @override_settings(LESSON_UPDATE_NOTIFICATION_DELAY=0)
+    def test_lesson_updates_coalesced(self):
+        """
+        Тест объединения нескольких изменений уроков курса в одно уведомление.
+        """
+        second_lesson = Lesson.objects.create(name="Второй урок", course=self.course, owner=self.owner)
+        self.client.force_authenticate(user=self.owner)
+
+        with mock.patch.object(send_course_update_digest, 'apply_async') as apply_async:
+            for lesson, name in [(self.lesson, 'Урок 1'), (second_lesson, 'Урок 2'), (self.lesson, 'Урок 1.1')]:
+                url = reverse("materials:lessons-update", args=(lesson.pk,))
+                response = self.client.patch(url, {"name": name})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        apply_async.assert_called_once_with((self.course.pk,), countdown=0)
+        self.assertEqual(PendingLessonUpdate.objects.filter(course=self.course).count(), 2)
+
+        send_course_update_digest.delay(self.course.pk)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn('"Урок 1.1"', mail.outbox[0].body)
+        self.assertIn('"Урок 2"', mail.outbox[0].body)
+        self.assertFalse(PendingLessonUpdate.objects.exists())
+
+    @override_settings(LESSON_UPDATE_NOTIFICATION_DELAY=0)
+    def test_update_during_digest_rescheduled(self):
+        """
+        Тест того, что изменение, записанное во время рассылки, когда признак планирования еще захвачен,
+        попадает в следующую рассылку.
+        """
+        second_lesson = Lesson.objects.create(name="Второй урок", course=self.course, owner=self.owner)
+        delete = cache.delete
+
+        def update_during_digest(key):
+            PendingLessonUpdate.objects.create(course=self.course, lesson=second_lesson)
+            self.assertFalse(schedule_course_update_digest(self.course.pk, 0))
+            delete(key)
+
+        with mock.patch.object(send_course_update_digest, 'apply_async') as apply_async:
+            notify_lessons_updated([self.lesson])
+            with mock.patch.object(cache, 'delete', side_effect=update_during_digest):
+                send_course_update_digest(self.course.pk)
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(apply_async.call_count, 2)
+        self.assertEqual(list(PendingLessonUpdate.objects.values_list('lesson_id', flat=True)), [second_lesson.pk])
+
+    def test_lost_digest_rescheduled(self):
+        """
+        Тест того, что после истечения признака потерянной задачи следующее изменение планирует новую рассылку.
+        """
+        with mock.patch.object(send_course_update_digest, 'apply_async') as apply_async:
+            notify_lessons_updated([self.lesson])
+            notify_lessons_updated([self.lesson])
+            self.assertEqual(apply_async.call_count, 1)
+            cache.delete(COURSE_DIGEST_SCHEDULED_KEY.format(self.course.pk))
+            notify_lessons_updated([self.lesson])
+        self.assertEqual(apply_async.call_count, 2)
+
+
+class FastReadPathContractTestCase(FastPathContractMixin, APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email="test@testov.com")
+        self.client.force_authenticate(user=self.user)
+        self.course = Course.objects.create(name='Курс «Python»', description='Описание\u2028с переносом',
+                                            course_preview='materials/photo/python.png', owner=self.user)
+        Course.objects.create(name='Пустой курс')
+        for i in range(3):
+            Lesson.objects.create(name=f'Урок {i}', course=self.course, owner=self.user,
+                                  link_to_video='https://youtube.com/video', lesson_preview='materials/photo/l.png')
+        Lesson.objects.create(name='Урок без курса')
+        Subscription.objects.create(user=self.user, course=self.course)
+
+    def test_course_list_contract(self):
+        """
+        Тест совпадения списка курсов в быстром и обычном путях.
+        """
+        url = reverse("materials:course-list")
+        for params in [{}, {"expand": "lessons"}, {"fields": "id,course_preview", "expand": "lessons"},
+                       {"pagination": "cursor", "page_size": 1}]:
+            with self.subTest(params=params):
+                self.assertFastPathMatches(CourseViewSet, url, params)
+
+    def test_lesson_list_contract(self):
+        """
+        Тест совпадения списка уроков в быстром и обычном путях.
+        """
+        url = reverse("materials:lessons-list")
+        for params in [{}, {"fields": "name,lesson_preview"}, {"pagination": "cursor"}]:
+            with self.subTest(params=params):
+                self.assertFastPathMatches(LessonListAPIView, url, params)
+
+    def test_fast_json_renderer(self):
+        """
+        Тест совпадения байтов FastJSONRenderer и JSONRenderer.
+        """
+        data = {"name": "Курс\u2028", "items": [1, 2.5, None, True], 1: "ключ-число"}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Планы запросов проверяются только на PostgreSQL')
+class MaterialsQueryPlanTestCase(QueryPlanMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='user1@example.com')
+        self.course = Course.objects.create(name="Тестовый курс", owner=self.user)
+        Lesson.objects.create(name="Тестовый урок", course=self.course, owner=self.user)
+        Subscription.objects.create(user=self.user, course=self.course)
+
+    def test_subscription_lookup_uses_index(self):
+        """
+        Тест поиска подписки пользователя на курс по индексу.
+        """
+        self.assertUsesIndex(Subscription.objects.filter(user=self.user, course=self.course))
+
+    def test_subscribers_fan_out_uses_index(self):
+        """
+        Тест выборки email-адресов подписчиков курса по индексу.
+        """
+        self.assertUsesIndex(Subscription.objects.filter(course=self.course).values_list('user__email', flat=True))
+
+    def test_lesson_count_uses_index(self):
+        """
+        Тест подсчета и выборки уроков курса по индексу.
+        """
+        self.assertUsesIndex(Lesson.objects.filter(course=self.course).values('course').annotate(total=Count('id')))
+        self.assertUsesIndex(Lesson.objects.filter(course__in=[self.course.pk]).order_by('pk'))
+
+    def test_full_text_search_uses_index(self):
+        """
+        Тест полнотекстового поиска курсов по GIN-индексу поискового вектора.
+        """
+        course = Course.objects.get(pk=self.course.pk)
+        self.assertIsNotNone(course.search_vector)
+        self.assertUsesIndex(full_text_search(Course.objects.all(), 'курс', ['name', 'description']))
+
+
+class BenchmarkCommandTestCase(APITestCase):
+
+    def test_benchmark_api(self):
+        """
+        Тест команды benchmark_api на малом объеме: заполнение, отчет в JSON и проверка регрессий.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            output = f'{directory}/result.json'
+            call_command('benchmark_api', '--seed', '--scale', '0.0002', '--requests', '3', '--warmup', '1',
+                         '--task-runs', '1', '--output', output, stdout=StringIO())
+            self.assertEqual(User.objects.filter(email__startswith='benchmark-user-').count(), 20)
+            self.assertEqual(Subscription.objects.count(), 40)
+
+            with open(output, encoding='utf-8') as file:
+                report = json.load(file)
+            results = report['results']
+            self.assertEqual(report['meta']['seed_counts']['lessons'], 100)
+            self.assertIn('task_send_lesson_update_email', results)
+            for result in results.values():
+                self.assertEqual(result['errors'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+            results['payment_list']['queries_max'] -= 1
+            baseline = f'{directory}/baseline.json'
+            with open(baseline, 'w', encoding='utf-8') as file:
+                json.dump(report, file)
+            with self.assertRaisesMessage(CommandError, 'payment_list: запросов к БД'):
+                call_command('benchmark_api', '--requests', '3', '--warmup', '1', '--task-runs', '1',
+                             '--baseline', baseline, '--tolerance', '1000', stdout=StringIO())
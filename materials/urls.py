@@ -3,7 +3,9 @@ from rest_framework.routers import SimpleRouter
 
 from materials.apps import MaterialsConfig
 from materials.views import (CourseViewSet, LessonListAPIView, LessonCreateAPIView, LessonRetrieveAPIView,
-                             LessonUpdateAPIView, LessonDestroyAPIView, SubscriptionAPIView)
+                             LessonUpdateAPIView, LessonDestroyAPIView, LessonBulkAPIView, SubscriptionAPIView,
+                             CourseSubscriptionAPIView, MaterialsSearchAPIView, AsyncSubscriptionView,
+                             AsyncCourseSubscriptionView)
 
 router = SimpleRouter()
 router.register(r'courses', CourseViewSet)
@@ -11,10 +13,16 @@ router.register(r'courses', CourseViewSet)
 app_name = MaterialsConfig.name
 
 urlpatterns = [
+    path('search/', MaterialsSearchAPIView.as_view(), name='search'),
     path('subscribe/', SubscriptionAPIView.as_view(), name='subscribe'),
+    path('subscriptions/<int:course_id>/', CourseSubscriptionAPIView.as_view(), name='course-subscription'),
+    path('async/subscribe/', AsyncSubscriptionView.as_view(), name='async-subscribe'),
+    path('async/subscriptions/<int:course_id>/', AsyncCourseSubscriptionView.as_view(),
+         name='async-course-subscription'),
     path('lessons/', LessonListAPIView.as_view(), name="lessons-list"),
     path('lessons/<int:pk>/', LessonRetrieveAPIView.as_view(), name="lessons-retrieve"),
     path('lessons/create/', LessonCreateAPIView.as_view(), name="lessons-create"),
+    path('lessons/bulk/', LessonBulkAPIView.as_view(), name="lessons-bulk"),
     path('lessons/<int:pk>/delete/', LessonDestroyAPIView.as_view(), name="lessons-delete"),
     path('lessons/<int:pk>/update/', LessonUpdateAPIView.as_view(), name="lessons-update"),
 
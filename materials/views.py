@@ -1,29 +1,129 @@
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch, Value
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.http import parse_etags
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.generics import (CreateAPIView, ListAPIView, RetrieveAPIView, UpdateAPIView,
                                      DestroyAPIView)
 
+from materials.fastpath import FastReadListMixin
+from materials.filters import full_text_search
+from materials.mixins import SparseFieldsViewMixin
 from materials.models import Course, Lesson, Subscription
-from materials.paginators import CustomPagination
-from materials.serializers import CourseSerializer, LessonSerializer, CourseDetailSerializer, SubscriptionSerializer
+from materials.paginators import SelectablePagination
+from materials.serializers import (CourseSerializer, LessonSerializer, CourseDetailSerializer, CourseListSerializer,
+                                   LessonBulkSerializer, SubscriptionSerializer)
 
 from rest_framework.permissions import IsAuthenticated
 
+from users.async_api import AsyncAPIView
 from users.permissions import IsModerator, IsOwner
-from materials.tasks import send_lesson_update_email
+from materials.services import (asubscribe, atoggle_subscription, aunsubscribe, build_course_detail_payload,
+                                bump_course_generation, get_cached_course_detail, get_course_generation,
+                                get_request_origin, notify_lessons_updated, subscribe, toggle_subscription,
+                                unsubscribe)
 
 
-class CourseViewSet(ModelViewSet):
+class CourseViewSet(FastReadListMixin, SparseFieldsViewMixin, ModelViewSet):
     """
     Viewset для выполнения CRUD операций над моделью Course.
+
+    Список и просмотр курса поддерживают параметр fields, список - также expand=lessons.
+    Список строится быстрым путем чтения из values().
     """
     queryset = Course.objects.all()
-    pagination_class = CustomPagination
+    pagination_class = SelectablePagination
+    fast_read_path = True
+    stateless_authentication = True  # Для чтения пользователь строится из токена без загрузки из БД
+
+    def get_queryset(self):
+        """
+        Для просмотра списка возвращает аннотированный queryset, для просмотра одного курса - облегченный.
+
+        Детальная информация о курсе берется из кеша, поэтому для проверки прав и ETag достаточно
+        владельца курса и признака подписки.
+        """
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            return self.get_list_queryset(queryset)
+        if self.action == 'retrieve':
+            return queryset.only('id', 'owner_id').annotate(is_subscribed=self.get_is_subscribed_annotation())
+        return queryset
+
+    def get_is_subscribed_annotation(self):
+        """
+        Возвращает выражение, определяющее, подписан ли текущий пользователь на курс.
+        """
+        user = self.request.user
+        if user.is_authenticated:
+            return Exists(Subscription.objects.filter(user_id=user.pk, course=OuterRef('pk')))
+        return Value(False)
+
+    def get_detail_queryset(self, queryset):
+        """
+        Возвращает queryset курсов с количеством уроков, признаком подписки и уроками.
+
+        Количество уроков и признак подписки считаются в том же запросе, что и сами курсы,
+        а уроки подгружаются одним дополнительным запросом через Prefetch.
+        Благодаря этому число запросов к БД не зависит от размера страницы.
+        """
+        return queryset.annotate(
+            lesson_count=Count('lesson', distinct=True),
+            is_subscribed=self.get_is_subscribed_annotation(),
+        ).prefetch_related(
+            Prefetch('lesson_set', queryset=Lesson.objects.order_by('pk'))
+        ).order_by('pk')
+
+    def get_list_queryset(self, queryset):
+        """
+        Возвращает queryset для списка курсов, в котором выбираются только нужные ответу данные.
+
+        Колонки ограничиваются параметром fields, количество уроков и признак подписки
+        аннотируются только если запрошены, а уроки подгружаются только при expand=lessons.
+        """
+        queryset = self.only_requested_fields(queryset)
+        if self.is_field_requested('lesson_count'):
+            queryset = queryset.annotate(lesson_count=Count('lesson', distinct=True))
+        if self.is_field_requested('is_subscribed'):
+            queryset = queryset.annotate(is_subscribed=self.get_is_subscribed_annotation())
+        if 'lessons' in self.get_expanded_fields():
+            queryset = queryset.prefetch_related(Prefetch('lesson_set', queryset=Lesson.objects.order_by('pk')))
+        return queryset.order_by('pk')
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Возвращает детальную информацию о курсе из кеша.
+
+        Кеш версионируется номером поколения курса, который меняется при изменении курса и его уроков.
+        Ответ содержит ETag, и при совпадении If-None-Match возвращается 304 без сериализации.
+        """
+        course = self.get_object()
+        generation = get_course_generation(course.pk)
+        etag = f'"{course.pk}-{generation}-{int(course.is_subscribed)}"'
+        # If-None-Match сравнивается слабо (RFC 9110), поэтому префикс W/ не учитывается
+        if_none_match = {tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))}
+        if etag in if_none_match or '*' in if_none_match:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        def build():
+            instance = self.get_detail_queryset(Course.objects.all()).get(pk=course.pk)
+            return build_course_detail_payload(instance, request)
+
+        payload = get_cached_course_detail(course.pk, generation, get_request_origin(request), build)
+        data = {**payload, 'is_subscribed': course.is_subscribed}
+        requested = self.get_requested_fields()
+        if requested:
+            data = {name: value for name, value in data.items() if name in requested}
+        return Response(data, headers={'ETag': etag})
 
     def get_serializer_class(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action == 'list':
+            return CourseListSerializer
+        if self.action == 'retrieve':
             return CourseDetailSerializer
         return CourseSerializer
 
@@ -64,13 +164,18 @@ class LessonCreateAPIView(CreateAPIView):
         serializer.save(owner=self.request.user)
 
 
-class LessonListAPIView(ListAPIView):
+class LessonListAPIView(FastReadListMixin, SparseFieldsViewMixin, ListAPIView):
     """
-       Контроллер для получения списка уроков.
+       Контроллер для получения списка уроков. Список строится быстрым путем чтения из values().
        """
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
-    pagination_class = CustomPagination
+    pagination_class = SelectablePagination
+    fast_read_path = True
+    stateless_authentication = True
+
+    def get_queryset(self):
+        return self.only_requested_fields(super().get_queryset())
 
 
 class LessonRetrieveAPIView(RetrieveAPIView):
@@ -80,6 +185,7 @@ class LessonRetrieveAPIView(RetrieveAPIView):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = (IsAuthenticated, IsModerator | IsOwner,)
+    stateless_authentication = True
 
 
 class LessonUpdateAPIView(UpdateAPIView):
@@ -92,11 +198,10 @@ class LessonUpdateAPIView(UpdateAPIView):
 
     def perform_update(self, serializer):
         """
-        Переопределяет метод обновления объекта для вызова задачи Celery.
+        Переопределяет метод обновления объекта для отложенного уведомления подписчиков.
         """
         super().perform_update(serializer)
-        lesson = self.get_object()
-        send_lesson_update_email.delay(lesson.id)
+        notify_lessons_updated([serializer.instance])
 
 
 class LessonDestroyAPIView(DestroyAPIView):
@@ -108,6 +213,108 @@ class LessonDestroyAPIView(DestroyAPIView):
     permission_classes = (IsAuthenticated, IsOwner | ~IsModerator,)
 
 
+class LessonBulkAPIView(APIView):
+    """
+    Контроллер для массового создания, частичного обновления и удаления уроков.
+
+    Принимает объект вида {"create": [...], "update": [{"id": ..., ...}], "delete": [id, ...]}.
+    Все изменения валидируются за один проход и записываются одной транзакцией:
+    если хотя бы один элемент не прошел проверку, не применяется ни одно изменение.
+    Уведомления об обновлении уроков объединяются по курсам.
+    """
+    permission_classes = (IsAuthenticated,)
+    max_items = 500  # Максимальное количество элементов в одном запросе
+
+    def post(self, request, *args, **kwargs):
+        create_data, update_data, delete_ids = self.get_bulk_data(request.data)
+        is_moderator = IsModerator().has_permission(request, self)
+        if create_data and is_moderator:
+            raise PermissionDenied('Модераторы не могут создавать уроки')
+
+        update_ids = [item['id'] for item in update_data]
+        lessons = Lesson.objects.in_bulk(update_ids + delete_ids)
+        missing = [pk for pk in update_ids + delete_ids if pk not in lessons]
+        if missing:
+            raise ValidationError({'non_field_errors': [f'Уроки не найдены: {missing}']})
+
+        self.check_lessons_permission(request, [lessons[pk] for pk in update_ids], IsModerator | IsOwner)
+        self.check_lessons_permission(request, [lessons[pk] for pk in delete_ids], IsOwner | ~IsModerator)
+
+        create_serializer = LessonSerializer(data=create_data, many=True)
+        update_serializer = LessonSerializer([lessons[pk] for pk in update_ids], data=update_data, many=True,
+                                             partial=True)
+        errors = {}
+        if not create_serializer.is_valid():
+            errors['create'] = create_serializer.errors
+        if not update_serializer.is_valid():
+            errors['update'] = update_serializer.errors
+        if errors:
+            raise ValidationError(errors)
+
+        previous_course_ids = [lessons[pk].course_id for pk in update_ids + delete_ids]
+        with transaction.atomic():
+            created = create_serializer.save(owner=request.user)
+            updated = update_serializer.save()
+            Lesson.objects.filter(pk__in=delete_ids).delete()
+
+        # bulk_create и bulk_update не отправляют сигналы, поэтому кеш курсов сбрасываем явно
+        bump_course_generation(*previous_course_ids, *[lesson.course_id for lesson in created + updated])
+        if updated:
+            # Уведомляем только об уроках, которые существуют после фиксации транзакции
+            notify_lessons_updated(Lesson.objects.filter(pk__in=update_ids).only('pk', 'course_id'))
+        return Response({
+            'created': create_serializer.data,
+            'updated': update_serializer.data,
+            'deleted': delete_ids,
+        })
+
+    def get_bulk_data(self, data):
+        """
+        Проверяет структуру запроса и возвращает списки на создание, обновление и удаление.
+        """
+        serializer = LessonBulkSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        create_data, update_data, delete_ids = data['create'], data['update'], data['delete']
+        if len(create_data) + len(update_data) + len(delete_ids) > self.max_items:
+            raise ValidationError({'non_field_errors': [f'Не более {self.max_items} элементов в одном запросе']})
+        return create_data, update_data, delete_ids
+
+    def check_lessons_permission(self, request, lessons, permission_class):
+        """
+        Проверяет права доступа к каждому уроку из списка.
+        """
+        permission = permission_class()
+        for lesson in lessons:
+            if not permission.has_object_permission(request, self, lesson):
+                raise PermissionDenied(f'Нет прав на изменение урока {lesson.pk}')
+
+
+class MaterialsSearchAPIView(APIView):
+    """
+    APIView для полнотекстового поиска курсов (по названию и описанию) и уроков (по названию).
+
+    Methods:
+        get: Возвращает наиболее релевантные курсы и уроки по параметру q.
+    """
+    permission_classes = [IsAuthenticated]
+    max_results = 20  # Максимальное количество курсов и уроков в ответе
+    stateless_authentication = True
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': ['Укажите поисковый запрос']})
+
+        courses = full_text_search(Course.objects.all(), query, ['name', 'description'])[:self.max_results]
+        lessons = full_text_search(Lesson.objects.all(), query, ['name'])[:self.max_results]
+        context = {'request': request}
+        return Response({
+            'courses': CourseSerializer(courses, many=True, context=context).data,
+            'lessons': LessonSerializer(lessons, many=True, context=context).data,
+        })
+
+
 class SubscriptionAPIView(APIView):
     """
     APIView для управления подписками на курсы.
@@ -117,25 +324,86 @@ class SubscriptionAPIView(APIView):
     """
     permission_classes = [IsAuthenticated]
     serializer_class = SubscriptionSerializer
+    throttle_scope = 'subscriptions'
 
     def post(self, request, *args, **kwargs):
         """
         Обрабатывает запрос на добавление или удаление подписки пользователя на курс.
         """
-        user = request.user
-        course_id = request.data.get('course_id')
-        course = get_object_or_404(Course, id=course_id)
-
-        # Получаем объекты подписок по текущему пользователю и курса
-        subscription = Subscription.objects.filter(user=user, course=course)
-        if subscription.exists():
-            # Если подписка у пользователя на этот курс есть - удаляем ее
-            subscription.delete()
-            message = 'Подписка удалена'
-        else:
-            # Если подписки у пользователя на этот курс нет - создаем ее
-            Subscription.objects.create(user=user, course=course)
-            message = 'Подписка добавлена'
+        course_id = get_course_id(request.data.get('course_id'))
+
+        # Удаляем подписку, если она есть, иначе создаем ее
+        subscribed = toggle_subscription(request.user, course_id)
+        if subscribed is None:
+            raise Http404
+        message = 'Подписка добавлена' if subscribed else 'Подписка удалена'
 
         # Возвращаем ответ в API
         return Response({"message": message})
+
+
+class CourseSubscriptionAPIView(APIView):
+    """
+    APIView для идемпотентной подписки на курс и отписки от него.
+
+    Methods:
+        put: Подписывает пользователя на курс (повторный запрос ничего не меняет).
+        delete: Отписывает пользователя от курса (повторный запрос ничего не меняет).
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'subscriptions'
+
+    def put(self, request, course_id, *args, **kwargs):
+        """
+        Подписывает пользователя на курс.
+        """
+        if not subscribe(request.user, course_id):
+            raise Http404
+        return Response({"message": 'Подписка добавлена'})
+
+    def delete(self, request, course_id, *args, **kwargs):
+        """
+        Отписывает пользователя от курса.
+        """
+        unsubscribe(request.user, course_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncSubscriptionView(AsyncAPIView):
+    """
+    Асинхронная версия SubscriptionAPIView для работы под ASGI.
+    """
+    throttle_scope = 'subscriptions'
+
+    async def post(self, request, *args, **kwargs):
+        course_id = get_course_id(self.get_data(request).get('course_id'))
+        subscribed = await atoggle_subscription(request.user, course_id)
+        if subscribed is None:
+            raise NotFound()
+        return JsonResponse({"message": 'Подписка добавлена' if subscribed else 'Подписка удалена'})
+
+
+class AsyncCourseSubscriptionView(AsyncAPIView):
+    """
+    Асинхронная версия CourseSubscriptionAPIView для работы под ASGI.
+    """
+    throttle_scope = 'subscriptions'
+
+    async def put(self, request, course_id, *args, **kwargs):
+        if not await asubscribe(request.user, course_id):
+            raise NotFound()
+        return JsonResponse({"message": 'Подписка добавлена'})
+
+    async def delete(self, request, course_id, *args, **kwargs):
+        await aunsubscribe(request.user, course_id)
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+def get_course_id(value):
+    """
+    Приводит идентификатор курса из запроса к числу.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({'course_id': ['Укажите корректный идентификатор курса']})
@@ -0,0 +1,51 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import ParseError
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    Базовый асинхронный контроллер API для работы под ASGI.
+
+    В отличие от APIView DRF, обработчики - корутины, а запрос не занимает поток на время
+    обращений к внешним API. Аутентификация, проверка прав и ограничение частоты запросов
+    выполняются теми же классами и методом initial, что и в APIView (одним переходом в поток),
+    а исключения обрабатываются handle_exception, поэтому ответы об ошибках совпадают с синхронными
+    контроллерами.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        """
+        Асинхронный вариант APIView.dispatch: обработчик запроса ожидается как корутина.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    def get_data(self, request):
+        """
+        Возвращает тело запроса, разобранное парсерами DRF, и проверяет, что это объект.
+        """
+        data = request.data
+        if not isinstance(data, dict):
+            raise ParseError('Ожидается JSON-объект')
+        return data
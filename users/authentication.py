@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from config.cache import bump_version, make_key
+from users.models import User
+
+AUTH_USER_VERSION_NAME = 'auth_user:{}'
+# Поля пользователя, которые хранятся в кеше аутентификации. Пароль и прочие данные профиля в кеш не попадают
+AUTH_USER_CACHE_FIELDS = ('id', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+
+
+def get_auth_user_cache_key(user_id):
+    """
+    Возвращает ключ кеша, под которым хранится пользователь для аутентификации.
+
+    Ключ включает версию пользователя: она увеличивается при любом изменении пользователя
+    (в том числе пароля, флагов доступа и групп), поэтому прежние записи становятся недействительными,
+    даже если были записаны запросом, загрузившим пользователя до изменения.
+    """
+    return make_key(AUTH_USER_VERSION_NAME.format(user_id))
+
+
+def invalidate_cached_users(*user_ids):
+    """
+    Делает недействительными сохраненных для аутентификации пользователей, увеличивая их версии.
+    """
+    bump_version(*(AUTH_USER_VERSION_NAME.format(user_id) for user_id in user_ids))
+
+
+def load_auth_user(**lookup):
+    """
+    Загружает из БД только поля пользователя, хранящиеся в кеше аутентификации.
+    """
+    return User.objects.only(*AUTH_USER_CACHE_FIELDS).get(**lookup)
+
+
+def dump_auth_user(user):
+    """
+    Возвращает значения полей AUTH_USER_CACHE_FIELDS пользователя для записи в кеш.
+    """
+    return tuple(getattr(user, field) for field in AUTH_USER_CACHE_FIELDS)
+
+
+def restore_auth_user(values):
+    """
+    Восстанавливает пользователя из кеша как загруженного из БД с отложенными остальными полями.
+
+    Обращение к отложенному полю загрузит его из БД, а save() обновит только загруженные поля.
+    """
+    # from_db ожидает значения в порядке полей модели
+    values = dict(zip(AUTH_USER_CACHE_FIELDS, values))
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(router.db_for_read(User), field_names, [values[name] for name in field_names])
+
+
+def get_cached_user(user_id):
+    """
+    Возвращает пользователя по id из общего кеша, при промахе загружает его из БД и кеширует.
+
+    Версия пользователя увеличивается сигналами при сохранении и удалении пользователя и изменении
+    его групп, а массовая деактивация увеличивает ее явно. Если AUTH_USER_CACHE_TIMEOUT не задан,
+    пользователь каждый раз загружается из БД.
+    """
+    lookup = {jwt_settings.USER_ID_FIELD: user_id}
+    timeout = settings.AUTH_USER_CACHE_TIMEOUT
+    if not timeout:
+        return load_auth_user(**lookup)
+
+    # Ключ берется до загрузки из БД: если пользователь изменится в это время, запись уйдет под старую версию
+    cache_key = get_auth_user_cache_key(user_id)
+    values = cache.get(cache_key)
+    if values is not None:
+        return restore_auth_user(values)
+    user = load_auth_user(**lookup)
+    cache.set(cache_key, dump_auth_user(user), timeout)
+    return user
+
+
+def get_token_user_id(validated_token):
+    """
+    Возвращает id пользователя из проверенного токена.
+    """
+    try:
+        return validated_token[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_('Token contained no recognizable user identification'))
+
+
+def check_user(user):
+    """
+    Проверяет, что пользователю из токена разрешен доступ, так же как JWTAuthentication.
+    """
+    if not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Аутентификация по JWT, при которой пользователь берется из общего кеша, а не из БД.
+
+    Если у контроллера задан атрибут stateless_authentication = True, то для безопасных методов
+    (GET, HEAD, OPTIONS) пользователь строится из самого токена (TokenUser) без обращения к кешу и БД.
+    Такой пользователь содержит только id, поэтому контроллеру нельзя использовать другие поля
+    пользователя, а деактивация вступает в силу по истечении токена.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if self.is_stateless(request):
+            get_token_user_id(validated_token)
+            return jwt_settings.TOKEN_USER_CLASS(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    def is_stateless(self, request):
+        """
+        Проверяет, можно ли аутентифицировать запрос без загрузки пользователя.
+        """
+        view = getattr(request, 'parser_context', {}).get('view')
+        return request.method in SAFE_METHODS and getattr(view, 'stateless_authentication', False)
+
+    def get_user(self, validated_token):
+        try:
+            user = get_cached_user(get_token_user_id(validated_token))
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        return check_user(user)
@@ -0,0 +1,52 @@
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """
+    Объект с интерфейсом файла, который возвращает записанную строку вместо ее сохранения.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, fields):
+    """
+    Построчно формирует CSV из словарей rows, начиная с заголовка.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+def iter_ndjson(rows, fields):
+    """
+    Построчно формирует NDJSON: по одному JSON-объекту на строку.
+    """
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def stream_export(queryset, fields, export_format, filename):
+    """
+    Возвращает потоковый ответ с выгрузкой queryset в CSV или NDJSON.
+
+    Строки читаются из БД порциями по EXPORT_CHUNK_SIZE через values().iterator(), без создания
+    объектов моделей и сериализаторов, поэтому потребление памяти не зависит от размера выгрузки.
+    """
+    rows = queryset.values(*fields).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    content = iter_csv(rows, fields) if export_format == 'csv' else iter_ndjson(rows, fields)
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import httpx
+import stripe
+import uvicorn
+from django.core.asgi import get_asgi_application
+from django.core.management import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.celery import app as celery_app
+from materials.models import Course
+from users.models import Payment, User
+from users.services import USD_RATE_CACHE_KEY, rates_cache
+
+
+class ExternalAPIStubHandler(BaseHTTPRequestHandler):
+    """
+    Локальная заглушка API курсов валют и Stripe с искусственной задержкой ответа.
+    """
+    latency = 0.05
+    protocol_version = 'HTTP/1.1'
+    responses = {
+        '/v3/latest': {'data': {'RUB': {'code': 'RUB', 'value': 90}}},
+        '/v1/products': {'id': 'prod_benchmark', 'object': 'product'},
+        '/v1/prices': {'id': 'price_benchmark', 'object': 'price'},
+        '/v1/checkout/sessions': {'id': 'cs_benchmark', 'object': 'checkout.session',
+                                  'url': 'https://checkout.stripe.com/cs_benchmark'},
+    }
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.respond()
+
+    def respond(self):
+        time.sleep(self.latency)
+        body = json.dumps(self.responses.get(self.path.split('?')[0], {})).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """
+    WSGI-сервер с фиксированным пулом потоков, как у gunicorn с gthread-воркером.
+    """
+    threads = 8
+
+    def server_activate(self):
+        super().server_activate()
+        self.executor = ThreadPoolExecutor(max_workers=self.threads)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает пропускную способность синхронного (WSGI) и асинхронного (ASGI) создания платежа.
+
+    Внешние API заменяются локальной заглушкой с задержкой ответа. Синхронный контроллер выполняет
+    задачу Celery в том же процессе (task_always_eager), поэтому оба варианта ходят во внешние API
+    в рамках запроса. WSGI обслуживается пулом из --threads потоков, ASGI - uvicorn в одном цикле событий.
+    """
+    help = 'Нагрузочный тест создания платежа под WSGI и ASGI с заглушкой внешних API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Количество запросов на вариант')
+        parser.add_argument('--concurrency', type=int, default=50, help='Количество одновременных запросов')
+        parser.add_argument('--threads', type=int, default=8, help='Количество потоков WSGI-сервера')
+        parser.add_argument('--latency', type=float, default=0.05, help='Задержка ответа внешних API (с)')
+
+    def handle(self, *args, **options):
+        ExternalAPIStubHandler.latency = options['latency']
+        PooledWSGIServer.threads = options['threads']
+        stub = ThreadingHTTPServer(('127.0.0.1', 0), ExternalAPIStubHandler)
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+        stub_url = f'http://127.0.0.1:{stub.server_port}'
+
+        user, _ = User.objects.get_or_create(email='benchmark@example.com')
+        course = Course.objects.create(name='Нагрузочный тест')
+        token = str(AccessToken.for_user(user))
+        api_base, api_key, always_eager = stripe.api_base, stripe.api_key, celery_app.conf.task_always_eager
+        stripe.api_base, stripe.api_key = stub_url, api_key or 'sk_test_benchmark'
+        celery_app.conf.task_always_eager = True
+        rates_cache.delete(USD_RATE_CACHE_KEY)
+        try:
+            with override_settings(CUR_API_URL=f'{stub_url}/', ALLOWED_HOSTS=['*']):
+                results = [
+                    ('WSGI', self.run_wsgi(options, course, token)),
+                    ('ASGI', self.run_asgi(options, course, token)),
+                ]
+        finally:
+            stripe.api_base, stripe.api_key = api_base, api_key
+            celery_app.conf.task_always_eager = always_eager
+            stub.shutdown()
+            Payment.objects.filter(user=user).delete()
+            course.delete()
+            user.delete()
+
+        for name, result in results:
+            self.stdout.write(
+                f'{name}: {result["rps"]:.1f} запросов/с, p50 {result["p50"] * 1000:.0f} мс, '
+                f'p95 {result["p95"] * 1000:.0f} мс, ошибок {result["errors"]}'
+            )
+
+    def run_wsgi(self, options, course, token):
+        server = make_server('127.0.0.1', 0, get_wsgi_application(), server_class=PooledWSGIServer,
+                             handler_class=QuietWSGIRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = f'http://127.0.0.1:{server.server_port}/users/payments/create/'
+            return asyncio.run(self.load(url, options, course, token))
+        finally:
+            server.shutdown()
+            server.executor.shutdown()
+
+    def run_asgi(self, options, course, token):
+        server = uvicorn.Server(uvicorn.Config(get_asgi_application(), host='127.0.0.1', port=0,
+                                               log_level='warning', lifespan='off'))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        try:
+            port = server.servers[0].sockets[0].getsockname()[1]
+            url = f'http://127.0.0.1:{port}/users/payments/async/create/'
+            return asyncio.run(self.load(url, options, course, token))
+        finally:
+            server.should_exit = True
+            thread.join()
+
+    async def load(self, url, options, course, token):
+        """
+        Отправляет запросы с заданной конкурентностью и возвращает пропускную способность и задержки.
+        """
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        limits = httpx.Limits(max_connections=options['concurrency'])
+        headers = {'Authorization': f'Bearer {token}'}
+        payload = {'paid_course': course.pk, 'amount': 1000, 'payment_method': 'transfer'}
+        latencies, errors = [], 0
+
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            async def request():
+                nonlocal errors
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post(url, json=payload, headers=headers)
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code != 201:
+                        errors += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*[request() for _ in range(options['requests'])])
+            elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'rps': len(latencies) / elapsed,
+            'p50': statistics.median(latencies),
+            'p95': latencies[int(len(latencies) * 0.95) - 1],
+            'errors': errors,
+        }
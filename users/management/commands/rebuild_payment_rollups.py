@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from users.tasks import rebuild_payment_rollups
+
+
+class Command(BaseCommand):
+    """
+    Полностью пересчитывает агрегаты платежей для аналитики.
+    """
+    help = 'Пересчитывает агрегаты платежей PaymentRollup с нуля'
+
+    def handle(self, *args, **options):
+        result = rebuild_payment_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Учтено платежей: {result["payments"]}, агрегатов: {result["rollups"]}'
+        ))
@@ -0,0 +1,37 @@
+import uuid
+
+from django.db import migrations, models
+
+
+def gen_idempotency_keys(apps, schema_editor):
+    Payment = apps.get_model('users', 'Payment')
+    for payment in Payment.objects.only('pk'):
+        payment.idempotency_key = uuid.uuid4()
+        payment.save(update_fields=['idempotency_key'])
+
+
+def set_existing_status(apps, schema_editor):
+    Payment = apps.get_model('users', 'Payment')
+    Payment.objects.exclude(stripe_payment_url__isnull=True).update(status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_user_active_last_login_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает создания ссылки на оплату'), ('ready', 'Ссылка на оплату готова'), ('failed', 'Ошибка создания ссылки на оплату')], default='pending', max_length=20, verbose_name='Статус платежа'),
+        ),
+        migrations.RunPython(set_existing_status, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='payment',
+            name='idempotency_key',
+            field=models.UUIDField(editable=False, null=True, verbose_name='Ключ идемпотентности'),
+        ),
+        migrations.RunPython(gen_idempotency_keys, migrations.RunPython.noop),
+    ]
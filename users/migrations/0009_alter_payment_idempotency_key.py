@@ -0,0 +1,18 @@
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_payment_status_payment_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='idempotency_key',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Ключ идемпотентности'),
+        ),
+    ]
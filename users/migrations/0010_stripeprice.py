@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_alter_payment_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripePrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.CharField(max_length=255, verbose_name='Идентификатор продукта Stripe')),
+                ('unit_amount', models.PositiveIntegerField(verbose_name='Цена в центах')),
+                ('currency', models.CharField(max_length=3, verbose_name='Валюта')),
+                ('price_id', models.CharField(max_length=255, verbose_name='Идентификатор цены Stripe')),
+            ],
+            options={
+                'verbose_name': 'Цена Stripe',
+                'verbose_name_plural': 'Цены Stripe',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stripeprice',
+            constraint=models.UniqueConstraint(fields=('product_id', 'unit_amount', 'currency'), name='unique_stripe_price'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('materials', '0008_hot_path_indexes'),
+        ('users', '0011_payment_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', 'payment_date'], name='payment_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['paid_course', 'paid_lesson', 'payment_method'], name='payment_filter_idx'),
+        ),
+    ]
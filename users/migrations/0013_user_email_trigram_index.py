@@ -0,0 +1,29 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+def create_email_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Индекс по UPPER(email), так как поиск icontains в PostgreSQL сравнивает UPPER(email) LIKE UPPER(...)
+    schema_editor.execute(
+        'CREATE INDEX users_user_email_upper_trgm_idx ON users_user USING gin (UPPER(email) gin_trgm_ops);'
+    )
+
+
+def drop_email_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS users_user_email_upper_trgm_idx;')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_hot_path_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_email_trigram_index, drop_email_trigram_index),
+    ]
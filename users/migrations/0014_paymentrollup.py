@@ -0,0 +1,46 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0010_search_vector_triggers'),
+        ('users', '0013_user_email_trigram_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentRollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_payment_id', models.PositiveBigIntegerField(default=0, verbose_name='Последний учтенный платеж')),
+            ],
+            options={
+                'verbose_name': 'Водяной знак агрегации платежей',
+                'verbose_name_plural': 'Водяные знаки агрегации платежей',
+            },
+        ),
+        migrations.CreateModel(
+            name='PaymentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('payment_method', models.CharField(choices=[('cash', 'Наличные'), ('transfer', 'Перевод на счет')], max_length=20, verbose_name='Способ оплаты')),
+                ('total_amount', models.PositiveBigIntegerField(default=0, verbose_name='Сумма платежей')),
+                ('payments_count', models.PositiveIntegerField(default=0, verbose_name='Количество платежей')),
+                ('paid_course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='materials.course', verbose_name='Оплаченный курс')),
+                ('paid_lesson', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='materials.lesson', verbose_name='Оплаченный урок')),
+            ],
+            options={
+                'verbose_name': 'Агрегат платежей',
+                'verbose_name_plural': 'Агрегаты платежей',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='paymentrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'paid_course', 'paid_lesson', 'payment_method'), name='unique_payment_rollup', nulls_distinct=False),
+        ),
+    ]
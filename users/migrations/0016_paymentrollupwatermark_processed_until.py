@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_drop_redundant_fk_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='paymentrollupwatermark',
+            name='last_payment_id',
+        ),
+        migrations.AddField(
+            model_name='paymentrollupwatermark',
+            name='processed_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Платежи учтены по'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils import timezone
@@ -32,6 +34,9 @@ class User(AbstractUser):
     class Meta:
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
+        indexes = [
+            models.Index(fields=["last_login"], condition=models.Q(is_active=True), name="user_active_last_login_idx"),
+        ]
 
     def __str__(self):
         return self.email
@@ -46,9 +51,19 @@ class Payment(models.Model):
         ('transfer', 'Перевод на счет'),
     ]
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Пользователь")
+    STATUS_PENDING = 'pending'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает создания ссылки на оплату'),
+        (STATUS_READY, 'Ссылка на оплату готова'),
+        (STATUS_FAILED, 'Ошибка создания ссылки на оплату'),
+    ]
+
+    # Индексы по user и paid_course обслуживают составные индексы payment_user_date_idx и payment_filter_idx
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Пользователь", db_index=False)
     payment_date = models.DateTimeField(auto_now_add=True, verbose_name="Дата оплаты")
-    paid_course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True,
+    paid_course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, db_index=False,
                                     verbose_name="Оплаченный курс")
     paid_lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, null=True, blank=True,
                                     verbose_name="Оплаченный урок")
@@ -58,10 +73,98 @@ class Payment(models.Model):
     stripe_session_id = models.CharField(max_length=255, blank=True, null=True,
                                          verbose_name="Идентификатор сессии Stripe")
     stripe_payment_url = models.URLField(max_length=500, blank=True, null=True, verbose_name="Ссылка на оплату в Stripe")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING,
+                              verbose_name="Статус платежа")
+    idempotency_key = models.UUIDField(default=uuid.uuid4, unique=True, editable=False,
+                                       verbose_name="Ключ идемпотентности")
 
     class Meta:
         verbose_name = "Платеж"
         verbose_name_plural = "Платежи"
+        indexes = [
+            models.Index(fields=["payment_date", "id"], name="payment_date_id_idx"),
+            models.Index(fields=["user", "payment_date"], name="payment_user_date_idx"),
+            models.Index(fields=["paid_course", "paid_lesson", "payment_method"], name="payment_filter_idx"),
+        ]
 
     def __str__(self):
         return f'{self.user} - {self.amount} - {self.payment_method}'
+
+
+class StripePrice(models.Model):
+    """
+    Кеш цен Stripe, чтобы не создавать новую цену для каждого платежа.
+
+    Attributes:
+        product_id (CharField): Идентификатор продукта Stripe.
+        unit_amount (PositiveIntegerField): Цена в минимальных единицах валюты (центах).
+        currency (CharField): Валюта цены.
+        price_id (CharField): Идентификатор цены Stripe.
+    """
+    product_id = models.CharField(max_length=255, verbose_name="Идентификатор продукта Stripe")
+    unit_amount = models.PositiveIntegerField(verbose_name="Цена в центах")
+    currency = models.CharField(max_length=3, verbose_name="Валюта")
+    price_id = models.CharField(max_length=255, verbose_name="Идентификатор цены Stripe")
+
+    class Meta:
+        verbose_name = "Цена Stripe"
+        verbose_name_plural = "Цены Stripe"
+        constraints = [
+            models.UniqueConstraint(fields=["product_id", "unit_amount", "currency"], name="unique_stripe_price"),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} - {self.unit_amount} {self.currency}'
+
+
+class PaymentRollup(models.Model):
+    """
+    Дневные агрегаты платежей для аналитики.
+
+    Строка хранит сумму и количество платежей за день в разрезе курса, урока и способа оплаты.
+    Учитываются только платежи в статусе ready, то есть с выданной ссылкой на оплату: подтверждения оплаты
+    от Stripe в проекте нет, поэтому это выставленные счета, а не полученная выручка.
+    Заполняется задачей update_payment_rollups, которая пересчитывает дни начиная с водяного знака.
+
+    Attributes:
+        day (DateField): День оплаты.
+        paid_course (ForeignKey): Оплаченный курс.
+        paid_lesson (ForeignKey): Оплаченный урок.
+        payment_method (CharField): Способ оплаты.
+        total_amount (PositiveBigIntegerField): Сумма платежей.
+        payments_count (PositiveIntegerField): Количество платежей.
+    """
+    day = models.DateField(verbose_name="День")
+    paid_course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True,
+                                    verbose_name="Оплаченный курс")
+    paid_lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, null=True, blank=True,
+                                    verbose_name="Оплаченный урок")
+    payment_method = models.CharField(max_length=20, choices=Payment.PAYMENT_METHOD_CHOICES,
+                                      verbose_name="Способ оплаты")
+    total_amount = models.PositiveBigIntegerField(default=0, verbose_name="Сумма платежей")
+    payments_count = models.PositiveIntegerField(default=0, verbose_name="Количество платежей")
+
+    class Meta:
+        verbose_name = "Агрегат платежей"
+        verbose_name_plural = "Агрегаты платежей"
+        constraints = [
+            models.UniqueConstraint(fields=["day", "paid_course", "paid_lesson", "payment_method"],
+                                    nulls_distinct=False, name="unique_payment_rollup"),
+        ]
+
+    def __str__(self):
+        return f'{self.day} - {self.payment_method} - {self.total_amount}'
+
+
+class PaymentRollupWatermark(models.Model):
+    """
+    Водяной знак агрегации платежей: время, по которое платежи учтены в PaymentRollup.
+    """
+    processed_until = models.DateTimeField(null=True, blank=True, verbose_name="Платежи учтены по")
+
+    class Meta:
+        verbose_name = "Водяной знак агрегации платежей"
+        verbose_name_plural = "Водяные знаки агрегации платежей"
+
+    def __str__(self):
+        return str(self.processed_until)
@@ -0,0 +1,8 @@
+from materials.paginators import CustomCursorPagination
+
+
+class PaymentCursorPagination(CustomCursorPagination):
+    """
+    Курсорная пагинация платежей по дате оплаты (от новых к старым).
+    """
+    ordering = ('-payment_date', '-id')
@@ -1,5 +1,57 @@
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
 from rest_framework.permissions import BasePermission
 
+MODERATORS_GROUP = 'moderators'
+USER_GROUPS_CACHE_KEY = 'user_groups:{}'
+
+
+def get_user_groups_cache_key(user_id):
+    """
+    Возвращает ключ кеша, под которым хранятся группы пользователя.
+    """
+    return USER_GROUPS_CACHE_KEY.format(user_id)
+
+
+def invalidate_user_groups(*user_ids):
+    """
+    Удаляет из общего кеша сохраненные группы пользователей.
+    """
+    cache.delete_many([get_user_groups_cache_key(user_id) for user_id in user_ids])
+
+
+def get_user_groups(request):
+    """
+    Возвращает множество названий групп пользователя, выполнившего запрос.
+
+    Группы загружаются из БД один раз за запрос и запоминаются на объекте запроса.
+    Если задан USER_GROUPS_CACHE_TIMEOUT, результат дополнительно хранится в общем кеше
+    между запросами и сбрасывается сигналами при изменении членства в группах, переименовании
+    и удалении групп.
+    Группы выбираются по id пользователя, поэтому проверка работает и для TokenUser.
+    """
+    groups = getattr(request, '_cached_group_names', None)
+    if groups is not None:
+        return groups
+
+    user = request.user
+    if not user.is_authenticated:
+        request._cached_group_names = frozenset()
+        return request._cached_group_names
+
+    timeout = getattr(settings, 'USER_GROUPS_CACHE_TIMEOUT', None)
+    cache_key = get_user_groups_cache_key(user.pk)
+    if timeout:
+        groups = cache.get(cache_key)
+    if groups is None:
+        groups = frozenset(Group.objects.filter(user__pk=user.pk).values_list('name', flat=True))
+        if timeout:
+            cache.set(cache_key, groups, timeout)
+
+    request._cached_group_names = groups
+    return groups
+
 
 class IsModerator(BasePermission):
     """
@@ -7,7 +59,7 @@ class IsModerator(BasePermission):
     """
 
     def has_permission(self, request, view):
-        return request.user.groups.filter(name='moderators').exists()
+        return MODERATORS_GROUP in get_user_groups(request)
 
 
 class IsOwner(BasePermission):
@@ -16,4 +68,4 @@ class IsOwner(BasePermission):
     """
 
     def has_object_permission(self, request, view, obj):
-        return obj.owner == request.user
+        return obj.owner_id is not None and obj.owner_id == request.user.pk
@@ -1,18 +1,40 @@
-from rest_framework.serializers import ModelSerializer, CharField
+from rest_framework.serializers import ModelSerializer, CharField, ValidationError
 
+from config.metrics import TimedSerializerMixin
+from materials.mixins import SparseFieldsSerializerMixin
 from users.models import Payment, User
 
 
-class PaymentSerializer(ModelSerializer):
+class PaymentSerializer(TimedSerializerMixin, SparseFieldsSerializerMixin, ModelSerializer):
     """ Сериализатор для модели Payment. """
 
     class Meta:
         model = Payment
         fields = '__all__'
-        read_only_fields = ['user', 'stripe_session_id', 'stripe_payment_url']
+        read_only_fields = ['user', 'stripe_session_id', 'stripe_payment_url', 'status', 'idempotency_key']
 
+    def validate(self, attrs):
+        """
+        Проверяет, что платеж оплачивает ровно один объект: курс или урок.
+        """
+        paid_course = attrs.get('paid_course', getattr(self.instance, 'paid_course', None))
+        paid_lesson = attrs.get('paid_lesson', getattr(self.instance, 'paid_lesson', None))
+        if paid_course is None and paid_lesson is None:
+            raise ValidationError({'paid_course': ['Укажите оплаченный курс или урок']})
+        if paid_course is not None and paid_lesson is not None:
+            raise ValidationError({'paid_lesson': ['Укажите либо курс, либо урок']})
+        return attrs
 
-class UserSerializer(ModelSerializer):
+
+class PaymentStatusSerializer(TimedSerializerMixin, ModelSerializer):
+    """ Сериализатор для получения статуса создания ссылки на оплату. """
+
+    class Meta:
+        model = Payment
+        fields = ['id', 'status', 'stripe_payment_url']
+
+
+class UserSerializer(TimedSerializerMixin, SparseFieldsSerializerMixin, ModelSerializer):
     """
     Сериализатор для модели User для стандартных CRUD операций.
     """
@@ -23,7 +45,7 @@ class UserSerializer(ModelSerializer):
         fields = ['id', 'email', 'phone', 'city', 'avatar', 'password']
 
 
-class UserProfileSerializer(ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, ModelSerializer):
     """
     Сериализатор для модели User с включенной историей платежей.
     """
@@ -1,46 +1,404 @@
+import asyncio
+import logging
+import time
+import weakref
+
+import httpx
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import caches
+from requests.adapters import HTTPAdapter
 from rest_framework import status
 import stripe
 
+from users.models import Payment, StripePrice
+
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+logger = logging.getLogger(__name__)
+
+# Курсы валют хранятся в отдельном кеше, чтобы их не вытесняли закешированные ответы
+rates_cache = caches['rates']
+
+USD_RATE_CACHE_KEY = 'exchange_rate:RUB'
+USD_RATE_REFRESH_LOCK_KEY = 'exchange_rate:RUB:refreshing'
+
+# Общая сессия с пулом соединений к API курсов валют
+currency_session = requests.Session()
+currency_session.mount('http://', HTTPAdapter(pool_maxsize=settings.CUR_API_POOL_SIZE))
+currency_session.mount('https://', HTTPAdapter(pool_maxsize=settings.CUR_API_POOL_SIZE))
+
+
+class ExchangeRateUnavailable(Exception):
+    """
+    Курс валют неизвестен: его нет в кеше, а API курсов недоступно.
+    """
+
+
+def get_usd_rate_request():
+    """
+    Возвращает адрес и параметры запроса курса рубля к доллару к API курсов валют.
+    """
+    return f'{settings.CUR_API_URL}v3/latest', {'apikey': settings.CUR_API_KEY, 'currencies': 'RUB'}
+
+
+def parse_usd_rate_response(response):
+    """
+    Извлекает курс из ответа API курсов валют (requests или httpx).
+
+    Возвращает курс или None, если API ответило ошибкой.
+    """
+    if response.status_code != status.HTTP_200_OK:
+        logger.warning('API курсов валют ответило статусом %s', response.status_code)
+        return None
+    return response.json()['data']['RUB']['value']
+
+
+def make_usd_rate_entry(rate):
+    """
+    Возвращает запись кеша с курсом и временем его получения.
+    """
+    return {'rate': rate, 'fetched_at': time.time()}
+
+
+def is_usd_rate_stale(entry):
+    """
+    Проверяет, старше ли закешированный курс CUR_RATE_TTL секунд.
+    """
+    return time.time() - entry['fetched_at'] > settings.CUR_RATE_TTL
+
+
+def rub_to_usd(rub_price, usd_rate):
+    """
+    Переводит сумму в рублях в доллары по курсу.
+
+    Если курс неизвестен, выбрасывает ExchangeRateUnavailable, чтобы платеж не ушел в Stripe с нулевой ценой.
+    """
+    if not usd_rate:
+        raise ExchangeRateUnavailable('Не удалось получить курс рубля к доллару')
+    return rub_price / usd_rate
+
+
+def fetch_usd_rate():
+    """
+    Запрашивает актуальный курс рубля к доллару у внешнего API.
+
+    Возвращает курс или None, если API недоступно или ответило ошибкой.
+    """
+    url, params = get_usd_rate_request()
+    try:
+        response = currency_session.get(url, params=params, timeout=settings.CUR_API_TIMEOUT)
+    except requests.RequestException:
+        logger.warning('API курсов валют недоступно', exc_info=True)
+        return None
+    return parse_usd_rate_response(response)
+
+
+def refresh_usd_rate():
+    """
+    Обновляет курс рубля к доллару в кеше.
+
+    Запись хранится CUR_RATE_STALE_TTL секунд, чтобы при недоступности API можно было вернуть устаревший курс.
+    """
+    rate = fetch_usd_rate()
+    if rate is not None:
+        rates_cache.set(USD_RATE_CACHE_KEY, make_usd_rate_entry(rate), settings.CUR_RATE_STALE_TTL)
+    return rate
+
+
+def get_usd_rate():
+    """
+    Возвращает курс рубля к доллару из кеша.
+
+    - Свежий курс (моложе CUR_RATE_TTL) возвращается сразу.
+    - Устаревший курс тоже возвращается сразу, а обновление запускается в фоне задачей Celery.
+    - Если курса в кеше нет, он запрашивается у API синхронно.
+    """
+    cached = rates_cache.get(USD_RATE_CACHE_KEY)
+    if cached is None:
+        return refresh_usd_rate()
+
+    if is_usd_rate_stale(cached):
+        # Запускаем не больше одного фонового обновления одновременно
+        if rates_cache.add(USD_RATE_REFRESH_LOCK_KEY, True, settings.CUR_API_TIMEOUT * 2):
+            from users.tasks import refresh_exchange_rates
+            refresh_exchange_rates.delay()
+    return cached['rate']
+
 
 def convert_currencies(rub_price):
-    usd_price = 0
-    response = requests.get(
-        f'{settings.CUR_API_URL}v3/latest?apikey={settings.CUR_API_KEY}&currencies=RUB'
-    )
-    if response.status_code == status.HTTP_200_OK:
-        usd_rate = response.json()['data']['RUB']['value']
-        usd_price = rub_price / usd_rate
+    """
+    Переводит сумму в рублях в доллары по текущему курсу (см. rub_to_usd).
+    """
+    return rub_to_usd(rub_price, get_usd_rate())
 
-    return usd_price
 
+# Асинхронные клиенты к API курсов валют. Пул соединений httpx привязан к циклу событий,
+# поэтому клиент создается один раз на цикл (в ASGI-воркере цикл один).
+_async_currency_clients = weakref.WeakKeyDictionary()
 
-def create_stripe_product(name):
+
+def get_async_currency_client():
+    """
+    Возвращает асинхронный HTTP-клиент с пулом соединений к API курсов валют для текущего цикла событий.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_currency_clients.get(loop)
+    if client is None:
+        limits = httpx.Limits(max_connections=settings.CUR_API_POOL_SIZE,
+                              max_keepalive_connections=settings.CUR_API_POOL_SIZE)
+        client = httpx.AsyncClient(limits=limits, timeout=settings.CUR_API_TIMEOUT)
+        _async_currency_clients[loop] = client
+    return client
+
+
+async def afetch_usd_rate():
+    """
+    Асинхронная версия fetch_usd_rate.
+    """
+    url, params = get_usd_rate_request()
+    try:
+        response = await get_async_currency_client().get(url, params=params)
+    except httpx.HTTPError:
+        logger.warning('API курсов валют недоступно', exc_info=True)
+        return None
+    return parse_usd_rate_response(response)
+
+
+async def arefresh_usd_rate():
+    """
+    Асинхронная версия refresh_usd_rate.
+    """
+    rate = await afetch_usd_rate()
+    if rate is not None:
+        await rates_cache.aset(USD_RATE_CACHE_KEY, make_usd_rate_entry(rate), settings.CUR_RATE_STALE_TTL)
+    return rate
+
+
+async def aget_usd_rate():
+    """
+    Асинхронная версия get_usd_rate с той же логикой устаревания курса.
+    """
+    cached = await rates_cache.aget(USD_RATE_CACHE_KEY)
+    if cached is None:
+        return await arefresh_usd_rate()
+
+    if is_usd_rate_stale(cached):
+        if await rates_cache.aadd(USD_RATE_REFRESH_LOCK_KEY, True, settings.CUR_API_TIMEOUT * 2):
+            from users.tasks import refresh_exchange_rates
+            await sync_to_async(refresh_exchange_rates.delay)()
+    return cached['rate']
+
+
+async def aconvert_currencies(rub_price):
+    """
+    Асинхронная версия convert_currencies.
+    """
+    return rub_to_usd(rub_price, await aget_usd_rate())
+
+
+# Параметры запросов к Stripe общие для синхронных и асинхронных функций, отличается только вызов API
+
+def to_unit_amount(amount_in_usd):
+    """ Переводит сумму в долларах в центы, в которых Stripe принимает цены. """
+    return int(amount_in_usd * 100)
+
+
+def get_stripe_product_idempotency_key(item):
+    """ Возвращает ключ идемпотентности создания продукта Stripe для курса или урока. """
+    return f'{item._meta.label_lower}-{item.pk}-product'
+
+
+def get_stripe_price_idempotency_key(product_id, unit_amount, currency):
+    """ Возвращает ключ идемпотентности создания цены Stripe. """
+    return f'{product_id}-{unit_amount}-{currency}-price'
+
+
+def get_stripe_session_idempotency_key(payment):
+    """ Возвращает ключ идемпотентности создания сессии оплаты Stripe для платежа. """
+    return f'{payment.idempotency_key}-session'
+
+
+def get_stripe_price_params(product_id, amount_in_usd, currency='usd'):
+    """ Возвращает параметры создания цены для продукта в Stripe. """
+    return {'currency': currency, 'unit_amount': to_unit_amount(amount_in_usd), 'product': product_id}
+
+
+def get_stripe_session_params(price_id):
+    """ Возвращает параметры создания сессии на оплату в Stripe. """
+    return {
+        'success_url': "http://127.0.0.1:8000/",
+        'line_items': [{"price": price_id, "quantity": 1}],
+        'mode': "payment",
+    }
+
+
+def get_stripe_prices(product_id, amount_in_usd, currency):
+    """
+    Возвращает выборку сохраненных цен Stripe для продукта и суммы.
+    """
+    return StripePrice.objects.filter(
+        product_id=product_id, unit_amount=to_unit_amount(amount_in_usd), currency=currency
+    ).values_list('price_id', flat=True)
+
+
+def create_stripe_product(name, idempotency_key=None):
     """
     Создает продукт в Stripe.
     """
-    product = stripe.Product.create(name=name)
+    product = stripe.Product.create(name=name, idempotency_key=idempotency_key)
     return product.id
 
 
-def create_stripe_price(product_id, amount_in_usd):
+def create_stripe_price(product_id, amount_in_usd, idempotency_key=None, currency='usd'):
     """ Создает цену для продукта в Stripe. """
-    price = stripe.Price.create(
-        currency="usd",
-        unit_amount=int(amount_in_usd * 100),
-        product=product_id,
+    return stripe.Price.create(**get_stripe_price_params(product_id, amount_in_usd, currency),
+                               idempotency_key=idempotency_key)
+
+
+def update_stripe_product(product_id, name):
+    """ Обновляет название продукта в Stripe. """
+    stripe.Product.modify(product_id, name=name)
+
+
+def get_or_create_stripe_product(item):
+    """
+    Возвращает идентификатор продукта Stripe для курса или урока.
+
+    Продукт создается при первой оплате и сохраняется на модели. Если название курса или урока
+    изменилось с момента создания продукта, оно обновляется в Stripe.
+    """
+    items = type(item).objects.filter(pk=item.pk)
+    if not item.stripe_product_id:
+        product_id = create_stripe_product(name=item.name, idempotency_key=get_stripe_product_idempotency_key(item))
+        updated = items.filter(stripe_product_id__isnull=True).update(
+            stripe_product_id=product_id, stripe_product_name=item.name
+        )
+        if not updated:
+            # Продукт уже создан параллельным запросом - используем его
+            product_id = items.values_list('stripe_product_id', flat=True).get()
+        item.stripe_product_id, item.stripe_product_name = product_id, item.name
+    elif item.stripe_product_name != item.name:
+        update_stripe_product(item.stripe_product_id, item.name)
+        items.update(stripe_product_name=item.name)
+        item.stripe_product_name = item.name
+    return item.stripe_product_id
+
+
+def get_or_create_stripe_price(product_id, amount_in_usd, currency='usd'):
+    """
+    Возвращает идентификатор цены Stripe для продукта и суммы.
+
+    Цены кешируются в StripePrice по (продукт, сумма в центах, валюта), поэтому
+    для повторяющейся суммы запрос в Stripe не выполняется.
+    """
+    price_id = get_stripe_prices(product_id, amount_in_usd, currency).first()
+    if price_id:
+        return price_id
+
+    unit_amount = to_unit_amount(amount_in_usd)
+    price = create_stripe_price(
+        product_id, amount_in_usd, idempotency_key=get_stripe_price_idempotency_key(product_id, unit_amount, currency),
+        currency=currency,
+    )
+    stripe_price, _ = StripePrice.objects.get_or_create(
+        product_id=product_id, unit_amount=unit_amount, currency=currency, defaults={'price_id': price.id}
     )
-    return price
+    return stripe_price.price_id
 
 
-def create_stripe_session(price):
+def create_stripe_session(price_id, idempotency_key=None):
     """ Создает сессию на оплату в Stripe. """
-    session = stripe.checkout.Session.create(
-        success_url="http://127.0.0.1:8000/",
-        line_items=[{"price": price.id, "quantity": 1}],
-        mode="payment",
-    )
+    session = stripe.checkout.Session.create(**get_stripe_session_params(price_id), idempotency_key=idempotency_key)
     return session.id, session.url
+
+
+# Асинхронные версии функций Stripe. Библиотека stripe выполняет их через httpx с пулом соединений.
+
+async def acreate_stripe_product(name, idempotency_key=None):
+    """ Асинхронно создает продукт в Stripe. """
+    product = await stripe.Product.create_async(name=name, idempotency_key=idempotency_key)
+    return product.id
+
+
+async def acreate_stripe_price(product_id, amount_in_usd, idempotency_key=None, currency='usd'):
+    """ Асинхронно создает цену для продукта в Stripe. """
+    return await stripe.Price.create_async(**get_stripe_price_params(product_id, amount_in_usd, currency),
+                                           idempotency_key=idempotency_key)
+
+
+async def aupdate_stripe_product(product_id, name):
+    """ Асинхронно обновляет название продукта в Stripe. """
+    await stripe.Product.modify_async(product_id, name=name)
+
+
+async def acreate_stripe_session(price_id, idempotency_key=None):
+    """ Асинхронно создает сессию на оплату в Stripe. """
+    session = await stripe.checkout.Session.create_async(**get_stripe_session_params(price_id),
+                                                         idempotency_key=idempotency_key)
+    return session.id, session.url
+
+
+async def aget_or_create_stripe_product(item):
+    """
+    Асинхронная версия get_or_create_stripe_product.
+    """
+    items = type(item).objects.filter(pk=item.pk)
+    if not item.stripe_product_id:
+        product_id = await acreate_stripe_product(
+            name=item.name, idempotency_key=get_stripe_product_idempotency_key(item)
+        )
+        updated = await items.filter(stripe_product_id__isnull=True).aupdate(
+            stripe_product_id=product_id, stripe_product_name=item.name
+        )
+        if not updated:
+            product_id = await items.values_list('stripe_product_id', flat=True).aget()
+        item.stripe_product_id, item.stripe_product_name = product_id, item.name
+    elif item.stripe_product_name != item.name:
+        await aupdate_stripe_product(item.stripe_product_id, item.name)
+        await items.aupdate(stripe_product_name=item.name)
+        item.stripe_product_name = item.name
+    return item.stripe_product_id
+
+
+async def aget_or_create_stripe_price(product_id, amount_in_usd, currency='usd'):
+    """
+    Асинхронная версия get_or_create_stripe_price.
+    """
+    price_id = await get_stripe_prices(product_id, amount_in_usd, currency).afirst()
+    if price_id:
+        return price_id
+
+    unit_amount = to_unit_amount(amount_in_usd)
+    price = await acreate_stripe_price(
+        product_id, amount_in_usd, idempotency_key=get_stripe_price_idempotency_key(product_id, unit_amount, currency),
+        currency=currency,
+    )
+    stripe_price, _ = await StripePrice.objects.aget_or_create(
+        product_id=product_id, unit_amount=unit_amount, currency=currency, defaults={'price_id': price.id}
+    )
+    return stripe_price.price_id
+
+
+async def acreate_payment_checkout(payment, paid_item):
+    """
+    Асинхронно создает в Stripe сессию оплаты для платежа и сохраняет ссылку на оплату.
+
+    Курс валют и продукт Stripe не зависят друг от друга, поэтому запрашиваются одновременно.
+    Ключи идемпотентности те же, что у задачи create_payment_checkout, поэтому при ошибке
+    платеж можно безопасно передать задаче.
+    """
+    amount_in_usd, product_id = await asyncio.gather(
+        aconvert_currencies(payment.amount), aget_or_create_stripe_product(paid_item)
+    )
+    price_id = await aget_or_create_stripe_price(product_id, amount_in_usd)
+    session_id, payment_link = await acreate_stripe_session(
+        price_id, idempotency_key=get_stripe_session_idempotency_key(payment)
+    )
+    await Payment.objects.filter(pk=payment.pk).aupdate(
+        stripe_session_id=session_id, stripe_payment_url=payment_link, status=Payment.STATUS_READY
+    )
+    payment.stripe_session_id, payment.stripe_payment_url = session_id, payment_link
+    payment.status = Payment.STATUS_READY
+    return payment
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.authentication import invalidate_cached_users
+from users.models import User
+from users.permissions import invalidate_user_groups
+
+
+def invalidate_user_caches(*user_ids):
+    """
+    Сбрасывает кеш групп и кеш аутентификации пользователей.
+    """
+    invalidate_user_groups(*user_ids)
+    invalidate_cached_users(*user_ids)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def reset_auth_user_cache(sender, instance, **kwargs):
+    """
+    Сбрасывает закешированного для аутентификации пользователя при его изменении или удалении.
+    """
+    invalidate_cached_users(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def reset_user_groups_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Сбрасывает кеш групп пользователей при изменении их членства в группах.
+    """
+    if not reverse:
+        # Изменились группы конкретного пользователя
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_user_caches(instance.pk)
+    elif action == 'pre_clear':
+        # Группа очищается целиком - сбрасываем кеш всех ее участников, пока они еще известны
+        invalidate_user_caches(*instance.user_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        invalidate_user_caches(*pk_set)
+
+
+@receiver(post_save, sender=Group)
+def reset_group_members_cache(sender, instance, created, **kwargs):
+    """
+    Сбрасывает кеш групп участников группы при ее переименовании.
+    """
+    if not created:
+        invalidate_user_caches(*instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_members(sender, instance, **kwargs):
+    """
+    Запоминает участников удаляемой группы: связи с ними удаляются каскадно без сигнала m2m_changed.
+    """
+    instance._member_ids = list(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def reset_deleted_group_members_cache(sender, instance, **kwargs):
+    """
+    Сбрасывает кеш групп бывших участников удаленной группы.
+    """
+    invalidate_user_caches(*getattr(instance, '_member_ids', ()))
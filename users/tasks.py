@@ -1,16 +1,165 @@
+import logging
+
+import stripe
 from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from datetime import timedelta
-from users.models import User
+
+from users.authentication import invalidate_cached_users
+from users.models import Payment, PaymentRollup, PaymentRollupWatermark, User
+from users.services import (USD_RATE_REFRESH_LOCK_KEY, ExchangeRateUnavailable, convert_currencies,
+                            create_stripe_session, get_or_create_stripe_price, get_or_create_stripe_product,
+                            get_stripe_session_idempotency_key, rates_cache, refresh_usd_rate)
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
-def deactivate_inactive_users():
-    """Деактивирует пользователей, которые не заходили более месяца."""
+def deactivate_inactive_users(dry_run=False, batch_size=None):
+    """
+    Деактивирует пользователей, которые не заходили более месяца.
+
+    Пользователи обновляются пачками по batch_size одним UPDATE на пачку, пачки выбираются
+    по возрастанию id (keyset-пагинация), чтобы время блокировок оставалось ограниченным.
+    В режиме dry_run только подсчитывает пользователей, которые были бы деактивированы.
+    """
+    batch_size = batch_size or settings.USER_DEACTIVATION_BATCH_SIZE
     one_month_ago = timezone.now() - timedelta(days=30)
     inactive_users = User.objects.filter(last_login__lt=one_month_ago, is_active=True)
 
-    for user in inactive_users:
-        user.is_active = False
-        user.save()
-        print(f'User {user.email} has been deactivated.')
+    if dry_run:
+        result = {'dry_run': True, 'deactivated': inactive_users.count(), 'batches': 0}
+        logger.info('Деактивация неактивных пользователей: %s', result)
+        return result
+
+    deactivated = 0
+    batches = 0
+    last_pk = 0
+    while True:
+        pks = list(inactive_users.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        deactivated += User.objects.filter(pk__in=pks, is_active=True).update(is_active=False)
+        # UPDATE не отправляет сигналы, поэтому кеш аутентификации сбрасываем явно
+        invalidate_cached_users(*pks)
+        batches += 1
+        last_pk = pks[-1]
+        if len(pks) < batch_size:
+            break
+
+    result = {'dry_run': False, 'deactivated': deactivated, 'batches': batches}
+    logger.info('Деактивация неактивных пользователей: %s', result)
+    return result
+
+
+@shared_task
+def refresh_exchange_rates():
+    """Заранее обновляет курс валют в кеше, чтобы платежи не ждали ответа внешнего API."""
+    try:
+        return refresh_usd_rate()
+    finally:
+        rates_cache.delete(USD_RATE_REFRESH_LOCK_KEY)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def create_payment_checkout(self, payment_id):
+    """
+    Создает в Stripe сессию оплаты для платежа и сохраняет ссылку на оплату.
+
+    Продукт и цена переиспользуются между платежами, поэтому обычно выполняется один запрос к Stripe.
+    Сессия создается с ключом идемпотентности платежа, поэтому повторный запуск задачи
+    не создает дублирующих сессий. Если ссылка уже создана, задача ничего не делает.
+
+    Ошибки Stripe и отсутствие курса валют повторяются до max_retries раз. Если платеж не удалось
+    обработать окончательно, он переводится в статус failed, чтобы не оставаться в pending.
+    """
+    payment = Payment.objects.select_related('paid_course', 'paid_lesson').get(pk=payment_id)
+    if payment.stripe_session_id:
+        return payment.stripe_session_id
+
+    paid_item = payment.paid_course or payment.paid_lesson
+    if paid_item is None:
+        logger.error('Платеж %s не связан ни с курсом, ни с уроком', payment_id)
+        Payment.objects.filter(pk=payment_id).update(status=Payment.STATUS_FAILED)
+        return None
+
+    try:
+        amount_in_usd = convert_currencies(payment.amount)
+        product_id = get_or_create_stripe_product(paid_item)
+        price_id = get_or_create_stripe_price(product_id, amount_in_usd)
+        session_id, payment_link = create_stripe_session(
+            price_id, idempotency_key=get_stripe_session_idempotency_key(payment)
+        )
+    except (stripe.error.StripeError, ExchangeRateUnavailable) as exc:
+        if self.request.retries >= self.max_retries:
+            Payment.objects.filter(pk=payment_id).update(status=Payment.STATUS_FAILED)
+            raise
+        raise self.retry(exc=exc)
+    except Exception:
+        Payment.objects.filter(pk=payment_id).update(status=Payment.STATUS_FAILED)
+        raise
+
+    Payment.objects.filter(pk=payment_id).update(
+        stripe_session_id=session_id,
+        stripe_payment_url=payment_link,
+        status=Payment.STATUS_READY,
+    )
+    return session_id
+
+
+@shared_task
+def update_payment_rollups():
+    """
+    Пересчитывает дневные агрегаты PaymentRollup начиная с дня водяного знака минус PAYMENT_ROLLUP_LAG.
+
+    Дни пересчитываются целиком, поэтому повторный учет платежа невозможен, а платежи, закоммиченные
+    позже платежей с большим id, и платежи, перешедшие в ready в пределах запаса, попадают в агрегаты.
+    Водяной знак блокируется на время пересчета, поэтому одновременные запуски выполняются по очереди.
+    Изменения платежей старше запаса не учитываются - для этого есть команда rebuild_payment_rollups.
+    """
+    with transaction.atomic():
+        watermark, _ = PaymentRollupWatermark.objects.get_or_create(pk=1)
+        watermark = PaymentRollupWatermark.objects.select_for_update().get(pk=watermark.pk)
+        now = timezone.now()
+
+        payments = Payment.objects.filter(status=Payment.STATUS_READY)
+        rollups = PaymentRollup.objects.all()
+        if watermark.processed_until is not None:
+            since = timezone.localtime(watermark.processed_until - timedelta(seconds=settings.PAYMENT_ROLLUP_LAG))
+            since = since.replace(hour=0, minute=0, second=0, microsecond=0)
+            payments = payments.filter(payment_date__gte=since)
+            rollups = rollups.filter(day__gte=since.date())
+        rollups.delete()
+
+        groups = (
+            payments.annotate(day=TruncDate('payment_date'))
+            .values('day', 'paid_course_id', 'paid_lesson_id', 'payment_method')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by()
+        )
+        created = PaymentRollup.objects.bulk_create([
+            PaymentRollup(day=group['day'], paid_course_id=group['paid_course_id'],
+                          paid_lesson_id=group['paid_lesson_id'], payment_method=group['payment_method'],
+                          total_amount=group['total'], payments_count=group['count'])
+            for group in groups
+        ])
+
+        watermark.processed_until = now
+        watermark.save(update_fields=['processed_until'])
+
+    result = {'payments': sum(rollup.payments_count for rollup in created), 'rollups': len(created)}
+    logger.info('Обновление агрегатов платежей: %s', result)
+    return result
+
+
+def rebuild_payment_rollups():
+    """
+    Полностью пересчитывает агрегаты платежей с нуля.
+    """
+    with transaction.atomic():
+        PaymentRollupWatermark.objects.select_for_update().filter(pk=1).update(processed_until=None)
+        return update_payment_rollups()
@@ -1,3 +1,876 @@
-from django.test import TestCase
+import asyncio
+import json
+from io import StringIO
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import stripe
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.testing import FastPathContractMixin, QueryPlanMixin
+from materials.models import Course
+from users.authentication import AUTH_USER_CACHE_FIELDS, dump_auth_user, get_auth_user_cache_key
+from users.throttles import SlidingWindowThrottle
+from users.models import Payment, PaymentRollup, PaymentRollupWatermark, User
+from users.services import USD_RATE_CACHE_KEY, ExchangeRateUnavailable, convert_currencies, rates_cache
+from users.views import PaymentViewSet, UserViewSet
+from users.tasks import (create_payment_checkout, deactivate_inactive_users, refresh_exchange_rates,
+                         update_payment_rollups)
+
+
+class PermissionCacheTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create(email='owner@example.com')
+        self.moderator = User.objects.create(email='moderator@example.com')
+        self.moderators = Group.objects.create(name='moderators')
+        self.course = Course.objects.create(name='Тестовый курс', owner=self.owner)
+
+    def test_moderator_groups_cached_between_requests(self):
+        """
+        Тест того, что группы пользователя загружаются один раз и не запрашиваются повторно.
+        """
+        self.moderator.groups.add(self.moderators)
+        self.client.force_authenticate(user=self.moderator)
+        url = reverse("materials:course-detail", args=(self.course.pk,))
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Только курс с признаком подписки: детальная информация берется из кеша
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_groups_cache_invalidated_on_change(self):
+        """
+        Тест сброса кеша групп при изменении членства пользователя в группе.
+        """
+        self.client.force_authenticate(user=self.moderator)
+        url = reverse("materials:course-detail", args=(self.course.pk,))
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.moderators.user_set.add(self.moderator)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.moderator.groups.clear()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_groups_cache_invalidated_on_group_rename_and_delete(self):
+        """
+        Тест сброса кеша групп при переименовании и удалении группы.
+        """
+        self.moderators.user_set.add(self.moderator)
+        self.client.force_authenticate(user=self.moderator)
+        url = reverse("materials:course-detail", args=(self.course.pk,))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        self.moderators.name = 'former moderators'
+        self.moderators.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.moderators.name = 'moderators'
+        self.moderators.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        self.moderators.delete()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_owner_permission(self):
+        """
+        Тест доступа владельца курса без членства в группе модераторов.
+        """
+        self.client.force_authenticate(user=self.owner)
+        url = reverse("materials:course-detail", args=(self.course.pk,))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class CachedJWTAuthenticationTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='jwt@example.com')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.user_table = connection.ops.quote_name(User._meta.db_table)
+
+    def count_user_queries(self, url):
+        """
+        Выполняет запрос и возвращает его ответ и количество запросов к таблице пользователей.
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        return response, sum(self.user_table in query['sql'] for query in context.captured_queries)
+
+    def test_user_loaded_from_cache(self):
+        """
+        Тест того, что пользователь загружается из БД только при первом запросе.
+        """
+        url = reverse('users:payment-list')
+        response, user_queries = self.count_user_queries(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(user_queries, 1)
+
+        response, user_queries = self.count_user_queries(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(user_queries, 0)
+
+    def test_cache_invalidated_on_save(self):
+        """
+        Тест того, что деактивация пользователя через save сразу запрещает доступ.
+        """
+        url = reverse('users:payment-list')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cache_invalidated_on_bulk_deactivation(self):
+        """
+        Тест сброса кеша при массовой деактивации пользователей задачей Celery.
+        """
+        url = reverse('users:payment-list')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        User.objects.filter(pk=self.user.pk).update(last_login=timezone.now() - timedelta(days=60))
+        deactivate_inactive_users()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cache_invalidated_on_group_change(self):
+        """
+        Тест сброса кеша пользователя при изменении его групп.
+        """
+        self.client.get(reverse('users:payment-list'))
+        self.assertIsNotNone(cache.get(get_auth_user_cache_key(self.user.pk)))
+
+        Group.objects.create(name='moderators').user_set.add(self.user)
+        self.assertIsNone(cache.get(get_auth_user_cache_key(self.user.pk)))
+
+    def test_cached_user_without_password(self):
+        """
+        Тест того, что в кеш аутентификации попадают только нужные поля пользователя, без хеша пароля.
+        """
+        self.user.set_password('password')
+        self.user.save()
+        self.client.get(reverse('users:payment-list'))
+
+        values = cache.get(get_auth_user_cache_key(self.user.pk))
+        self.assertEqual(len(values), len(AUTH_USER_CACHE_FIELDS))
+        self.assertNotIn(self.user.password, values)
+
+    def test_stale_cache_write_ignored(self):
+        """
+        Тест того, что запись кеша запросом, загрузившим пользователя до его деактивации, не действует.
+        """
+        stale_key = get_auth_user_cache_key(self.user.pk)
+        stale_values = dump_auth_user(self.user)
+        self.user.is_active = False
+        self.user.save()
+        cache.set(stale_key, stale_values)
+
+        self.assertEqual(self.client.get(reverse('users:payment-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stateless_read_endpoint(self):
+        """
+        Тест того, что контроллеры чтения со stateless_authentication не загружают пользователя вовсе.
+        """
+        course = Course.objects.create(name='Тестовый курс', owner=self.user)
+        response, user_queries = self.count_user_queries(reverse('materials:course-detail', args=(course.pk,)))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(user_queries, 0)
+        self.assertIsNone(cache.get(get_auth_user_cache_key(self.user.pk)))
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {'auth_ip': '2/min', 'subscriptions': '2/min', 'subscriptions_ip': '100/min'},
+})
+class ThrottleTestCase(APITestCase):
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.user = User.objects.create(email='throttled@example.com')
+        self.user.set_password('password')
+        self.user.save()
+        self.course = Course.objects.create(name='Тестовый курс')
+
+    def test_token_obtain_throttled_by_ip(self):
+        """
+        Тест ограничения попыток получения токена с одного IP-адреса.
+        """
+        url = reverse('users:token_obtain_pair')
+        data = {'email': self.user.email, 'password': 'wrong'}
+        for _ in range(2):
+            self.assertEqual(self.client.post(url, data).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_token_obtain_ignores_spoofed_forwarded_for(self):
+        """
+        Тест того, что подмена X-Forwarded-For не обходит лимит по IP-адресу.
+        """
+        url = reverse('users:token_obtain_pair')
+        data = {'email': self.user.email, 'password': 'wrong'}
+        codes = [self.client.post(url, data, HTTP_X_FORWARDED_FOR=f'10.0.0.{i}').status_code for i in range(3)]
+        self.assertEqual(codes[-1], status.HTTP_429_TOO_MANY_REQUESTS)
+
+        # За одним прокси учитывается только адрес, добавленный прокси (последний в заголовке)
+        caches['throttle'].clear()
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            codes = [self.client.post(url, data, HTTP_X_FORWARDED_FOR=f'10.0.0.{i}, 192.0.2.1').status_code
+                     for i in range(3)]
+            self.assertEqual(codes[-1], status.HTTP_429_TOO_MANY_REQUESTS)
+            response = self.client.post(url, data, HTTP_X_FORWARDED_FOR='192.0.2.2')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_subscription_throttled_per_user(self):
+        """
+        Тест того, что лимит подписок считается отдельно для каждого пользователя.
+        """
+        url = reverse('materials:subscribe')
+        data = {'course_id': self.course.pk}
+        self.client.force_authenticate(user=self.user)
+        for _ in range(2):
+            self.assertEqual(self.client.post(url, data).status_code, status.HTTP_200_OK)
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+        self.client.force_authenticate(user=User.objects.create(email='other@example.com'))
+        self.assertEqual(self.client.post(url, data).status_code, status.HTTP_200_OK)
+
+    def test_async_subscription_throttled(self):
+        """
+        Тест ограничения частоты запросов в асинхронном контроллере подписки.
+        """
+        url = reverse('materials:async-subscribe')
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        data = {'course_id': self.course.pk}
+        for _ in range(2):
+            response = self.client.post(url, data, format='json', headers=headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(url, data, format='json', headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_async_view_responses_match_sync(self):
+        """
+        Тест того, что асинхронный контроллер отвечает на ошибки аутентификации и превышение лимита
+        так же, как синхронный.
+        """
+        urls = (reverse('materials:subscribe'), reverse('materials:async-subscribe'))
+        data = {'course_id': self.course.pk}
+
+        def post_both(**headers):
+            return [self.client.post(url, data, format='json', headers=headers) for url in urls]
+
+        for headers in ({}, {'Authorization': 'Bearer invalid'}):
+            sync_response, async_response = post_both(**headers)
+            self.assertEqual(sync_response.status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(async_response.status_code, sync_response.status_code)
+            self.assertEqual(async_response.json(), sync_response.json())
+            self.assertEqual(async_response['WWW-Authenticate'], sync_response['WWW-Authenticate'])
+
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        for _ in range(2):
+            self.assertEqual(self.client.post(urls[0], data, format='json', headers=headers).status_code,
+                             status.HTTP_200_OK)
+        sync_response, async_response = post_both(**headers)
+        self.assertEqual(sync_response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(set(async_response.json()), set(sync_response.json()))
+        self.assertGreater(int(async_response['Retry-After']), 0)
+
+    def test_sliding_window(self):
+        """
+        Тест того, что запросы предыдущего окна учитываются пропорционально не прошедшей его части.
+        """
+        url = reverse('materials:subscribe')
+        data = {'course_id': self.course.pk}
+        self.client.force_authenticate(user=self.user)
+        with mock.patch.object(SlidingWindowThrottle, 'timer', return_value=6000):
+            for _ in range(2):
+                self.assertEqual(self.client.post(url, data).status_code, status.HTTP_200_OK)
+
+        # Прошла четверть следующего окна: 2 * 0.75 + 1 > 2
+        with mock.patch.object(SlidingWindowThrottle, 'timer', return_value=6075):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '45')
+
+        # Еще через окно: в предыдущем окне 2 запроса (с отклоненным), прошло 5/6 окна: 2 * 1/6 + 1 <= 2
+        with mock.patch.object(SlidingWindowThrottle, 'timer', return_value=6170):
+            self.assertEqual(self.client.post(url, data).status_code, status.HTTP_200_OK)
+
+
+class DeactivateInactiveUsersTestCase(APITestCase):
+
+    def setUp(self):
+        long_ago = timezone.now() - timedelta(days=60)
+        for i in range(5):
+            User.objects.create(email=f'inactive{i}@example.com', last_login=long_ago)
+        User.objects.create(email='active@example.com')
+
+    def test_deactivate_inactive_users(self):
+        """
+        Тест пакетной деактивации пользователей, не заходивших более месяца.
+        """
+        with self.assertNumQueries(6):
+            result = deactivate_inactive_users(batch_size=2)
+        self.assertEqual(result, {'dry_run': False, 'deactivated': 5, 'batches': 3})
+        self.assertEqual(User.objects.filter(is_active=False).count(), 5)
+        self.assertTrue(User.objects.get(email='active@example.com').is_active)
+
+    def test_deactivate_inactive_users_dry_run(self):
+        """
+        Тест режима dry_run: пользователи подсчитываются, но не деактивируются.
+        """
+        result = deactivate_inactive_users(dry_run=True)
+        self.assertEqual(result, {'dry_run': True, 'deactivated': 5, 'batches': 0})
+        self.assertFalse(User.objects.filter(is_active=False).exists())
+
+
+class CurrencyAPIStubHandler(BaseHTTPRequestHandler):
+    """
+    Локальная заглушка API курсов валют.
+    """
+    rate = 100
+    requests_count = 0
+
+    def do_GET(self):
+        type(self).requests_count += 1
+        body = json.dumps({'data': {'RUB': {'code': 'RUB', 'value': self.rate}}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ExchangeRateTestCase(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), CurrencyAPIStubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.settings_override = override_settings(CUR_API_URL=f'http://127.0.0.1:{cls.server.server_port}/')
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        rates_cache.clear()
+        CurrencyAPIStubHandler.rate = 100
+        CurrencyAPIStubHandler.requests_count = 0
+
+    def test_rate_cached(self):
+        """
+        Тест того, что курс запрашивается у API один раз и дальше берется из кеша.
+        """
+        self.assertEqual(convert_currencies(1000), 10)
+        self.assertEqual(convert_currencies(500), 5)
+        self.assertEqual(CurrencyAPIStubHandler.requests_count, 1)
+
+    def test_stale_rate_returned_and_refreshed(self):
+        """
+        Тест того, что устаревший курс возвращается сразу, а обновление уходит в фоновую задачу.
+        """
+        rates_cache.set(USD_RATE_CACHE_KEY, {'rate': 50, 'fetched_at': 0})
+        with mock.patch.object(refresh_exchange_rates, 'delay') as delay:
+            self.assertEqual(convert_currencies(1000), 20)
+            self.assertEqual(convert_currencies(1000), 20)
+        delay.assert_called_once_with()
+        self.assertEqual(CurrencyAPIStubHandler.requests_count, 0)
+
+        refresh_exchange_rates()
+        self.assertEqual(convert_currencies(1000), 10)
+
+    def test_stale_rate_used_when_api_down(self):
+        """
+        Тест того, что при недоступности API используется последний известный курс.
+        """
+        rates_cache.set(USD_RATE_CACHE_KEY, {'rate': 50, 'fetched_at': 0})
+        with override_settings(CUR_API_URL='http://127.0.0.1:1/'), mock.patch.object(refresh_exchange_rates, 'delay'):
+            self.assertIsNone(refresh_exchange_rates())
+            self.assertEqual(convert_currencies(1000), 20)
+
+    def test_missing_rate_raises(self):
+        """
+        Тест того, что без курса в кеше и при недоступном API сумма не пересчитывается в 0.
+        """
+        with override_settings(CUR_API_URL='http://127.0.0.1:1/'):
+            with self.assertRaises(ExchangeRateUnavailable):
+                convert_currencies(1000)
+
+
+@mock.patch('users.tasks.convert_currencies', return_value=10)
+@mock.patch('users.tasks.create_stripe_session', return_value=('cs_test', 'https://checkout.stripe.com/cs_test'))
+@mock.patch('users.services.create_stripe_price', return_value=mock.Mock(id='price_test'))
+@mock.patch('users.services.create_stripe_product', return_value='prod_test')
+class PaymentCheckoutTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email='buyer@example.com')
+        self.course = Course.objects.create(name='Платный курс')
+        self.client.force_authenticate(user=self.user)
+
+    def test_payment_create_returns_pending(self, create_product, create_price, create_session, convert):
+        """
+        Тест того, что платеж создается сразу в статусе pending, а Stripe вызывается в фоне.
+        """
+        url = reverse("users:payments-create")
+        with mock.patch.object(create_payment_checkout, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, {"paid_course": self.course.pk, "amount": 1000,
+                                                  "payment_method": "transfer"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["status"], Payment.STATUS_PENDING)
+        delay.assert_called_once_with(response.json()["id"])
+        create_session.assert_not_called()
+
+    def test_payment_requires_paid_item(self, create_product, create_price, create_session, convert):
+        """
+        Тест того, что платеж без курса и урока не создается.
+        """
+        url = reverse("users:payments-create")
+        response = self.client.post(url, {"amount": 1000, "payment_method": "transfer"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("paid_course", response.json())
+        self.assertFalse(Payment.objects.exists())
+
+    def test_payment_checkout_missing_rate_retried(self, create_product, create_price, create_session, convert):
+        """
+        Тест того, что отсутствие курса валют повторяется, а после исчерпания попыток платеж помечается failed.
+        """
+        convert.side_effect = ExchangeRateUnavailable()
+        payment = Payment.objects.create(user=self.user, paid_course=self.course, amount=1000,
+                                         payment_method='transfer')
+        result = create_payment_checkout.apply(args=(payment.pk,))
+
+        self.assertTrue(result.failed())
+        self.assertEqual(convert.call_count, create_payment_checkout.max_retries + 1)
+        create_price.assert_not_called()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.STATUS_FAILED)
+
+    def test_payment_checkout_unexpected_error_fails(self, create_product, create_price, create_session, convert):
+        """
+        Тест того, что при непредвиденной ошибке и при платеже без курса и урока статус меняется на failed.
+        """
+        create_product.side_effect = ValueError()
+        payment = Payment.objects.create(user=self.user, paid_course=self.course, amount=1000,
+                                         payment_method='transfer')
+        with self.assertRaises(ValueError):
+            create_payment_checkout(payment.pk)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.STATUS_FAILED)
+
+        payment = Payment.objects.create(user=self.user, amount=1000, payment_method='transfer')
+        self.assertIsNone(create_payment_checkout(payment.pk))
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.STATUS_FAILED)
+
+    def test_payment_checkout_idempotent(self, create_product, create_price, create_session, convert):
+        """
+        Тест того, что повторный запуск задачи не создает новую сессию Stripe.
+        """
+        payment = Payment.objects.create(user=self.user, paid_course=self.course, amount=1000,
+                                         payment_method='transfer')
+        create_payment_checkout(payment.pk)
+        create_payment_checkout(payment.pk)
+
+        create_session.assert_called_once()
+        self.assertEqual(create_session.call_args.kwargs['idempotency_key'], f'{payment.idempotency_key}-session')
+
+        url = reverse("users:payments-status", args=(payment.pk,))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {"id": payment.pk, "status": Payment.STATUS_READY,
+                                           "stripe_payment_url": "https://checkout.stripe.com/cs_test"})
+
+    @mock.patch('users.services.update_stripe_product')
+    def test_stripe_product_and_price_reused(self, update_product, create_product, create_price, create_session,
+                                             convert):
+        """
+        Тест переиспользования продукта и цены Stripe между платежами и обновления продукта при смене названия.
+        """
+        for _ in range(3):
+            payment = Payment.objects.create(user=self.user, paid_course=self.course, amount=1000,
+                                             payment_method='transfer')
+            create_payment_checkout(payment.pk)
+
+        create_product.assert_called_once()
+        create_price.assert_called_once()
+        self.assertEqual(create_session.call_count, 3)
+        create_session.assert_called_with('price_test', idempotency_key=f'{payment.idempotency_key}-session')
+        update_product.assert_not_called()
+
+        Course.objects.filter(pk=self.course.pk).update(name='Новое название')
+        payment = Payment.objects.create(user=self.user, paid_course=self.course, amount=1000,
+                                         payment_method='transfer')
+        create_payment_checkout(payment.pk)
+        update_product.assert_called_once_with('prod_test', 'Новое название')
+        create_product.assert_called_once()
+
+
+@mock.patch('users.services.acreate_stripe_session', return_value=('cs_test', 'https://checkout.stripe.com/cs_test'))
+@mock.patch('users.services.acreate_stripe_price', return_value=mock.Mock(id='price_test'))
+class AsyncPaymentCreateTestCase(APITestCase):
+
+    def setUp(self):
+        rates_cache.clear()
+        self.user = User.objects.create(email='buyer@example.com')
+        self.course = Course.objects.create(name='Платный курс')
+        self.url = reverse("users:payments-async-create")
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    async def post(self, data):
+        return await self.async_client.post(self.url, data, content_type='application/json', headers=self.headers)
+
+    async def test_async_payment_create(self, create_price, create_session):
+        """
+        Тест асинхронного создания платежа: курс валют и продукт Stripe запрашиваются одновременно.
+        """
+        product_requested = asyncio.Event()
+
+        async def convert(amount):
+            # Если бы запросы шли последовательно, событие не наступило бы
+            await asyncio.wait_for(product_requested.wait(), timeout=1)
+            return 20
+
+        async def create_product(name, idempotency_key=None):
+            product_requested.set()
+            return 'prod_test'
+
+        with mock.patch('users.services.aconvert_currencies', side_effect=convert), \
+                mock.patch('users.services.acreate_stripe_product', side_effect=create_product):
+            response = await self.post({"paid_course": self.course.pk, "amount": 1000, "payment_method": "transfer"})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual(data["status"], Payment.STATUS_READY)
+        self.assertEqual(data["stripe_payment_url"], "https://checkout.stripe.com/cs_test")
+        self.assertEqual(create_price.call_args.args, ('prod_test', 20))
+        payment = await Payment.objects.aget(pk=data["id"])
+        self.assertEqual(payment.stripe_session_id, 'cs_test')
+        self.assertEqual(payment.user_id, self.user.pk)
+
+    async def test_async_payment_stripe_error(self, create_price, create_session):
+        """
+        Тест того, что при ошибке Stripe платеж остается pending и передается задаче Celery.
+        """
+        rates_cache.set(USD_RATE_CACHE_KEY, {'rate': 50, 'fetched_at': time.time()})
+        with mock.patch('users.services.acreate_stripe_product', side_effect=stripe.error.APIConnectionError('')), \
+                mock.patch.object(create_payment_checkout, 'delay') as delay:
+            response = await self.post({"paid_course": self.course.pk, "amount": 1000, "payment_method": "cash"})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["status"], Payment.STATUS_PENDING)
+        delay.assert_called_once_with(response.json()["id"])
+
+    async def test_async_payment_unexpected_error(self, create_price, create_session):
+        """
+        Тест того, что при любой ошибке создания ссылки платеж передается задаче Celery, а не теряется с ответом 500.
+        """
+        with mock.patch('users.services.aconvert_currencies', side_effect=ExchangeRateUnavailable()), \
+                mock.patch('users.services.acreate_stripe_product', return_value='prod_test'), \
+                mock.patch.object(create_payment_checkout, 'delay') as delay:
+            response = await self.post({"paid_course": self.course.pk, "amount": 1000, "payment_method": "cash"})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["status"], Payment.STATUS_PENDING)
+        delay.assert_called_once_with(response.json()["id"])
+
+    async def test_async_payment_validation(self, create_price, create_session):
+        """
+        Тест проверки данных платежа сериализатором PaymentSerializer.
+        """
+        response = await self.post({"paid_course": 0, "amount": -1, "payment_method": "card"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.json()), {"paid_course", "amount", "payment_method"})
+
+        response = await self.post({"amount": 1000, "payment_method": "cash"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.json()), {"paid_course"})
+        self.assertFalse(await Payment.objects.aexists())
+
+
+class PaymentListTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email='buyer@example.com')
+        self.client.force_authenticate(user=self.user)
+        self.payments = [
+            Payment.objects.create(user=self.user, amount=100 * i, payment_method='cash') for i in range(1, 5)
+        ]
+
+    def test_payment_list_cursor_pagination(self):
+        """
+        Тест курсорной пагинации платежей от новых к старым.
+        """
+        url = reverse("users:payment-list")
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([payment["amount"] for payment in data["results"]], [400, 300, 200])
+
+        response = self.client.get(data["next"])
+        self.assertEqual([payment["amount"] for payment in response.json()["results"]], [100])
+
+    def test_payment_search_by_email(self):
+        """
+        Тест поиска платежей по email пользователя.
+        """
+        other = User.objects.create(email='other@example.com')
+        Payment.objects.create(user=other, amount=500, payment_method='cash')
+        url = reverse("users:payment-list")
+        response = self.client.get(url, {"search": "OTHER@"})
+        self.assertEqual([payment["amount"] for payment in response.json()["results"]], [500])
+
+    def test_payment_list_sparse_fields(self):
+        """
+        Тест выбора полей платежей параметром fields без дополнительных запросов за отложенными полями.
+        """
+        url = reverse("users:payment-list")
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"fields": "id,amount"})
+        data = response.json()
+        self.assertEqual(data["results"][0], {"id": self.payments[3].pk, "amount": 400})
+
+        response = self.client.get(data["next"])
+        self.assertEqual(response.json()["results"], [{"id": self.payments[0].pk, "amount": 100}])
+
+
+class UsersFastReadPathContractTestCase(FastPathContractMixin, APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email='buyer@example.com', city='Москва', avatar='users/avatars/a.png')
+        User.objects.create(email='other@example.com')
+        self.client.force_authenticate(user=self.user)
+        course = Course.objects.create(name='Платный курс')
+        for i in range(1, 5):
+            Payment.objects.create(user=self.user, paid_course=course, amount=100 * i, payment_method='transfer')
+
+    def test_payment_list_contract(self):
+        """
+        Тест совпадения списка платежей в быстром и обычном путях.
+        """
+        url = reverse("users:payment-list")
+        for params in [{}, {"fields": "id,amount,status"}, {"ordering": "payment_date"}]:
+            with self.subTest(params=params):
+                self.assertFastPathMatches(PaymentViewSet, url, params)
+
+    def test_user_list_contract(self):
+        """
+        Тест совпадения списка пользователей в быстром и обычном путях.
+        """
+        url = reverse("users:user-list")
+        for params in [{}, {"fields": "email,avatar"}]:
+            with self.subTest(params=params):
+                self.assertFastPathMatches(UserViewSet, url, params)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Планы запросов проверяются только на PostgreSQL')
+class UsersQueryPlanTestCase(QueryPlanMixin, APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email='buyer@example.com')
+        self.course = Course.objects.create(name='Платный курс')
+        Payment.objects.create(user=self.user, paid_course=self.course, amount=1000, payment_method='cash')
+
+    def test_user_payments_use_index(self):
+        """
+        Тест выборки платежей пользователя, отсортированных по дате, по индексу.
+        """
+        self.assertUsesIndex(Payment.objects.filter(user=self.user).order_by('-payment_date'))
+
+    def test_payment_filters_use_index(self):
+        """
+        Тест фильтрации платежей по курсу, уроку и способу оплаты по индексу.
+        """
+        self.assertUsesIndex(Payment.objects.filter(paid_course=self.course, paid_lesson=None,
+                                                    payment_method='cash'))
+
+    def test_payment_cursor_page_uses_index(self):
+        """
+        Тест выборки страницы платежей по дате оплаты по индексу.
+        """
+        self.assertUsesIndex(Payment.objects.filter(payment_date__lt=timezone.now()).order_by('-payment_date',
+                                                                                               '-id')[:10])
+
+    def test_payment_email_search_uses_index(self):
+        """
+        Тест поиска платежей по email пользователя по триграммному индексу.
+        """
+        self.assertUsesIndex(User.objects.filter(email__icontains='buyer'))
+
+    def test_inactive_users_use_index(self):
+        """
+        Тест выборки неактивных пользователей по частичному индексу.
+        """
+        self.assertUsesIndex(User.objects.filter(is_active=True, last_login__lt=timezone.now()).values('pk'))
+
+
+class PaymentAnalyticsTestCase(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(email='admin@example.com', is_staff=True)
+        self.user = User.objects.create(email='buyer@example.com')
+        self.course = Course.objects.create(name='Платный курс')
+        self.client.force_authenticate(user=self.admin)
+        for amount, method in [(100, 'cash'), (300, 'cash'), (1000, 'transfer')]:
+            Payment.objects.create(user=self.user, paid_course=self.course, amount=amount, payment_method=method,
+                                   status=Payment.STATUS_READY)
+        # Платежи без ссылки на оплату в агрегаты не попадают
+        Payment.objects.create(user=self.user, paid_course=self.course, amount=5000, payment_method='cash')
+        Payment.objects.create(user=self.user, paid_course=self.course, amount=5000, payment_method='cash',
+                               status=Payment.STATUS_FAILED)
+
+    def get_cash_rollup(self):
+        rollup = PaymentRollup.objects.get(payment_method='cash')
+        return rollup.total_amount, rollup.payments_count
+
+    def test_rollups_recomputed(self):
+        """
+        Тест того, что повторный пересчет не учитывает платежи дважды, а новые и ставшие ready платежи добавляются.
+        """
+        self.assertEqual(update_payment_rollups(), {'payments': 3, 'rollups': 2})
+        self.assertEqual(update_payment_rollups(), {'payments': 3, 'rollups': 2})
+        self.assertEqual(self.get_cash_rollup(), (400, 2))
+
+        Payment.objects.create(user=self.user, paid_course=self.course, amount=200, payment_method='cash',
+                               status=Payment.STATUS_READY)
+        Payment.objects.filter(status=Payment.STATUS_PENDING).update(status=Payment.STATUS_READY)
+        self.assertEqual(update_payment_rollups(), {'payments': 5, 'rollups': 2})
+        self.assertEqual(self.get_cash_rollup(), (5600, 4))
+
+    def test_rollups_include_late_commits(self):
+        """
+        Тест того, что платеж с датой раньше водяного знака учитывается в пределах запаса, а более старый - после
+        полного пересчета.
+        """
+        update_payment_rollups()
+        processed_until = PaymentRollupWatermark.objects.get().processed_until
+        late = Payment.objects.create(user=self.user, paid_course=self.course, amount=200, payment_method='cash',
+                                      status=Payment.STATUS_READY)
+        Payment.objects.filter(pk=late.pk).update(payment_date=processed_until - timedelta(seconds=1))
+        old = Payment.objects.create(user=self.user, paid_course=self.course, amount=700, payment_method='cash',
+                                     status=Payment.STATUS_READY)
+        Payment.objects.filter(pk=old.pk).update(payment_date=processed_until - timedelta(days=3))
+
+        update_payment_rollups()
+        self.assertEqual(self.get_cash_rollup(), (600, 3))
+        self.assertFalse(PaymentRollup.objects.filter(payments_count=1, total_amount=700).exists())
+
+        call_command('rebuild_payment_rollups', stdout=StringIO())
+        self.assertTrue(PaymentRollup.objects.filter(payments_count=1, total_amount=700).exists())
+
+    def test_analytics(self):
+        """
+        Тест получения аналитики по способам оплаты из агрегатов без чтения таблицы платежей.
+        """
+        call_command('rebuild_payment_rollups', stdout=StringIO())
+        url = reverse("users:payments-analytics")
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"period": "month", "group_by": "course,method"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual([(row["payment_method"], row["total"], row["count"], row["average"]) for row in data],
+                         [("cash", 400, 2, 200), ("transfer", 1000, 1, 1000)])
+        self.assertEqual(data[0]["paid_course"], self.course.pk)
+
+    def test_analytics_invalid_date(self):
+        """
+        Тест ответа 400 на несуществующую дату в параметрах периода.
+        """
+        url = reverse("users:payments-analytics")
+        for value in ['2024-13-01', '2024-02-30', 'вчера']:
+            with self.subTest(value=value):
+                response = self.client.get(url, {"date_from": value})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertEqual(list(response.json()), ["date_from"])
+
+    def test_analytics_forbidden_for_regular_user(self):
+        """
+        Тест запрета доступа к аналитике обычному пользователю.
+        """
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("users:payments-analytics"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ExportTestCase(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(email='admin@example.com', is_staff=True)
+        self.user = User.objects.create(email='buyer@example.com', city='Рим')
+        self.client.force_authenticate(user=self.admin)
+        for amount, method in [(100, 'cash'), (300, 'transfer'), (500, 'cash')]:
+            Payment.objects.create(user=self.user, amount=amount, payment_method=method)
+
+    def test_payments_export_csv(self):
+        """
+        Тест потоковой выгрузки платежей в CSV с учетом фильтрации.
+        """
+        url = reverse("users:payment-export")
+        response = self.client.get(url, {"export_format": "csv", "payment_method": "cash"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'user_id', 'user__email'])
+        self.assertEqual(len(lines), 3)
+        self.assertIn('buyer@example.com', lines[1])
+        self.assertIn(',500,cash,', lines[1])
+
+    def test_users_export_ndjson(self):
+        """
+        Тест потоковой выгрузки пользователей в NDJSON.
+        """
+        url = reverse("users:user-export")
+        response = self.client.get(url, {"export_format": "ndjson"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row["email"] for row in rows], ['admin@example.com', 'buyer@example.com'])
+        self.assertEqual(rows[1]["city"], 'Рим')
+
+    def test_export_forbidden_for_regular_user(self):
+        """
+        Тест запрета выгрузки обычному пользователю.
+        """
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("users:payment-export"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(reverse("users:user-export"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
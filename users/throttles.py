@@ -0,0 +1,114 @@
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+THROTTLE_KEY = 'throttle:{scope}:{ident}:{window}'
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Ограничение частоты запросов по алгоритму скользящего окна (sliding window counter).
+
+    Запросы считаются атомарным INCR в счетчиках текущего и предыдущего окна в Redis
+    (кеш throttle), а число запросов за последние duration секунд оценивается как
+    счетчик текущего окна плюс доля счетчика предыдущего, пропорциональная еще не прошедшей
+    части окна. Увеличение счетчика, продление его жизни и чтение предыдущего окна выполняются
+    одной транзакцией, то есть за одно обращение к Redis на проверку.
+
+    Отклоненные запросы тоже учитываются, поэтому клиент, продолжающий слать запросы
+    после превышения лимита, остается заблокированным.
+
+    Лимит берется из REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] по области (scope), которая задается
+    атрибутом throttle_scope контроллера. Если у контроллера нет throttle_scope или для области
+    не задан лимит, запросы не ограничиваются.
+    """
+    cache = caches['throttle']
+    scope_suffix = ''
+
+    def __init__(self):
+        # Лимит зависит от контроллера и определяется в allow_request
+        pass
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_ident_key(self, request):
+        """
+        Возвращает идентификатор клиента, по которому считаются запросы, или None.
+        """
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return True
+        self.scope = scope + self.scope_suffix
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return True
+
+        self.now = self.timer()
+        window, elapsed = divmod(self.now, self.duration)
+        current_key = THROTTLE_KEY.format(scope=self.scope, ident=ident, window=int(window))
+        previous_key = THROTTLE_KEY.format(scope=self.scope, ident=ident, window=int(window) - 1)
+        self.current, self.previous = self.hit(current_key, previous_key)
+        self.elapsed = elapsed
+        return self.previous * (1 - elapsed / self.duration) + self.current <= self.num_requests
+
+    def hit(self, current_key, previous_key):
+        """
+        Увеличивает счетчик текущего окна и возвращает его вместе со счетчиком предыдущего окна.
+        """
+        current_key = self.cache.make_and_validate_key(current_key)
+        previous_key = self.cache.make_and_validate_key(previous_key)
+        client = self.cache._cache.get_client(current_key, write=True)
+        with client.pipeline() as pipe:
+            pipe.incr(current_key)
+            pipe.expire(current_key, self.duration * 2)
+            pipe.get(previous_key)
+            current, _, previous = pipe.execute()
+        return current, int(previous or 0)
+
+    def wait(self):
+        """
+        Возвращает количество секунд, через которое следующий запрос уложится в лимит.
+        """
+        if self.current + 1 <= self.num_requests:
+            # Лимит освободится, когда вклад предыдущего окна уменьшится до допустимого
+            allowed = self.num_requests - self.current - 1
+            return max(self.duration * (1 - allowed / self.previous) - self.elapsed, 0)
+        # Лимит исчерпан в текущем окне: ждем, пока его счетчик не станет предыдущим и не уменьшится
+        remaining = self.duration - self.elapsed
+        return remaining + self.duration * (1 - (self.num_requests - 1) / self.current)
+
+
+class UserRateThrottle(SlidingWindowThrottle):
+    """
+    Ограничение частоты запросов аутентифицированного пользователя по его id.
+
+    Анонимные запросы этим классом не ограничиваются - для них используется IPRateThrottle.
+    """
+
+    def get_ident_key(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return None
+        return f'user-{user.pk}'
+
+
+class IPRateThrottle(SlidingWindowThrottle):
+    """
+    Ограничение частоты запросов с одного IP-адреса, в том числе анонимных.
+
+    Лимит задается для области с суффиксом _ip, например payments_ip. Адрес клиента определяется
+    с учетом NUM_PROXIES: X-Forwarded-For от клиента без доверенного прокси не учитывается.
+    """
+    scope_suffix = '_ip'
+
+    def get_ident_key(self, request):
+        return f'ip-{self.get_ident(request)}'
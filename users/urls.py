@@ -1,23 +1,24 @@
 from rest_framework.routers import SimpleRouter
 
 from users.apps import UsersConfig
-from users.views import PaymentViewSet, UserViewSet, PaymentCreateAPIView
+from users.views import (PaymentViewSet, UserViewSet, PaymentCreateAPIView, PaymentStatusAPIView,
+                         PaymentAnalyticsAPIView, AsyncPaymentCreateView, ThrottledTokenObtainPairView)
 
 from django.urls import path
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
+from rest_framework_simplejwt.views import TokenRefreshView
 
 router = SimpleRouter()
 
-router.register(r'', UserViewSet)
 router.register(r'payments', PaymentViewSet)
+router.register(r'', UserViewSet)
 
 app_name = UsersConfig.name
 
 urlpatterns = [
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('token/', ThrottledTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('payments/create/', PaymentCreateAPIView.as_view(), name='payments-create'),
+    path('payments/async/create/', AsyncPaymentCreateView.as_view(), name='payments-async-create'),
+    path('payments/analytics/', PaymentAnalyticsAPIView.as_view(), name='payments-analytics'),
+    path('payments/<int:pk>/status/', PaymentStatusAPIView.as_view(), name='payments-status'),
 ] + router.urls
@@ -1,54 +1,230 @@
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.http import JsonResponse
+from django.utils.dateparse import parse_date
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, status
-from users.models import Payment, User
-from users.serializers import PaymentSerializer, UserProfileSerializer, UserSerializer
 
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.generics import CreateAPIView
-from users.services import convert_currencies, create_stripe_product, create_stripe_price, create_stripe_session
+from materials.fastpath import FastReadListMixin
+from materials.filters import PostgresSearchFilter
+from materials.mixins import SparseFieldsViewMixin
+from users.async_api import AsyncAPIView
+from users.models import Payment, PaymentRollup, User
+from users.exports import EXPORT_FORMATS, stream_export
+from users.paginators import PaymentCursorPagination
+from users.permissions import IsModerator
+from users.services import acreate_payment_checkout
+from users.serializers import PaymentSerializer, PaymentStatusSerializer, UserProfileSerializer, UserSerializer
+
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from rest_framework.generics import CreateAPIView, RetrieveAPIView
+from rest_framework_simplejwt.views import TokenObtainPairView
+from users.tasks import create_payment_checkout
 
+logger = logging.getLogger(__name__)
 
-class PaymentViewSet(ModelViewSet):
+
+class PaymentViewSet(FastReadListMixin, SparseFieldsViewMixin, ModelViewSet):
     """
     Viewset для выполнения CRUD операций над моделью Payment, с добавлением фильтрации и сортировки.
 
+    При чтении поддерживается параметр fields, который ограничивает поля ответа и колонки запроса.
+    Список строится быстрым путем чтения из values().
+
     Attributes:
         queryset (QuerySet): Запрос для получения всех платежей.
         filter_backends (tuple): Кортеж фильтров для использования в ViewSet.
         filterset_fields (list): Поля для фильтрации.
         ordering_fields (list): Поля для сортировки.
         search_fields (list): Поля для поиска.
+        search_mode (str): Режим поиска PostgresSearchFilter (icontains, trigram или fulltext). Курсорная
+            пагинация сортирует по дате оплаты, поэтому в режимах trigram и fulltext порядок по схожести не сохраняется.
+        pagination_class (PaymentCursorPagination): Курсорная пагинация по дате оплаты.
+        fast_path_columns (tuple): Дата оплаты нужна курсорной пагинации и при выборе полей.
     """
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    pagination_class = PaymentCursorPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, PostgresSearchFilter]
     filterset_fields = ['paid_course', 'paid_lesson', 'payment_method']
     ordering_fields = ['payment_date']
+    ordering = ('-payment_date', '-id')
     search_fields = ['user__email']
+    search_mode = 'icontains'  # Поиск подстроки, в PostgreSQL использует GIN-индекс pg_trgm по email
+    fast_read_path = True
+    fast_path_columns = ('payment_date',)
+    export_fields = ['id', 'user_id', 'user__email', 'payment_date', 'paid_course_id', 'paid_lesson_id', 'amount',
+                     'payment_method', 'status', 'stripe_session_id']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve']:
+            # Дата оплаты нужна курсорной пагинации для построения ссылки на следующую страницу
+            return self.only_requested_fields(queryset, 'payment_date')
+        return queryset
+
+    @action(detail=False, url_path='export', permission_classes=[IsAuthenticated, IsAdminUser | IsModerator])
+    def export(self, request):
+        """
+        Потоковая выгрузка платежей в CSV или NDJSON (параметр export_format).
+
+        Учитывает фильтрацию, сортировку и поиск списка платежей, но не пагинацию.
+        """
+        export_format = get_export_format(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        return stream_export(queryset, self.export_fields, export_format, 'payments')
+
+
+class ThrottledTokenObtainPairView(TokenObtainPairView):
+    """
+    Получение пары JWT-токенов с ограничением числа попыток с одного IP-адреса.
+
+    Каждая попытка проверяет пароль медленной хеш-функцией, поэтому перебор паролей
+    ограничивается лимитом области auth_ip.
+    """
+    throttle_scope = 'auth'
 
 
 class PaymentCreateAPIView(CreateAPIView):
+    """
+    Контроллер создания платежа.
+
+    Платеж сохраняется в статусе pending, а ссылка на оплату в Stripe создается в фоне задачей Celery.
+    Готовность ссылки можно проверить через PaymentStatusAPIView.
+    """
     serializer_class = PaymentSerializer
     queryset = Payment.objects.all()
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'payments'
 
     def perform_create(self, serializer):
-        payment = serializer.save(user=self.request.user)
-        amount_in_usd = convert_currencies(payment.amount)
-        product_id = create_stripe_product(name=payment.paid_course.name)
-        price = create_stripe_price(product_id, amount_in_usd)
-        session_id, payment_link = create_stripe_session(price)
-        payment.stripe_session_id = session_id
-        payment.stripe_payment_url = payment_link
-        payment.save()
+        payment = serializer.save(user=self.request.user, status=Payment.STATUS_PENDING)
+        transaction.on_commit(lambda: create_payment_checkout.delay(payment.pk))
+
+
+class AsyncPaymentCreateView(AsyncAPIView):
+    """
+    Асинхронный контроллер создания платежа для работы под ASGI.
+
+    Данные проверяются тем же PaymentSerializer, что и в PaymentCreateAPIView.
+    Платеж создается и сразу получает ссылку на оплату: курс валют и продукт Stripe запрашиваются
+    одновременно, а поток не блокируется на время обращений к внешним API.
+    Если ссылку создать не удалось (ошибка Stripe, нет курса валют и т.п.), платеж остается в статусе pending
+    и передается задаче Celery, которая повторит попытку или переведет платеж в failed.
+    """
+    throttle_scope = 'payments'
 
+    async def post(self, request, *args, **kwargs):
+        serializer = PaymentSerializer(data=self.get_data(request))
+        # Проверка существования курса и урока выполняет запросы к БД, поэтому вызывается в потоке
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        payment = await Payment.objects.acreate(user=request.user, status=Payment.STATUS_PENDING,
+                                                **serializer.validated_data)
 
-class UserViewSet(ModelViewSet):
+        try:
+            await acreate_payment_checkout(payment, payment.paid_course or payment.paid_lesson)
+        except Exception:
+            logger.warning('Не удалось создать сессию Stripe для платежа %s', payment.pk, exc_info=True)
+            await sync_to_async(create_payment_checkout.delay)(payment.pk)
+        return JsonResponse(PaymentSerializer(payment).data, status=status.HTTP_201_CREATED)
+
+
+class PaymentStatusAPIView(RetrieveAPIView):
+    """
+    Контроллер для получения статуса платежа и ссылки на оплату, когда она готова.
+    """
+    serializer_class = PaymentStatusSerializer
+    permission_classes = [IsAuthenticated]
+    stateless_authentication = True  # Платежи выбираются по id пользователя из токена
+
+    def get_queryset(self):
+        return Payment.objects.filter(user_id=self.request.user.pk).only('id', 'status', 'stripe_payment_url')
+
+
+class PaymentAnalyticsAPIView(APIView):
+    """
+    Контроллер аналитики платежей: сумма, количество и средний платеж.
+
+    Данные берутся только из дневных агрегатов PaymentRollup, таблица платежей не читается.
+
+    Query params:
+        period: day, week или month (по умолчанию month).
+        group_by: через запятую course, lesson, method.
+        date_from, date_to: границы периода в формате YYYY-MM-DD.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser | IsModerator]
+    periods = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+    group_fields = {'course': 'paid_course', 'lesson': 'paid_lesson', 'method': 'payment_method'}
+
+    def get(self, request, *args, **kwargs):
+        period = request.query_params.get('period', 'month')
+        if period not in self.periods:
+            raise ValidationError({'period': [f'Допустимые значения: {", ".join(self.periods)}']})
+
+        group_by = [name for name in request.query_params.get('group_by', '').split(',') if name]
+        unknown = [name for name in group_by if name not in self.group_fields]
+        if unknown:
+            raise ValidationError({'group_by': [f'Допустимые значения: {", ".join(self.group_fields)}']})
+        fields = [self.group_fields[name] for name in group_by]
+
+        rollups = PaymentRollup.objects.all()
+        for param, lookup in (('date_from', 'day__gte'), ('date_to', 'day__lte')):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    date = parse_date(value)
+                except ValueError:
+                    # Дата в верном формате, но несуществующая, например 2024-13-01
+                    date = None
+                if date is None:
+                    raise ValidationError({param: ['Укажите дату в формате YYYY-MM-DD']})
+                rollups = rollups.filter(**{lookup: date})
+
+        rows = (
+            rollups.annotate(period=self.periods[period]('day'))
+            .values('period', *fields)
+            .annotate(total=Sum('total_amount'), count=Sum('payments_count'))
+            .order_by('period', *fields)
+        )
+        results = []
+        for row in rows:
+            row['average'] = round(row['total'] / row['count'], 2) if row['count'] else 0
+            results.append(row)
+        return Response(results)
+
+
+class UserViewSet(FastReadListMixin, SparseFieldsViewMixin, ModelViewSet):
     """
     Viewset для выполнения CRUD операций над моделью User с включенной историей платежей.
+
+    Список пользователей поддерживает параметр fields и строится быстрым путем чтения из values().
     """
     queryset = User.objects.all()
+    fast_read_path = True
+    export_fields = ['id', 'email', 'phone', 'city', 'is_active', 'last_login', 'date_joined']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            return self.only_requested_fields(queryset)
+        return queryset
+
+    @action(detail=False, url_path='export')
+    def export(self, request):
+        """
+        Потоковая выгрузка пользователей в CSV или NDJSON (параметр export_format).
+        """
+        export_format = get_export_format(request)
+        return stream_export(self.get_queryset().order_by('pk'), self.export_fields, export_format, 'users')
 
     def get_serializer_class(self):
         """
@@ -66,10 +242,13 @@ class UserViewSet(ModelViewSet):
         Возвращает соответствующие разрешения в зависимости от действия.
 
         - Для действия 'create' возвращает AllowAny для разрешения создания пользователя без аутентификации.
+        - Для действия 'export' разрешает доступ только администраторам и модераторам.
         - Для всех остальных действий возвращает IsAuthenticated для защиты действий аутентификацией.
         """
         if self.action in ['create']:
             return [AllowAny()]
+        if self.action == 'export':
+            return [IsAuthenticated(), (IsAdminUser | IsModerator)()]
         return [IsAuthenticated()]
 
     def perform_create(self, serializer):
@@ -82,3 +261,13 @@ class UserViewSet(ModelViewSet):
         user = serializer.save(is_active=True)
         user.set_password(serializer.validated_data['password'])
         user.save()
+
+
+def get_export_format(request):
+    """
+    Возвращает формат выгрузки из параметра export_format (по умолчанию csv).
+    """
+    export_format = request.query_params.get('export_format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        raise ValidationError({'export_format': [f'Допустимые значения: {", ".join(EXPORT_FORMATS)}']})
+    return export_format